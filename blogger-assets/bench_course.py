@@ -0,0 +1,216 @@
+# bench_course.py
+# Benchmarks the course builder (scratch.py) on synthetic courses.
+# Times diagram_for_topic (cold render + cache hit), build_pdf, build_docx and
+# build_ppt separately, records output sizes, and appends every run to a
+# JSON-lines results file so runs can be compared later.
+#
+#   python bench_course.py                           # 19, 200 and 2000 topics
+#   python bench_course.py --sizes 200 --label after-change
+#   python bench_course.py --compare                 # last two runs
+#   python bench_course.py --compare before after    # two runs by label
+
+import os, sys, json, time, random, shutil, tempfile, argparse, datetime, subprocess
+import importlib.metadata
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import scratch
+
+DEFAULT_SIZES = [19, 200, 2000]
+RESULTS_FILE = "course_bench.jsonl"
+FORMATS = ("pdf", "docx", "pptx")
+
+
+# -------------------------
+# SYNTHETIC COURSES
+# -------------------------
+def synthetic_sample(rng, n_lines):
+    lines = []
+    for i in range(n_lines):
+        kind = rng.random()
+        if kind < 0.1:  # long enough to exercise code wrapping
+            lines.append("print(" + " + ".join(f"value_{j}" for j in range(rng.randint(15, 30))) + ")")
+        elif kind < 0.4:
+            lines.append(f"for i{i} in range({rng.randint(2, 50)}):\n    total += i{i}")
+        else:
+            lines.append(f"x{i} = {rng.randint(0, 999)} * {rng.randint(1, 9)}")
+    return "\n".join(lines)
+
+def synthetic_course(n_topics, diagram_density=0.6, code_lines=3, topics_per_chapter=5, seed=0):
+    # Returns (topics, chapters, mcqs, diagram_ids) shaped like TOPICS,
+    # CHAPTERS, MCQS and DIAGRAM_TOPIC_IDS in scratch.py.
+    rng = random.Random(seed)
+    topics = []
+    for tid in range(1, n_topics + 1):
+        topics.append((
+            tid, f"Synthetic topic {tid}",
+            f"Introduction to synthetic topic {tid}.",
+            "Explanation " + " ".join(rng.choice(("loops", "lists", "dicts", "files", "functions"))
+                                      for _ in range(12)) + ".",
+            "Why it matters: practice and repetition.",
+            [synthetic_sample(rng, code_lines) for _ in range(3)],
+        ))
+    chapters, mcqs = [], {}
+    for c, start in enumerate(range(1, n_topics + 1, topics_per_chapter), 1):
+        title = f"Chapter {c}: Synthetic"
+        chapters.append((title, list(range(start, min(start + topics_per_chapter, n_topics + 1)))))
+        mcqs[title] = [(f"Question {q} of chapter {c}?",
+                        ["A) one", "B) two", "C) three", "D) four"], rng.choice("ABCD"))
+                       for q in range(1, 6)]
+    diagram_ids = [tid for tid in range(1, n_topics + 1) if rng.random() < diagram_density]
+    return topics, chapters, mcqs, diagram_ids
+
+
+# -------------------------
+# TIMING
+# -------------------------
+def _timed(fn, *args, repeat=1):
+    best = None
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn(*args)
+        secs = time.perf_counter() - t0
+        best = secs if best is None else min(best, secs)
+    return best
+
+def point_outputs_at(workdir):
+    # the builders write to module-level paths; keep benchmark files out of OUT_DIR
+    scratch.OUT_DIR = workdir
+    scratch.PDF_PATH = os.path.join(workdir, "bench.pdf")
+    scratch.DOCX_PATH = os.path.join(workdir, "bench.docx")
+    scratch.PPTX_PATH = os.path.join(workdir, "bench.pptx")
+    scratch.DIAGRAM_CACHE_DIR = os.path.join(workdir, ".diagram_cache")
+
+def bench_diagrams(repeat):
+    # Cold = cache emptied before each render (pure matplotlib cost), warm =
+    # cache hit. Per-diagram cost does not depend on course size, so this is
+    # measured once over the real diagram specs.
+    real_ids = list(dict.fromkeys(scratch.canonical_diagram_ids(scratch.DIAGRAM_TOPIC_IDS).values()))
+    scratch.diagram_for_topic(real_ids[0])  # warm-up: matplotlib import + font cache
+    cold, warm = [], []
+    for tid in real_ids:
+        def render_cold(t=tid):
+            shutil.rmtree(scratch.DIAGRAM_CACHE_DIR, ignore_errors=True)
+            scratch.diagram_for_topic(t)
+        cold.append(_timed(render_cold, repeat=repeat))
+        warm.append(_timed(scratch.diagram_for_topic, tid, repeat=repeat))
+    paths = {tid: scratch.diagram_for_topic(tid) for tid in real_ids}
+    return {
+        "distinct_diagrams": len(real_ids),
+        "cold_mean_s": round(sum(cold) / len(cold), 6),
+        "warm_mean_s": round(sum(warm) / len(warm), 6),
+        "png_bytes_mean": round(sum(os.path.getsize(p) for p in paths.values()) / len(paths)),
+    }, list(paths.values())
+
+def bench_size(n_topics, args, pngs):
+    topics, chapters, mcqs, diagram_ids = synthetic_course(
+        n_topics, args.diagram_density, args.code_lines, seed=args.seed)
+    course = scratch.compile_course(topics, chapters, mcqs, diagram_ids)
+    # synthetic diagram topics reuse the real PNGs round-robin
+    canon = scratch.canonical_diagram_ids(diagram_ids)
+    diag_paths = {canon[t]: pngs[i % len(pngs)] for i, t in enumerate(diagram_ids)}
+
+    result = {"topics": n_topics, "chapters": len(chapters), "diagrams": len(diagram_ids),
+              "compile_s": round(_timed(scratch.compile_course, topics, chapters, mcqs, diagram_ids), 6)}
+    builders = {"pdf": (scratch.build_pdf, "PDF_PATH"), "docx": (scratch.build_docx, "DOCX_PATH"),
+                "pptx": (scratch.build_ppt, "PPTX_PATH")}
+    for fmt in args.formats:
+        fn, path_attr = builders[fmt]
+        extra = (args.streaming,) if fmt == "pdf" else ()
+        result[f"{fmt}_s"] = round(_timed(fn, diag_paths, course, *extra, repeat=args.repeat), 6)
+        result[f"{fmt}_bytes"] = os.path.getsize(getattr(scratch, path_attr))
+        print(f"  {n_topics:>5} topics  {fmt:<4} {result[f'{fmt}_s']:8.2f}s  {result[f'{fmt}_bytes']:>10,} bytes")
+    return result
+
+
+# -------------------------
+# RESULTS
+# -------------------------
+def _git_rev():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        return None
+
+def _lib_version(name):
+    try:
+        return importlib.metadata.version(name)
+    except importlib.metadata.PackageNotFoundError:
+        return None
+
+def load_runs(path):
+    if not os.path.exists(path):
+        return []
+    with open(path, "r", encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+def compare(runs, labels):
+    if labels:
+        picked = [next((r for r in reversed(runs) if r["label"] == lb), None) for lb in labels]
+        if None in picked:
+            raise SystemExit(f"No run labelled {labels[picked.index(None)]!r}")
+    elif len(runs) >= 2:
+        picked = runs[-2:]
+    else:
+        raise SystemExit("Need at least two runs to compare.")
+    a, b = picked
+    print(f"{a['label']} ({a['git']}) -> {b['label']} ({b['git']})")
+    print(f"  diagrams cold {a['diagrams']['cold_mean_s']:.4f}s -> {b['diagrams']['cold_mean_s']:.4f}s, "
+          f"warm {a['diagrams']['warm_mean_s']:.4f}s -> {b['diagrams']['warm_mean_s']:.4f}s")
+    before = {r["topics"]: r for r in a["sizes"]}
+    for row in b["sizes"]:
+        old = before.get(row["topics"])
+        if not old:
+            continue
+        for key in sorted(k for k in row if k.endswith(("_s", "_bytes")) and k in old):
+            ratio = row[key] / old[key] if old[key] else float("nan")
+            fmt = ">12,.3f" if key.endswith("_s") else ">12,"
+            print(f"  {row['topics']:>5} topics  {key:<11} {old[key]:{fmt}} -> {row[key]:{fmt}}  x{ratio:.2f}")
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Benchmark the course builder on synthetic courses.")
+    ap.add_argument("--sizes", type=int, nargs="+", default=DEFAULT_SIZES, help="topic counts")
+    ap.add_argument("--diagram-density", type=float, default=0.6,
+                    help="fraction of topics that get a flow diagram")
+    ap.add_argument("--code-lines", type=int, default=3, help="lines per code sample")
+    ap.add_argument("--formats", nargs="+", choices=FORMATS, default=list(FORMATS))
+    ap.add_argument("--streaming", action="store_true", help="use the streaming PDF mode")
+    ap.add_argument("--repeat", type=int, default=1, help="runs per measurement (best is kept)")
+    ap.add_argument("--seed", type=int, default=0)
+    ap.add_argument("--label", default=None, help="name for this run (default: timestamp)")
+    ap.add_argument("--results", default=RESULTS_FILE, help="JSON-lines file runs are appended to")
+    ap.add_argument("--compare", nargs="*", metavar="LABEL",
+                    help="compare two stored runs (default: the last two) instead of running")
+    args = ap.parse_args(argv)
+
+    if args.compare is not None:
+        if len(args.compare) not in (0, 2):
+            ap.error("--compare takes zero or two labels")
+        compare(load_runs(args.results), args.compare)
+        return
+
+    stamp = datetime.datetime.now().isoformat(timespec="seconds")
+    workdir = tempfile.mkdtemp(prefix="bench_course_")
+    try:
+        point_outputs_at(workdir)
+        diagrams, pngs = bench_diagrams(args.repeat)
+        print(f"diagrams: cold {diagrams['cold_mean_s']:.3f}s, warm {diagrams['warm_mean_s']:.4f}s per diagram")
+        sizes = [bench_size(n, args, pngs) for n in args.sizes]
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    run = {
+        "label": args.label or stamp, "timestamp": stamp, "git": _git_rev(),
+        "python": sys.version.split()[0],
+        "libs": {lib: _lib_version(lib) for lib in ("matplotlib", "reportlab", "python-docx", "python-pptx")},
+        "params": {"diagram_density": args.diagram_density, "code_lines": args.code_lines,
+                   "streaming": args.streaming, "repeat": args.repeat, "seed": args.seed},
+        "diagrams": diagrams, "sizes": sizes,
+    }
+    with open(args.results, "a", encoding="utf-8") as f:
+        f.write(json.dumps(run) + "\n")
+    print("Results appended to", args.results)
+
+if __name__ == "__main__":
+    main()
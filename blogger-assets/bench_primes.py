@@ -0,0 +1,124 @@
+# bench_primes.py
+# Benchmarks primes.py: the course's trial division against the segmented
+# sieve, listing the primes, only counting them, and counting with a
+# process pool. Every method's answer is checked against the sieve's, and
+# every run is appended to a JSON-lines results file so runs can be
+# compared later.
+#
+#   python bench_primes.py                            # 10**4 .. 10**8
+#   python bench_primes.py --sizes 1000000 --workers 8 --label after-change
+#   python bench_primes.py --compare                  # last two runs
+#   python bench_primes.py --compare before after     # two runs by label
+
+import os, sys, json, time, argparse, datetime, subprocess
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import primes
+
+DEFAULT_SIZES = [10 ** 4, 10 ** 5, 10 ** 6, 10 ** 7, 10 ** 8]
+TRIAL_MAX = 10 ** 6     # trial division takes minutes beyond this
+RESULTS_FILE = "primes_bench.jsonl"
+
+
+# -------------------------
+# METHODS
+# -------------------------
+# name -> fn(stop, workers) returning the primes below stop, or their count
+METHODS = {
+    "trial": lambda stop, workers: primes.trial_division_primes(stop),
+    "sieve": lambda stop, workers: list(primes.primes(stop)),
+    "count": lambda stop, workers: primes.count_primes(stop),
+    "pool": lambda stop, workers: primes.count_primes(stop, workers=workers),
+}
+
+def bench_size(stop, args):
+    rows = []
+    expected = None
+    for method in args.methods:
+        if method == "trial" and stop > args.trial_max:
+            continue
+        if method == "pool" and args.workers < 2:
+            continue
+        start = time.perf_counter()
+        found = METHODS[method](stop, args.workers)
+        secs = time.perf_counter() - start
+        count = found if isinstance(found, int) else len(found)
+        expected = primes.count_primes(stop) if expected is None else expected
+        if count != expected:
+            raise SystemExit(f"{method} found {count} primes below {stop}, the sieve {expected}")
+        rows.append({"method": method, "stop": stop, "secs": round(secs, 6), "primes": count})
+        print(f"  {method:<6} {stop:>14,}  {secs:9.3f}s  {stop / max(secs, 1e-9):>16,.0f} numbers/s  "
+              f"{count:>12,} primes")
+    return rows
+
+
+# -------------------------
+# RESULTS
+# -------------------------
+def _git_rev():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        return None
+
+def load_runs(path):
+    if not os.path.exists(path):
+        return []
+    with open(path, "r", encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+def compare(runs, labels):
+    if labels:
+        picked = [next((r for r in reversed(runs) if r["label"] == lb), None) for lb in labels]
+        if None in picked:
+            raise SystemExit(f"No run labelled {labels[picked.index(None)]!r}")
+    elif len(runs) >= 2:
+        picked = runs[-2:]
+    else:
+        raise SystemExit("Need at least two runs to compare.")
+    a, b = picked
+    print(f"{a['label']} ({a['git']}) -> {b['label']} ({b['git']})")
+    before = {(r["method"], r["stop"]): r for r in a["results"]}
+    for row in b["results"]:
+        old = before.get((row["method"], row["stop"]))
+        if not old:
+            continue
+        ratio = row["secs"] / old["secs"] if old["secs"] else float("nan")
+        print(f"  {row['method']:<6} {row['stop']:>14,}  {old['secs']:9.3f}s -> {row['secs']:9.3f}s  x{ratio:.2f}")
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Benchmark trial division against the segmented sieve.")
+    ap.add_argument("--sizes", type=primes.bound, nargs="+", default=DEFAULT_SIZES,
+                    help="find the primes below each of these (10**9 style works)")
+    ap.add_argument("--methods", nargs="+", choices=METHODS, default=list(METHODS))
+    ap.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="processes for the pool method")
+    ap.add_argument("--trial-max", type=primes.bound, default=TRIAL_MAX,
+                    help="largest size trial division is timed at")
+    ap.add_argument("--label", default=None, help="name for this run (default: timestamp)")
+    ap.add_argument("--results", default=RESULTS_FILE, help="JSON-lines file runs are appended to")
+    ap.add_argument("--compare", nargs="*", metavar="LABEL",
+                    help="compare two stored runs (default: the last two) instead of running")
+    args = ap.parse_args(argv)
+
+    if args.compare is not None:
+        if len(args.compare) not in (0, 2):
+            ap.error("--compare takes zero or two labels")
+        compare(load_runs(args.results), args.compare)
+        return
+
+    stamp = datetime.datetime.now().isoformat(timespec="seconds")
+    results = [row for stop in args.sizes for row in bench_size(stop, args)]
+    run = {
+        "label": args.label or stamp, "timestamp": stamp, "git": _git_rev(),
+        "python": sys.version.split()[0], "cpus": os.cpu_count(),
+        "params": {"workers": args.workers, "segment": primes.SEGMENT},
+        "results": results,
+    }
+    with open(args.results, "a", encoding="utf-8") as f:
+        f.write(json.dumps(run) + "\n")
+    print("Results appended to", args.results)
+
+if __name__ == "__main__":
+    main()
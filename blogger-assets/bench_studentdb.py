@@ -0,0 +1,259 @@
+# bench_studentdb.py
+# Benchmarks the StudentDB projects (the *_CODE programs in scratch.py) on
+# synthetic databases. For each backend and size it times building and
+# saving the db (a full snapshot), loading it again, paging through it with
+# view_all, single edits and their undos, and saving just those edits, and
+# records peak memory and file size. It also checks the class statistics
+# kept up through the edits against a full recompute. Every run is appended
+# to a JSON-lines results file so runs can be compared later.
+#
+#   python bench_studentdb.py                            # 1k, 100k and 1M records
+#   python bench_studentdb.py --sizes 100000 --backends pickle json --label after-change
+#   python bench_studentdb.py --compare                  # last two runs
+#   python bench_studentdb.py --compare before after     # two runs by label
+#
+# A backend is any program with the shared StudentDB API (REQUIRED_API);
+# adding one to the comparison is one line in BACKENDS.
+
+import os, sys, json, time, random, shutil, tempfile, argparse, datetime, subprocess, contextlib
+import importlib.util
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+DEFAULT_SIZES = [1000, 100000, 1000000]
+RESULTS_FILE = "studentdb_bench.jsonl"
+# backend name -> code variable in scratch.py
+BACKENDS = {
+    "pickle": "STUDENTDB_PICKLE_CODE",
+    "json": "STUDENTDB_JSON_CODE",
+    "sqlite": "STUDENTDB_SQLITE_CODE",
+}
+REQUIRED_API = ("FILE_NAME", "load_db", "save_db", "valid_changes", "apply_changes",
+                "update_record", "undo_last", "redo_last", "view_all", "class_stats",
+                "recompute_class_stats")
+NAMES = ("Asha", "Ben", "Chen", "Divya", "Emil", "Farah", "Gita", "Hugo", "Ines", "Jon",
+         "Kavya", "Liam", "Meera", "Noah", "Omar", "Priya", "Quinn", "Ravi", "Sara", "Tomas")
+
+
+# -------------------------
+# SYNTHETIC DATABASES
+# -------------------------
+def synthetic_rows(n, seed=0):
+    # (roll, name, marks) in random order; rolls are sparse like real ones
+    rng = random.Random(seed)
+    rolls = rng.sample(range(1, 10 * n + 1), n)
+    return [(roll, f"{rng.choice(NAMES)} {rng.choice(NAMES)}son", rng.randrange(101)) for roll in rolls]
+
+
+# -------------------------
+# CHILD PROCESS (one phase of one backend and size)
+# -------------------------
+# Each phase runs in a fresh interpreter inside the case's work dir, so the
+# db files land there, module-level state starts empty and peak RSS belongs
+# to that phase alone.
+EDIT_ROLLS = "edit_rolls.json"  # picked by the build phase, edited by the open phase
+
+def _peak_mb():
+    try:
+        import resource
+    except ImportError:  # Windows
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(rss / (1 << 20 if sys.platform == "darwin" else 1 << 10), 1)
+
+def _load_backend(path):
+    spec = importlib.util.spec_from_file_location("studentdb_under_test", path)
+    sdb = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(sdb)
+    missing = [name for name in REQUIRED_API if not hasattr(sdb, name)]
+    if missing:
+        raise SystemExit(f"{path} lacks the StudentDB API: {', '.join(missing)}")
+    return sdb
+
+def _db_bytes(sdb):
+    # the data file plus its index, journal or WAL companions
+    return sum(os.path.getsize(f) for f in os.listdir(".") if f.startswith(sdb.FILE_NAME))
+
+def _quantiles_us(secs):
+    # (p50, p95) in microseconds
+    secs = sorted(secs)
+    return tuple(round(secs[min(len(secs) - 1, int(p * len(secs)))] * 1e6, 1) for p in (0.5, 0.95))
+
+def phase_build(sdb, n, seed, edits):
+    # every record arrives in one bulk step, as a big import would
+    rows = synthetic_rows(n, seed)
+    with open(EDIT_ROLLS, "w", encoding="utf-8") as f:
+        json.dump([roll for roll, _name, _marks in random.Random(seed + 1).sample(rows, min(edits, n))], f)
+    start = time.perf_counter()
+    db = sdb.load_db()
+    changes = list(sdb.valid_changes(rows, {"skipped": 0}))
+    sdb.apply_changes(db, changes)
+    build_s = time.perf_counter() - start
+    start = time.perf_counter()
+    sdb.save_db(db)
+    return {"build_s": build_s, "save_s": time.perf_counter() - start, "file_bytes": _db_bytes(sdb),
+            "build_peak_mb": _peak_mb()}
+
+def phase_open(sdb, seed):
+    result = {}
+    start = time.perf_counter()
+    db = sdb.load_db()
+    result["load_s"] = time.perf_counter() - start
+    result["load_peak_mb"] = _peak_mb()
+
+    # every page, answering Enter at each prompt; output is formatted but discarded
+    sdb.input = lambda prompt="": ""
+    start = time.perf_counter()
+    with open(os.devnull, "w") as sink, contextlib.redirect_stdout(sink):
+        sdb.view_all(db)
+    result["view_all_s"] = time.perf_counter() - start
+
+    # single edits with their undo bookkeeping, then undoing each of them
+    rng = random.Random(seed + 2)
+    with open(EDIT_ROLLS, "r", encoding="utf-8") as f:
+        rolls = json.load(f)
+    undo_stack, redo_stack = [], []
+    edit_secs, undo_secs = [], []
+    for roll in rolls:
+        start = time.perf_counter()
+        sdb.update_record(db, undo_stack, redo_stack, roll, marks=rng.randrange(101))
+        edit_secs.append(time.perf_counter() - start)
+    start = time.perf_counter()
+    sdb.save_db(db)
+    result["save_edits_s"] = time.perf_counter() - start
+    while undo_stack:
+        start = time.perf_counter()
+        sdb.undo_last(db, undo_stack, redo_stack)
+        undo_secs.append(time.perf_counter() - start)
+    result["edit_us_p50"], result["edit_us_p95"] = _quantiles_us(edit_secs)
+    result["undo_us_p50"], result["undo_us_p95"] = _quantiles_us(undo_secs)
+    result["open_peak_mb"] = _peak_mb()
+
+    # the statistics (built here if the backend builds them lazily) kept up
+    # to date through redoing every edit, against a recompute from scratch
+    start = time.perf_counter()
+    sdb.class_stats(db)
+    result["class_stats_s"] = time.perf_counter() - start
+    while redo_stack:
+        sdb.redo_last(db, undo_stack, redo_stack)
+    result["stats_ok"] = sdb.class_stats(db) == sdb.recompute_class_stats(db)
+    return result
+
+def child_main(phase, path, n, seed, edits):
+    sdb = _load_backend(path)
+    result = phase_build(sdb, n, seed, edits) if phase == "build" else phase_open(sdb, seed)
+    print(json.dumps(result))
+
+
+# -------------------------
+# RUNNING THE CASES
+# -------------------------
+def run_phase(workdir, phase, module_path, n, args):
+    cmd = [sys.executable, os.path.abspath(__file__), "--child", phase, module_path,
+           str(n), str(args.seed), str(args.edits)]
+    proc = subprocess.run(cmd, cwd=workdir, capture_output=True, text=True)
+    if proc.returncode:
+        raise RuntimeError(f"{phase} failed:\n{proc.stderr.strip()}")
+    return json.loads(proc.stdout.strip().splitlines()[-1])
+
+def bench_case(backend, n, args):
+    import scratch  # here, not at the top: the child processes don't need it
+    workdir = tempfile.mkdtemp(prefix=f"bench_studentdb_{backend}_")
+    try:
+        module_path = os.path.join(workdir, f"studentdb_{backend}.py")
+        with open(module_path, "w", encoding="utf-8") as f:
+            f.write(getattr(scratch, BACKENDS[backend]))
+        row = {"backend": backend, "records": n}
+        row.update(run_phase(workdir, "build", module_path, n, args))
+        row.update(run_phase(workdir, "open", module_path, n, args))
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+    for key, value in row.items():
+        if key.endswith("_s"):
+            row[key] = round(value, 6)
+    print(f"  {backend:<7} {n:>9,}  build {row['build_s']:7.2f}s  save {row['save_s']:7.2f}s  "
+          f"load {row['load_s']:7.3f}s  view {row['view_all_s']:7.2f}s  "
+          f"edit {row['edit_us_p50']:8.1f}us  undo {row['undo_us_p50']:8.1f}us  "
+          f"{row['file_bytes']:>12,} bytes  peak {row['open_peak_mb']} MB  "
+          f"stats {'ok' if row['stats_ok'] else 'MISMATCH'}")
+    return row
+
+
+# -------------------------
+# RESULTS
+# -------------------------
+def _git_rev():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        return None
+
+def load_runs(path):
+    if not os.path.exists(path):
+        return []
+    with open(path, "r", encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+def compare(runs, labels):
+    if labels:
+        picked = [next((r for r in reversed(runs) if r["label"] == lb), None) for lb in labels]
+        if None in picked:
+            raise SystemExit(f"No run labelled {labels[picked.index(None)]!r}")
+    elif len(runs) >= 2:
+        picked = runs[-2:]
+    else:
+        raise SystemExit("Need at least two runs to compare.")
+    a, b = picked
+    print(f"{a['label']} ({a['git']}) -> {b['label']} ({b['git']})")
+    before = {(r["backend"], r["records"]): r for r in a["results"]}
+    for row in b["results"]:
+        old = before.get((row["backend"], row["records"]))
+        if not old:
+            continue
+        for key in sorted(k for k in row if k.endswith(("_s", "_us_p50", "_bytes", "_mb")) and k in old):
+            if old[key] is None or row[key] is None:
+                continue
+            ratio = row[key] / old[key] if old[key] else float("nan")
+            fmt = ">12," if key.endswith("_bytes") else ">12,.3f"
+            print(f"  {row['backend']:<7} {row['records']:>9,}  {key:<13} "
+                  f"{old[key]:{fmt}} -> {row[key]:{fmt}}  x{ratio:.2f}")
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    if argv[:1] == ["--child"]:
+        phase, path, n, seed, edits = argv[1:6]
+        child_main(phase, path, int(n), int(seed), int(edits))
+        return
+    ap = argparse.ArgumentParser(description="Benchmark the StudentDB backends on synthetic databases.")
+    ap.add_argument("--sizes", type=int, nargs="+", default=DEFAULT_SIZES, help="record counts")
+    ap.add_argument("--backends", nargs="+", choices=BACKENDS, default=list(BACKENDS))
+    ap.add_argument("--edits", type=int, default=1000, help="single edits (and undos) timed per case")
+    ap.add_argument("--seed", type=int, default=0)
+    ap.add_argument("--label", default=None, help="name for this run (default: timestamp)")
+    ap.add_argument("--results", default=RESULTS_FILE, help="JSON-lines file runs are appended to")
+    ap.add_argument("--compare", nargs="*", metavar="LABEL",
+                    help="compare two stored runs (default: the last two) instead of running")
+    args = ap.parse_args(argv)
+
+    if args.compare is not None:
+        if len(args.compare) not in (0, 2):
+            ap.error("--compare takes zero or two labels")
+        compare(load_runs(args.results), args.compare)
+        return
+
+    stamp = datetime.datetime.now().isoformat(timespec="seconds")
+    results = [bench_case(backend, n, args) for n in args.sizes for backend in args.backends]
+    run = {
+        "label": args.label or stamp, "timestamp": stamp, "git": _git_rev(),
+        "python": sys.version.split()[0],
+        "params": {"edits": args.edits, "seed": args.seed},
+        "results": results,
+    }
+    with open(args.results, "a", encoding="utf-8") as f:
+        f.write(json.dumps(run) + "\n")
+    print("Results appended to", args.results)
+
+if __name__ == "__main__":
+    main()
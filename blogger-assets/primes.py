@@ -1,9 +1,157 @@
-t=0
-x=5
-diff=-1
-for i in range(10):
-    print(diff)
-    # x=x+ diff
-    diff=t-diff
-
-     
\ No newline at end of file
+# primes.py
+# Primes for exercise data. primes() streams the primes in a range from a
+# segmented Sieve of Eratosthenes: only odd numbers are kept, one byte each,
+# one segment at a time, so memory stays at about SEGMENT bytes plus the
+# base primes up to sqrt(stop) however far it goes (10**10 included).
+# workers=N sieves the segments in N processes and still yields in order.
+#
+#   python primes.py 100                            # primes below 100
+#   python primes.py 10**9 --count --workers 0      # one process per CPU
+#   python primes.py 1000000 --start 999000
+#
+# trial_division_primes() is the course's sqrt(n) loop, kept as the
+# baseline; bench_primes.py times the two against each other.
+
+import argparse
+import itertools
+import math
+import os
+import sys
+from array import array
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+SEGMENT = 1 << 20      # odd numbers per segment, so bytes of sieve per segment
+IN_FLIGHT = 2          # segments queued per worker process
+
+def trial_division_primes(stop, start=2):
+    # The nested-loop version from the course: n is prime when no i from 2
+    # up to sqrt(n) divides it.
+    found = []
+    for n in range(max(start, 2), stop):
+        for i in range(2, math.isqrt(n) + 1):
+            if n % i == 0:
+                break
+        else:
+            found.append(n)
+    return found
+
+def small_primes(limit):
+    # primes <= limit from one odd-only sieve: index i stands for 2*i + 1
+    if limit < 2:
+        return []
+    sieve = bytearray([1]) * ((limit + 1) // 2)
+    sieve[0] = 0
+    for i in range(1, (math.isqrt(limit) - 1) // 2 + 1):
+        if sieve[i]:
+            p = 2 * i + 1
+            first = p * p // 2
+            sieve[first::p] = bytes(len(range(first, len(sieve), p)))
+    return [2] + [2 * i + 1 for i in itertools.compress(range(len(sieve)), sieve)]
+
+def sieve_segment(lo, hi, base):
+    # Flags for the odd numbers lo, lo + 2, ... below hi (lo odd), 1 = prime.
+    # base is the odd primes up to at least sqrt(hi). Striking out p's odd
+    # multiples is one slice assignment with step p, since neighbouring
+    # flags are 2 apart.
+    size = (hi - lo + 1) // 2
+    seg = bytearray([1]) * size
+    for p in base:
+        m = p * p
+        if m >= hi:
+            break
+        if m < lo:
+            m = (lo + p - 1) // p * p
+            if m % 2 == 0:
+                m += p
+        first = (m - lo) // 2
+        seg[first::p] = bytes(len(range(first, size, p)))
+    if lo == 1:
+        seg[0] = 0
+    return seg
+
+_BASE = {"limit": -1, "primes": []}
+
+def base_primes(limit):
+    # odd primes up to limit, worked out once per process
+    if limit > _BASE["limit"]:
+        _BASE["primes"] = small_primes(limit)[1:]
+        _BASE["limit"] = limit
+    return _BASE["primes"]
+
+def segment_task(lo, hi, limit, count):
+    # One segment's primes (array of int64), or only how many with count.
+    seg = sieve_segment(lo, hi, base_primes(limit))
+    if count:
+        return seg.count(1)
+    return array("q", itertools.compress(range(lo, hi, 2), seg))
+
+def segments(start, stop, segment=SEGMENT):
+    lo = max(start, 1) | 1
+    while lo < stop:
+        yield lo, min(lo + 2 * segment, stop)
+        lo += 2 * segment
+
+def run_segments(start, stop, count, workers=None, segment=SEGMENT):
+    # segment_task results in order. With workers > 1 they come from a
+    # process pool with at most IN_FLIGHT segments per worker queued or
+    # done-but-unread, so a slow reader never piles up results.
+    limit = math.isqrt(max(stop - 1, 0))
+    if not workers or workers < 2:
+        for lo, hi in segments(start, stop, segment):
+            yield segment_task(lo, hi, limit, count)
+        return
+    with ProcessPoolExecutor(workers) as pool:
+        pending = deque()
+        try:
+            for lo, hi in segments(start, stop, segment):
+                pending.append(pool.submit(segment_task, lo, hi, limit, count))
+                if len(pending) >= IN_FLIGHT * workers:
+                    yield pending.popleft().result()
+            while pending:
+                yield pending.popleft().result()
+        finally:
+            for future in pending:  # the reader stopped early
+                future.cancel()
+
+def primes(stop, start=2, workers=None, segment=SEGMENT):
+    # the primes p with start <= p < stop, smallest first
+    if start <= 2 < stop:
+        yield 2
+    for found in run_segments(start, stop, False, workers, segment):
+        yield from found
+
+def count_primes(stop, start=2, workers=None, segment=SEGMENT):
+    # how many primes lie in [start, stop), without listing them
+    return (start <= 2 < stop) + sum(run_segments(start, stop, True, workers, segment))
+
+def bound(text):
+    # "1000000" or "10**9"
+    base, _, exp = text.partition("**")
+    try:
+        return int(base) ** int(exp) if exp else int(text)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"not a whole number: {text!r}")
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="List or count primes with a segmented sieve.")
+    ap.add_argument("stop", type=bound, help="primes below this (10**9 style works)")
+    ap.add_argument("--start", type=bound, default=2, help="primes from this on (default 2)")
+    ap.add_argument("--count", action="store_true", help="print how many instead of the primes")
+    ap.add_argument("--workers", type=int, default=1, help="processes sieving segments (0 = one per CPU)")
+    args = ap.parse_args(argv)
+    workers = os.cpu_count() if args.workers == 0 else args.workers
+    if args.count:
+        print(count_primes(args.stop, args.start, workers))
+        return
+    found = primes(args.stop, args.start, workers)
+    try:
+        while chunk := list(itertools.islice(found, 1 << 16)):
+            sys.stdout.write("\n".join(map(str, chunk)) + "\n")
+        sys.stdout.flush()
+    except BrokenPipeError:  # e.g. piped into head
+        os.dup2(os.open(os.devnull, os.O_WRONLY), sys.stdout.fileno())
+        found.close()
+
+if __name__ == "__main__":
+    main()
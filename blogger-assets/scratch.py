@@ -2,27 +2,21 @@
 # Generates: PDF + DOCX + PPTX with branding, flow diagrams (Loops/DS/StudentDB),
 # practice exercises+answers after each topic, and MCQs at end of each chapter.
 
-import os, datetime, textwrap, copy, json
-import matplotlib.pyplot as plt
-from matplotlib.patches import Rectangle, FancyArrowPatch
+import time
+_T_START = time.perf_counter()  # "Startup" in the build summary is measured from here
 
-# PDF (reportlab)
-from reportlab.lib.pagesizes import A4
-from reportlab.platypus import (
-    SimpleDocTemplate, Paragraph, Spacer, PageBreak, Preformatted, Image, Table, TableStyle
-)
-from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-from reportlab.lib.units import cm
-from reportlab.lib import colors
-from reportlab.pdfgen import canvas
+import os, sys, datetime, textwrap, copy, json, hashlib, shutil, traceback, inspect, argparse
+import contextlib, cProfile, tracemalloc, math, functools
+import importlib.metadata
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+try:
+    import resource  # peak RSS; not available on Windows
+except ImportError:
+    resource = None
 
-# DOCX
-from docx import Document
-from docx.shared import Inches
-
-# PPTX
-from pptx import Presentation
-from pptx.util import Inches as PInches
+# matplotlib, reportlab, python-docx and python-pptx are imported inside the
+# functions that use them, so a build only loads the libraries it needs.
 
 
 # -------------------------
@@ -39,6 +33,141 @@ PDF_PATH  = os.path.join(OUT_DIR, "Python_Starter_Course_FULL_Package.pdf")
 DOCX_PATH = os.path.join(OUT_DIR, "Python_Starter_Course_FULL_Package.docx")
 PPTX_PATH = os.path.join(OUT_DIR, "Python_Starter_Course_FULL_Package.pptx")
 
+# Diagram rendering: 1 = serial, N > 1 = process pool of N, 0 = one per CPU
+DIAGRAM_WORKERS = 1
+# True = build PDF, DOCX and PPTX at the same time, one process each
+EXPORT_PARALLEL = False
+# True = feed the PDF layout engine lazily (flat memory for huge courses)
+PDF_STREAMING = False
+PDF_STREAM_WINDOW = 64  # flowables buffered ahead of layout when streaming
+
+DIAGRAM_DPI = 180
+# "png" = matplotlib images everywhere; "vector" = native drawings in the PDF
+# and PPTX (sharp, smaller, no matplotlib). DOCX always embeds the PNG.
+DIAGRAM_BACKEND = "png"
+VECTOR_FORMATS = ("pdf", "pptx")
+DIAGRAM_CACHE_DIR = os.path.join(OUT_DIR, ".diagram_cache")
+DIAGRAM_CACHE_MAX_AGE_DAYS = 30  # unused this long -> evicted
+DIAGRAM_CACHE_STATS = {"hits": 0, "misses": 0, "evicted": 0}
+
+
+# -------------------------
+# BUILD PROFILING
+# Every phase (per diagram, per chapter, per format) records wall time, CPU
+# time and peak memory. main() writes them as a JSON report (--profile) and
+# can dump cProfile stats for each top-level phase (--cprofile DIR).
+# -------------------------
+PROFILE = {"enabled": False, "trace_memory": False, "cprofile_dir": None}
+BUILD_PHASES = []   # finished phases, innermost first
+_PHASE_STACK = []
+
+def configure_profiling(enabled=False, trace_memory=False, cprofile_dir=None):
+    PROFILE.update(enabled=enabled, trace_memory=trace_memory, cprofile_dir=cprofile_dir)
+    if trace_memory and not tracemalloc.is_tracing():
+        tracemalloc.start()
+    if cprofile_dir:
+        os.makedirs(cprofile_dir, exist_ok=True)
+
+def _reset_profiling_in_worker(opts):
+    # A forked worker inherits the parent's open phases (and an enabled
+    # cProfile); start clean so its records describe only its own work.
+    for frame in _PHASE_STACK:
+        if frame["prof"]:
+            frame["prof"].disable()
+    _PHASE_STACK.clear()
+    BUILD_PHASES.clear()
+    configure_profiling(**opts)
+
+def _max_rss_kb():
+    if resource is None:
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss // 1024 if sys.platform == "darwin" else rss  # macOS reports bytes
+
+def current_phase():
+    return _PHASE_STACK[-1]["name"] if _PHASE_STACK else ""
+
+def begin_phase(name, switched=False):
+    if tracemalloc.is_tracing():
+        # keep the parent's peak so far, then measure this phase on its own
+        if _PHASE_STACK:
+            parent = _PHASE_STACK[-1]
+            parent["peak"] = max(parent["peak"], tracemalloc.get_traced_memory()[1])
+        tracemalloc.reset_peak()
+    prof = None
+    if PROFILE["cprofile_dir"] and not _PHASE_STACK:
+        prof = cProfile.Profile()  # profilers can't nest: top level only
+    _PHASE_STACK.append({
+        "name": f"{current_phase()}/{name}" if _PHASE_STACK else name,
+        "switched": switched, "peak": 0, "prof": prof,
+        "wall": time.perf_counter(), "cpu": time.process_time(),
+    })
+    if prof:
+        prof.enable()
+
+def end_phase():
+    frame = _PHASE_STACK.pop()
+    wall = time.perf_counter() - frame["wall"]
+    cpu = time.process_time() - frame["cpu"]
+    if frame["prof"]:
+        frame["prof"].disable()
+        fname = "".join(ch if ch.isalnum() else "_" for ch in frame["name"]) + ".prof"
+        frame["prof"].dump_stats(os.path.join(PROFILE["cprofile_dir"], fname))
+    peak = None
+    if tracemalloc.is_tracing():
+        peak = max(frame["peak"], tracemalloc.get_traced_memory()[1])
+        if _PHASE_STACK:  # a grandchild's reset must not hide this from the parent
+            _PHASE_STACK[-1]["peak"] = max(_PHASE_STACK[-1]["peak"], peak)
+    BUILD_PHASES.append({
+        "phase": frame["name"], "pid": os.getpid(),
+        "wall_s": round(wall, 6), "cpu_s": round(cpu, 6),
+        "peak_traced_bytes": peak, "max_rss_kb": _max_rss_kb(),
+    })
+
+@contextlib.contextmanager
+def phase(name):
+    depth = len(_PHASE_STACK)
+    begin_phase(name)
+    try:
+        yield
+    finally:
+        # also closes any switch_phase() phases left open inside this one
+        while len(_PHASE_STACK) > depth:
+            end_phase()
+
+def switch_phase(name):
+    # For boundaries only seen from inside a library callback (PDF layout):
+    # ends the previous switched phase, if any, and begins the next one.
+    if _PHASE_STACK and _PHASE_STACK[-1]["switched"]:
+        end_phase()
+    begin_phase(name, switched=True)
+
+def _profiled_call(opts, name, fn, *args):
+    # pool worker entry: run fn in its own phase and ship the records back
+    _reset_profiling_in_worker(opts)
+    with phase(name):
+        result = fn(*args)
+    return result, list(BUILD_PHASES)
+
+def merge_worker_phases(records):
+    # worker phases are relative to the phase that dispatched them
+    prefix = current_phase()
+    for rec in records:
+        BUILD_PHASES.append(dict(rec, phase=f"{prefix}/{rec['phase']}" if prefix else rec["phase"]))
+
+def write_profile_report(path, **extra):
+    report = {
+        "generated": datetime.datetime.now().isoformat(timespec="seconds"),
+        "python": sys.version.split()[0],
+        "trace_memory": PROFILE["trace_memory"],
+        **extra,
+        "total": {"wall_s": round(time.perf_counter() - _T_START, 6),
+                  "cpu_s": round(time.process_time(), 6), "max_rss_kb": _max_rss_kb()},
+        "phases": BUILD_PHASES,
+    }
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+
 
 # -------------------------
 # FLOW DIAGRAMS (requested)
@@ -47,8 +176,12 @@ PPTX_PATH = os.path.join(OUT_DIR, "Python_Starter_Course_FULL_Package.pptx")
 # StudentDB: 18–19
 # -------------------------
 DIAGRAM_TOPIC_IDS = [6,7,8,9,10,11,12,13,14,15,18,19]
+DIAGRAM_ALIASES = {19: 18}  # topic -> topic whose diagram it reuses
+
+def save_flow_diagram(title, nodes, edges, notes, path_png, figsize=(8,2.8), dpi=DIAGRAM_DPI):
+    import matplotlib.pyplot as plt
+    from matplotlib.patches import Rectangle, FancyArrowPatch
 
-def save_flow_diagram(title, nodes, edges, notes, path_png, figsize=(8,2.8)):
     fig, ax = plt.subplots(figsize=figsize)
     ax.axis("off")
     ax.text(0.01, 0.93, title, fontsize=14, weight="bold", transform=ax.transAxes)
@@ -61,17 +194,14 @@ def save_flow_diagram(title, nodes, edges, notes, path_png, figsize=(8,2.8)):
     if notes:
         ax.text(0.01, 0.06, notes, fontsize=9.5, transform=ax.transAxes)
     plt.tight_layout()
-    plt.savefig(path_png, dpi=180)
+    plt.savefig(path_png, dpi=dpi, format="png")
     plt.close(fig)
 
-def diagram_for_topic(tid:int) -> str:
-    # We reuse StudentDB diagram for both 18 and 19
-    if tid == 19:
-        tid = 18
-    path = os.path.join(OUT_DIR, f"diag_topic_{tid:02d}.png")
-
+def diagram_spec(tid:int):
+    # (title, nodes, edges, notes, figsize) -- everything that decides the pixels
+    tid = DIAGRAM_ALIASES.get(tid, tid)
     if tid in (6,8):  # while
-        save_flow_diagram(
+        return (
             "while Loop Flow",
             [(0.05,0.62,0.30,0.22,"Start/Init"),
              (0.40,0.62,0.30,0.22,"Condition?"),
@@ -79,84 +209,263 @@ def diagram_for_topic(tid:int) -> str:
              (0.75,0.48,0.20,0.22,"End")],
             [(0.35,0.73,0.40,0.73),(0.55,0.62,0.55,0.56),
              (0.55,0.34,0.55,0.62),(0.70,0.73,0.75,0.59)],
-            "Update variables to avoid infinite loop.", path, figsize=(8,3.0)
+            "Update variables to avoid infinite loop.", (8,3.0)
         )
     elif tid == 7:  # for range
-        save_flow_diagram(
+        return (
             "for Loop with range()",
             [(0.05,0.60,0.30,0.24,"range(...)"),
              (0.40,0.60,0.30,0.24,"i takes values"),
              (0.75,0.60,0.20,0.24,"Body")],
             [(0.35,0.72,0.40,0.72),(0.70,0.72,0.75,0.72)],
-            "Best when count is known.", path, figsize=(8,2.6)
+            "Best when count is known.", (8,2.6)
         )
     elif tid in (9,10):  # nested
-        save_flow_diagram(
+        return (
             "Nested Loops",
             [(0.05,0.58,0.28,0.26,"Outer loop\n(rows)"),
              (0.38,0.58,0.28,0.26,"Inner loop\n(cols)"),
              (0.71,0.58,0.24,0.26,"print/check")],
             [(0.33,0.71,0.38,0.71),(0.66,0.71,0.71,0.71)],
-            "Outer controls lines; inner controls items per line.", path, figsize=(8,2.6)
+            "Outer controls lines; inner controls items per line.", (8,2.6)
         )
     elif tid == 11:  # list
-        save_flow_diagram(
+        return (
             "List (Ordered, Mutable)",
             [(0.05,0.58,0.27,0.26,"Create\n[]"),
              (0.36,0.58,0.27,0.26,"append/remove"),
              (0.67,0.58,0.28,0.26,"index/slice")],
             [(0.32,0.71,0.36,0.71),(0.63,0.71,0.67,0.71)],
-            "Sequence where order matters.", path, figsize=(8,2.6)
+            "Sequence where order matters.", (8,2.6)
         )
     elif tid == 12:  # dict
-        save_flow_diagram(
+        return (
             "Dictionary (Key → Value)",
             [(0.05,0.58,0.30,0.26,"key"),
              (0.38,0.58,0.30,0.26,"maps to"),
              (0.71,0.58,0.24,0.26,"value")],
             [(0.35,0.71,0.38,0.71),(0.68,0.71,0.71,0.71)],
-            "db[roll] → record.", path, figsize=(8,2.6)
+            "db[roll] → record.", (8,2.6)
         )
     elif tid == 13:  # tuple
-        save_flow_diagram(
+        return (
             "Tuple (Ordered, Immutable)",
             [(0.05,0.58,0.30,0.26,"Create\n( )"),
              (0.38,0.58,0.30,0.26,"unpack"),
              (0.71,0.58,0.24,0.26,"use safely")],
             [(0.35,0.71,0.38,0.71),(0.68,0.71,0.71,0.71)],
-            "Use when values should not change.", path, figsize=(8,2.6)
+            "Use when values should not change.", (8,2.6)
         )
     elif tid == 14:  # set
-        save_flow_diagram(
+        return (
             "Set (Unique)",
             [(0.05,0.58,0.30,0.26,"Create\n{ }"),
              (0.38,0.58,0.30,0.26,"add/remove"),
              (0.71,0.58,0.24,0.26,"ops | & -")],
             [(0.35,0.71,0.38,0.71),(0.68,0.71,0.71,0.71)],
-            "Duplicates removed automatically.", path, figsize=(8,2.6)
+            "Duplicates removed automatically.", (8,2.6)
         )
     elif tid == 15:  # frozenset
-        save_flow_diagram(
+        return (
             "frozenset (Immutable Set)",
             [(0.05,0.58,0.30,0.26,"frozenset(...)"),
              (0.38,0.58,0.30,0.26,"no change"),
              (0.71,0.58,0.24,0.26,"dict key")],
             [(0.35,0.71,0.38,0.71),(0.68,0.71,0.71,0.71)],
-            "Hashable and safe.", path, figsize=(8,2.6)
+            "Hashable and safe.", (8,2.6)
         )
     else:  # StudentDB architecture
-        save_flow_diagram(
+        return (
             "StudentDB Architecture",
             [(0.04,0.62,0.22,0.22,"Menu"),
              (0.30,0.62,0.22,0.22,"CRUD"),
              (0.56,0.62,0.22,0.22,"Undo/Redo"),
              (0.80,0.62,0.18,0.22,"Save/Load")],
             [(0.26,0.73,0.30,0.73),(0.52,0.73,0.56,0.73),(0.78,0.73,0.80,0.73)],
-            "Undo stores snapshots; redo cleared on new change.", path, figsize=(8,3.0)
+            "Undo stores changed records; redo cleared on new change.", (8,3.0)
         )
 
+
+# Vector backend: the same spec drawn natively by the exporter instead of as
+# a PNG -- a reportlab Drawing in the PDF, DrawingML shapes in the PPTX.
+# Sizes are scaled by (target width / figure width) so text matches the PNG.
+def flow_diagram_drawing(spec, width, height):
+    from reportlab.graphics.shapes import Drawing, Rect, String, Line, PolyLine
+    title, nodes, edges, notes, figsize = spec
+    scale = width / (figsize[0] * 72)
+    lw = 1.5 * scale
+    d = Drawing(width, height)
+
+    def text(x, y, s, size, font="Helvetica", anchor="start"):
+        lines = s.split("\n")
+        lead = size * 1.2
+        for i, line in enumerate(lines):
+            # center the block vertically on y (matplotlib's va="center")
+            base = y + (len(lines)-1)*lead/2 - i*lead - size*0.35
+            d.add(String(x, base, line, fontName=font, fontSize=size, textAnchor=anchor))
+
+    text(0.01*width, 0.93*height, title, 14*scale, "Helvetica-Bold")
+    for (x,y,w,h,label) in nodes:
+        d.add(Rect(x*width, y*height, w*width, h*height, fillColor=None, strokeWidth=lw))
+        text((x+w/2)*width, (y+h/2)*height, label, 10*scale, anchor="middle")
+    for (x1,y1,x2,y2) in edges:
+        x1, y1, x2, y2 = x1*width, y1*height, x2*width, y2*height
+        d.add(Line(x1, y1, x2, y2, strokeWidth=lw))
+        # open "->" head, like FancyArrowPatch(arrowstyle="->", mutation_scale=12)
+        length = math.hypot(x2-x1, y2-y1) or 1
+        ux, uy = (x2-x1)/length, (y2-y1)/length
+        hl, hw = 4.8*scale, 2.4*scale
+        d.add(PolyLine([x2-hl*ux-hw*uy, y2-hl*uy+hw*ux, x2, y2, x2-hl*ux+hw*uy, y2-hl*uy-hw*ux],
+                       strokeWidth=lw))
+    if notes:
+        text(0.01*width, 0.06*height, notes, 9.5*scale)
+    return d
+
+def add_flow_diagram_shapes(slide, spec, left, top, width):
+    from pptx.util import Pt
+    from pptx.dml.color import RGBColor
+    from pptx.enum.shapes import MSO_SHAPE, MSO_CONNECTOR
+    from pptx.enum.text import PP_ALIGN, MSO_ANCHOR
+    from pptx.oxml.ns import qn
+    title, nodes, edges, notes, figsize = spec
+    height = int(width * figsize[1] / figsize[0])
+    scale = width / (figsize[0] * 914400)  # EMU per inch
+    black = RGBColor(0, 0, 0)
+
+    def X(fx): return left + int(fx*width)
+    def Y(fy): return top + int((1-fy)*height)
+
+    def style(tf, size, bold=False, align=None):
+        tf.word_wrap = False
+        for p in tf.paragraphs:
+            if align is not None:
+                p.alignment = align
+            for r in p.runs:
+                r.font.size = Pt(size*scale)
+                r.font.bold = bold
+                r.font.color.rgb = black
+
+    def text(x, y, s, size, bold=False):
+        # (x, y) is the baseline of the first line, as in ax.text()
+        box = slide.shapes.add_textbox(X(x), Y(y) - Pt(size*scale*1.2), int(width*0.9), Pt(size*scale*1.4))
+        tf = box.text_frame
+        tf.margin_left = tf.margin_right = tf.margin_top = tf.margin_bottom = 0
+        tf.text = s
+        style(tf, size, bold)
+
+    text(0.01, 0.93, title, 14, bold=True)
+    for (x,y,w,h,label) in nodes:
+        shape = slide.shapes.add_shape(MSO_SHAPE.RECTANGLE, X(x), Y(y+h), int(w*width), int(h*height))
+        shape.fill.background()
+        shape.line.color.rgb = black
+        shape.line.width = Pt(1.5*scale)
+        shape.shadow.inherit = False
+        tf = shape.text_frame
+        tf.vertical_anchor = MSO_ANCHOR.MIDDLE
+        tf.text = label
+        style(tf, 10, align=PP_ALIGN.CENTER)
+    for (x1,y1,x2,y2) in edges:
+        conn = slide.shapes.add_connector(MSO_CONNECTOR.STRAIGHT, X(x1), Y(y1), X(x2), Y(y2))
+        conn.line.color.rgb = black
+        conn.line.width = Pt(1.5*scale)
+        ln = conn.line._get_or_add_ln()
+        ln.append(ln.makeelement(qn("a:tailEnd"), {"type": "arrow"}))
+    if notes:
+        text(0.01, 0.06, notes, 9.5)
+
+
+# -------------------------
+# DIAGRAM CACHE
+# PNGs are stored under a hash of (spec, dpi, matplotlib version), so an
+# unchanged diagram is copied from the cache instead of being re-rendered.
+# -------------------------
+@functools.lru_cache(maxsize=None)
+def _matplotlib_version():
+    # read from package metadata so a cache hit never imports matplotlib
+    try:
+        return importlib.metadata.version("matplotlib")
+    except importlib.metadata.PackageNotFoundError:
+        return "unknown"
+
+def spec_digest(spec):
+    blob = json.dumps(spec, ensure_ascii=False)
+    return hashlib.sha256(blob.encode("utf-8")).hexdigest()
+
+def diagram_cache_path(spec, dpi=DIAGRAM_DPI):
+    blob = json.dumps([spec, dpi, _matplotlib_version()], ensure_ascii=False)
+    key = hashlib.sha256(blob.encode("utf-8")).hexdigest()
+    return os.path.join(DIAGRAM_CACHE_DIR, key + ".png")
+
+def canonical_diagram_ids(topic_ids):
+    # {topic id: first topic id with an identical spec}. Topics 6/8 ("while
+    # Loop Flow"), 9/10 ("Nested Loops") and 18/19 each share one diagram,
+    # which is rendered once, written once and embedded once per document.
+    first, canon = {}, {}
+    for t in topic_ids:
+        canon[t] = first.setdefault(spec_digest(diagram_spec(t)), t)
+    return canon
+
+def evict_diagram_cache(max_age_days=DIAGRAM_CACHE_MAX_AGE_DAYS):
+    # Hits refresh an entry's mtime, so anything older than the cutoff has not
+    # been used by any build for max_age_days (or is a crashed render's .tmp).
+    if not os.path.isdir(DIAGRAM_CACHE_DIR):
+        return 0
+    cutoff = time.time() - max_age_days*86400
+    evicted = 0
+    for name in os.listdir(DIAGRAM_CACHE_DIR):
+        p = os.path.join(DIAGRAM_CACHE_DIR, name)
+        if os.path.getmtime(p) < cutoff:
+            os.remove(p)
+            evicted += 1
+    DIAGRAM_CACHE_STATS["evicted"] += evicted
+    return evicted
+
+def diagram_for_topic(tid:int) -> str:
+    # We reuse StudentDB diagram for both 18 and 19
+    tid = DIAGRAM_ALIASES.get(tid, tid)
+    path = os.path.join(OUT_DIR, f"diag_topic_{tid:02d}.png")
+    spec = diagram_spec(tid)
+    cached = diagram_cache_path(spec)
+
+    if os.path.exists(cached):
+        DIAGRAM_CACHE_STATS["hits"] += 1
+        os.utime(cached)
+    else:
+        DIAGRAM_CACHE_STATS["misses"] += 1
+        os.makedirs(DIAGRAM_CACHE_DIR, exist_ok=True)
+        title, nodes, edges, notes, figsize = spec
+        tmp = f"{cached[:-4]}.{os.getpid()}.tmp"
+        save_flow_diagram(title, nodes, edges, notes, tmp, figsize=figsize)
+        os.replace(tmp, cached)  # atomic, so readers never see half a PNG
+
+    shutil.copyfile(cached, path)
     return path
 
+def render_diagrams(topic_ids=DIAGRAM_TOPIC_IDS, workers=DIAGRAM_WORKERS):
+    # Render each distinct spec once, so pool workers never duplicate work or
+    # write the same path concurrently. Returns {topic id: png path}; topics
+    # with the same spec get the same path.
+    canon = canonical_diagram_ids(topic_ids)
+    unique = list(dict.fromkeys(canon.values()))
+    workers = workers or os.cpu_count() or 1
+    # only cache misses are worth a worker; hits are resolved here
+    misses = [t for t in unique if not os.path.exists(diagram_cache_path(diagram_spec(t)))]
+    paths = {}
+    if workers > 1 and len(misses) > 1:
+        opts = dict(PROFILE)
+        with ProcessPoolExecutor(max_workers=min(workers, len(misses))) as pool:
+            futures = {t: pool.submit(_profiled_call, opts, f"topic {t:02d}", diagram_for_topic, t)
+                       for t in misses}
+            for t, fut in futures.items():
+                paths[t], records = fut.result()
+                merge_worker_phases(records)
+        DIAGRAM_CACHE_STATS["misses"] += len(misses)  # counted in the workers
+    for t in unique:
+        if t not in paths:
+            with phase(f"topic {t:02d}"):
+                paths[t] = diagram_for_topic(t)
+    return {t: paths[canon[t]] for t in topic_ids}
+
 
 # -------------------------
 # YOUR 19 TOPICS (brief but complete)
@@ -284,18 +593,18 @@ TOPICS = [
     "import os\nprint(os.path.exists('x.pkl'))"]),
   (18,"StudentDB using Dictionary + Pickle (Undo/Redo)",
    "A mini database using dict + pickle persistence.",
-   "CRUD + save/load + undo/redo snapshots for safety.",
+   "CRUD + save/load + undo/redo that keeps only the records each change replaced.",
    "Your first complete console project: data + logic + persistence.",
    ["# Full code in Appendix A",
     "# Run: python studentdb_pickle_undo_redo.py",
     "# Try: add → undo → redo → save → exit → run again → load"]),
   (19,"StudentDB using Dictionary + JSON (Undo/Redo)",
    "Same StudentDB using JSON (human-readable).",
-   "Store keys as strings; json.dump with indent; same undo/redo logic.",
+   "String keys; one JSON record per line in studentdb.ndjson; same undo/redo logic.",
    "Great for portability and debugging saved data.",
    ["# Full code in Appendix B",
     "# Run: python studentdb_json_undo_redo.py",
-    "# Open studentdb.json to view records"]),
+    "# Open studentdb.ndjson to view records, one per line"]),
 ]
 
 # -------------------------
@@ -370,55 +679,797 @@ MCQS = {
 STUDENTDB_PICKLE_CODE = r'''# studentdb_pickle_undo_redo.py
 import pickle
 import os
-import copy
+import sys
+import mmap
+import csv
+import operator
+import json
+import time
+import itertools
+import bisect
+import argparse
+import struct
+import hashlib
+import zlib
+import shutil
+from array import array
+from collections.abc import MutableMapping
 
 FILE_NAME = "studentdb.pkl"
+JOURNAL_NAME = FILE_NAME + ".journal"
+JOURNAL = True                  # False = rewrite the whole file on every save
+COMPACT_MIN_BYTES = 64 * 1024   # journal size before it may be folded back in
+DIRTY = set()                   # rolls changed since the last save
+IMPORT_BATCH = 10000            # imported rows per undo step
+BULK_CHANGES = 1000             # bigger batches rebuild the indexes once
+UNDO_NAME = FILE_NAME + ".undo"
+UNDO_FILE = True                # False = undo history ends with the program
+UNDO_DEPTH = 1000               # undo steps kept; the oldest are dropped first
+UNDO_BUDGET = 64 * 1024 * 1024  # bytes of undo steps held in memory (estimated)
 
-def load_db():
-    if os.path.exists(FILE_NAME):
+class Student:
+    # One record in three slots instead of a dict per student: about 140
+    # bytes per record in memory instead of about 325 (names are interned,
+    # so repeated names are stored once). Reads like the old dicts, so
+    # s["name"] and dict(s) still work; records are never changed in place.
+    __slots__ = ("roll", "name", "marks")
+
+    def __init__(self, roll, name, marks):
+        self.roll, self.name, self.marks = roll, sys.intern(name), marks
+
+    def __getitem__(self, field):
+        if field not in self.__slots__:
+            raise KeyError(field)
+        return getattr(self, field)
+
+    def keys(self):
+        return self.__slots__
+
+    def __eq__(self, other):
+        return (isinstance(other, Student) and
+                (self.roll, self.name, self.marks) == (other.roll, other.name, other.marks))
+
+    def __repr__(self):
+        return f"Student({self.roll!r}, {self.name!r}, {self.marks!r})"
+
+# Sorted indexes kept up to date by apply_change: rolls in order (for paged
+# viewing), (name.casefold(), roll) and (marks, roll) pairs, so ordered
+# listing, name-prefix, marks-range and top-N queries are a bisect instead
+# of a sort or a scan over every record. The name and marks indexes need
+# every record decoded, so they are only built by the first such query.
+# STATS (the marks total and students per grade) is built and kept up to
+# date with them, so class_stats never walks the records either.
+PAGE_SIZE = 20
+ROLL_INDEX = []
+NAME_INDEX = []
+MARKS_INDEX = []
+SEARCH_INDEXES = {"built": False}
+GRADES = (("A", 90), ("B", 75), ("C", 60), ("D", 40), ("F", 0))  # lowest marks per grade
+MAX_MARKS = 100
+STATS = {"total": 0, "grades": {}}
+
+def grade_of(marks):
+    # marks below every bound (never valid, but never a crash) count as the lowest grade
+    return next((grade for grade, low in GRADES if marks >= low), GRADES[-1][0])
+
+def count_stats(record, sign):
+    STATS["total"] += sign * record.marks
+    STATS["grades"][grade_of(record.marks)] += sign
+
+def search_entries(key, record):
+    # the record's NAME_INDEX and MARKS_INDEX entries
+    return (record.name.casefold(), key), (record.marks, key)
+
+def index_entries(key, record):
+    entries = [(ROLL_INDEX, key)]
+    if SEARCH_INDEXES["built"]:
+        name, marks = search_entries(key, record)
+        entries += [(NAME_INDEX, name), (MARKS_INDEX, marks)]
+    return entries
+
+def rebuild_indexes(db, before=None):
+    # ROLL_INDEX is listed again from the db. With `before` (key -> record
+    # before a bulk change) and the search indexes built, only the changed
+    # records' entries and STATS counts are swapped, in one pass over each
+    # index, so class_stats stays O(1) after imports and big undos too.
+    # Otherwise the search indexes and STATS wait for the next query.
+    ROLL_INDEX[:] = db.roll_list()
+    if before is None or not SEARCH_INDEXES["built"]:
+        NAME_INDEX.clear()
+        MARKS_INDEX.clear()
+        SEARCH_INDEXES["built"] = False
+        return
+    gone, added = [], []
+    for key, old in before.items():
+        new = db.get(key)
+        for record, sign, entries in ((old, -1, gone), (new, 1, added)):
+            if record is not None:
+                count_stats(record, sign)
+                entries.append(search_entries(key, record))
+    for i, index in enumerate((NAME_INDEX, MARKS_INDEX)):
+        drop = {pair[i] for pair in gone}
+        if drop:
+            index[:] = [entry for entry in index if entry not in drop]
+        index.extend(pair[i] for pair in added)
+        index.sort()  # two sorted runs: a linear merge
+
+def build_search_indexes(db):
+    if SEARCH_INDEXES["built"]:
+        return
+    names, marks = [], []
+    STATS["total"] = 0
+    STATS["grades"] = dict.fromkeys((grade for grade, _low in GRADES), 0)
+    for k, s in db.items():
+        name, mark = search_entries(k, s)
+        names.append(name)
+        marks.append(mark)
+        count_stats(s, 1)
+    NAME_INDEX[:] = sorted(names)
+    MARKS_INDEX[:] = sorted(marks)
+    SEARCH_INDEXES["built"] = True
+
+# The snapshot is FILE_NAME, one pickled (roll, name, marks) per record in
+# roll order, plus INDEX_NAME: a header (magic, the data file's size and
+# mtime, record count) followed by the sorted rolls and then their offsets,
+# as int64 arrays in native byte order. Both files are mmap'd, so opening
+# even a 1M-record db reads no records at all.
+INDEX_NAME = FILE_NAME + ".idx"
+INDEX_MAGIC = b"SDBIDX01"
+INDEX_HEADER = struct.Struct("=8sqqq")
+
+class LazyDB(MutableMapping):
+    # The last snapshot, decoded one record at a time through the mapped
+    # index, plus `changes`: records added or updated (Student) or deleted
+    # (None) since that snapshot was written.
+    def __init__(self):
+        self.data = self.index = None
+        self.rolls = self.offsets = ()
+        self.open_snapshot()
+
+    def open_snapshot(self):
+        # Leaves an empty snapshot (indexed = False) when INDEX_NAME is
+        # missing or does not describe the FILE_NAME on disk.
+        self.close_snapshot()
+        self.changes = {}
+        self.size = 0
+        self.indexed = False
         try:
+            st = os.stat(FILE_NAME)
+            with open(INDEX_NAME, "rb") as f:
+                index = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except (OSError, ValueError):
+            return
+        if len(index) < INDEX_HEADER.size:
+            index.close()
+            return
+        magic, self.data_end, mtime, count = INDEX_HEADER.unpack_from(index)
+        if ((magic, self.data_end, mtime) != (INDEX_MAGIC, st.st_size, st.st_mtime_ns)
+                or len(index) != INDEX_HEADER.size + 16 * count):
+            index.close()
+            return
+        self.index = index
+        if self.data_end:
             with open(FILE_NAME, "rb") as f:
-                db = pickle.load(f)
-            if isinstance(db, dict):
-                cleaned = {}
-                for k, v in db.items():
-                    try:
-                        ik = int(k)
-                    except Exception:
-                        continue
-                    cleaned[ik] = v
-                return cleaned
+                self.data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        start = INDEX_HEADER.size
+        self.rolls = memoryview(index)[start:start + 8 * count].cast("q")
+        self.offsets = memoryview(index)[start + 8 * count:].cast("q")
+        self.size = count
+        self.indexed = True
+
+    def close_snapshot(self):
+        for view in (self.rolls, self.offsets):
+            if isinstance(view, memoryview):
+                view.release()
+        for mapped in (self.data, self.index):
+            if mapped is not None:
+                mapped.close()
+        self.data = self.index = None
+        self.rolls = self.offsets = ()
+
+    def _find(self, roll):
+        i = bisect.bisect_left(self.rolls, roll)
+        return i if i < len(self.rolls) and self.rolls[i] == roll else None
+
+    def _raw(self, i):
+        end = self.offsets[i + 1] if i + 1 < len(self.offsets) else self.data_end
+        return self.data[self.offsets[i]:end]
+
+    def __getitem__(self, roll):
+        if roll in self.changes:
+            record = self.changes[roll]
+        else:
+            i = self._find(roll)
+            record = None if i is None else Student(*pickle.loads(self._raw(i)))
+        if record is None:
+            raise KeyError(roll)
+        return record
+
+    def __contains__(self, roll):
+        if roll in self.changes:
+            return self.changes[roll] is not None
+        return self._find(roll) is not None
+
+    def __setitem__(self, roll, record):
+        if roll not in self:
+            self.size += 1
+        self.changes[roll] = record
+
+    def __delitem__(self, roll):
+        if roll not in self:
+            raise KeyError(roll)
+        self.changes[roll] = None
+        self.size -= 1
+
+    def __len__(self):
+        return self.size
+
+    def __iter__(self):
+        for roll in self.rolls:
+            if roll not in self.changes:
+                yield roll
+        for roll, record in list(self.changes.items()):
+            if record is not None:
+                yield roll
+
+    def roll_list(self):
+        # every roll in order, without decoding any record
+        if not self.changes:
+            return list(self.rolls)
+        live = [roll for roll in self.rolls if roll not in self.changes]
+        live += [roll for roll, record in self.changes.items() if record is not None]
+        return sorted(live)
+
+    def encoded(self, roll, changes=None):
+        # the record as stored in FILE_NAME; unchanged ones are copied as is.
+        # changes: a frozen copy of self.changes to read changed records from
+        changes = self.changes if changes is None else changes
+        if roll not in changes:
+            i = self._find(roll)
+            if i is not None:
+                return self._raw(i)
+        s = changes.get(roll)
+        if s is None:
+            raise KeyError(roll)
+        return pickle.dumps((s.roll, s.name, s.marks))
+
+# The journal stores (name, marks) under each roll; older snapshot files
+# with a dict per record still load.
+def to_plain(s):
+    return None if s is None else (s.name, s.marks)
+
+def from_plain(roll, value):
+    # Raises KeyError, TypeError or ValueError for anything but a record
+    # with a roll and marks parse_int would accept and a str name.
+    if value is None:
+        return None
+    name, marks = (value["name"], value["marks"]) if isinstance(value, dict) else value
+    if not (plain_int(roll) and plain_int(marks) and isinstance(name, str)):
+        raise TypeError(f"not a student record: {roll!r}: {value!r}")
+    return Student(roll, name, marks)
+
+def plain_int(n):
+    return type(n) is int and 0 <= n < 2 ** 63
+
+def load_snapshot():
+    db = LazyDB()
+    if db.indexed or not os.path.exists(FILE_NAME):
+        return db
+    # No usable index: an older whole-db pickle, or records whose index was
+    # lost in a crash. Read everything once; the next save writes an index.
+    # A bad record is skipped and counted; one that cannot even be unpickled
+    # ends the stream (pickles have no framing to resync on), and counts
+    # for the rest of the file.
+    bad = 0
+    with open(FILE_NAME, "rb") as f:
+        try:
+            first = pickle.load(f)
+        except EOFError:
+            first = {}
         except Exception:
-            pass
-    return {}
+            first, bad = {}, 1
+        if isinstance(first, dict):
+            for k, v in first.items():
+                roll = parse_int(k)
+                try:
+                    s = from_plain(roll, v)
+                except (ValueError, KeyError, TypeError):
+                    s = None
+                if s is None or not valid_marks(s.marks):
+                    bad += 1
+                    continue
+                db[roll] = s
+        else:
+            while True:
+                try:
+                    s = from_plain(first[0], first[1:])
+                except (IndexError, KeyError, TypeError, ValueError):
+                    s = None
+                if s is None or not valid_marks(s.marks):
+                    bad += 1
+                else:
+                    db[s.roll] = s
+                try:
+                    first = pickle.load(f)
+                except EOFError:
+                    break
+                except Exception:
+                    bad += 1
+                    break
+    if bad:
+        keep_unreadable(bad)
+    return db
+
+def keep_unreadable(bad):
+    # Part of FILE_NAME could not be read. It is copied aside before a save
+    # can replace it with only the records that loaded; if the copy fails,
+    # the OSError stops the program before anything is saved.
+    backup = f"{FILE_NAME}.{time.strftime('%Y%m%d-%H%M%S')}.bak"
+    shutil.copy2(FILE_NAME, backup)
+    print(f"Warning: skipped {bad} unreadable record(s) in {FILE_NAME}; "
+          f"the file as it was is kept in {backup}.", file=sys.stderr)
+
+def read_journal():
+    # Entries are [size][crc32][pickled (roll, (name, marks) or None)]. A
+    # torn or corrupt tail (crash during a save) is cut off so new entries
+    # follow good data.
+    if not os.path.exists(JOURNAL_NAME):
+        return []
+    with open(JOURNAL_NAME, "rb") as f:
+        data = f.read()
+    changes = []
+    good = 0
+    while good + 8 <= len(data):
+        size, crc = struct.unpack_from("<II", data, good)
+        payload = data[good + 8:good + 8 + size]
+        if len(payload) < size or zlib.crc32(payload) != crc:
+            break
+        roll, value = pickle.loads(payload)
+        changes.append((roll, from_plain(roll, value)))
+        good += 8 + size
+    if good < len(data):
+        with open(JOURNAL_NAME, "r+b") as f:
+            f.truncate(good)
+    return changes
+
+def load_db():
+    db = load_snapshot()
+    apply_changes(db, read_journal(), reindex=False)
+    rebuild_indexes(db)
+    DIRTY.clear()
+    return db
+
+def write_snapshot(db, rolls, changes):
+    # Records in roll order, then the index, each to a temp file that
+    # end_save renames into place. The index names the data file's size and
+    # mtime, so after a crash between the two renames it is rejected rather
+    # than trusted.
+    written, offsets = array("q"), array("q")
+    pos = 0
+    with open(FILE_NAME + ".tmp", "wb") as f:
+        for roll in rolls:
+            blob = db.encoded(roll, changes)
+            written.append(roll)
+            offsets.append(pos)
+            f.write(blob)
+            pos += len(blob)
+        f.flush()
+        os.fsync(f.fileno())
+    st = os.stat(FILE_NAME + ".tmp")
+    with open(INDEX_NAME + ".tmp", "wb") as f:
+        f.write(INDEX_HEADER.pack(INDEX_MAGIC, st.st_size, st.st_mtime_ns, len(written)))
+        written.tofile(f)
+        offsets.tofile(f)
+        f.flush()
+        os.fsync(f.fileno())
+
+def journal_entry(roll, s):
+    payload = pickle.dumps((roll, to_plain(s)))
+    return struct.pack("<II", len(payload), zlib.crc32(payload)) + payload
+
+# A save is three steps, so the server can run the slow middle one (the
+# file writes and fsync) in a worker thread while it keeps answering reads:
+# begin_save freezes what is to be written, write_save writes and fsyncs it
+# from that frozen copy and the snapshot already mapped, and end_save swaps
+# the new files in and marks saved exactly the records that were written.
+# save_db runs the three in a row.
+def begin_save(db):
+    # Journal mode appends only the records changed since the last save.
+    # A full snapshot is written when there is no indexed one yet, and again
+    # (compaction) once the journal would outgrow it, so startup stays cheap.
+    saved = {roll: db.get(roll) for roll in DIRTY}
+    if JOURNAL and db.indexed and len(DIRTY) <= len(db) // 2:
+        entries = [journal_entry(roll, s) for roll, s in saved.items()]
+        size = os.path.getsize(JOURNAL_NAME) if os.path.exists(JOURNAL_NAME) else 0
+        if size + sum(map(len, entries)) <= max(COMPACT_MIN_BYTES, os.path.getsize(FILE_NAME)):
+            return {"saved": saved, "journal": entries}
+    return {"saved": saved, "rolls": list(ROLL_INDEX), "changes": dict(db.changes)}
+
+def write_save(db, plan):
+    if "journal" in plan:
+        with open(JOURNAL_NAME, "ab") as f:
+            f.write(b"".join(plan["journal"]))
+            f.flush()
+            os.fsync(f.fileno())
+    else:
+        write_snapshot(db, plan["rolls"], plan["changes"])
+
+def end_save(db, plan):
+    if "journal" in plan:
+        for roll, s in plan["saved"].items():
+            if db.get(roll) is s:  # not changed again since begin_save
+                DIRTY.discard(roll)
+        return
+    frozen = plan["changes"]
+    later = {roll: s for roll, s in db.changes.items() if roll not in frozen or frozen[roll] is not s}
+    db.close_snapshot()
+    os.replace(FILE_NAME + ".tmp", FILE_NAME)
+    os.replace(INDEX_NAME + ".tmp", INDEX_NAME)
+    if os.path.exists(JOURNAL_NAME):
+        os.remove(JOURNAL_NAME)
+    db.open_snapshot()
+    for roll, s in later.items():
+        if s is not None:
+            db[roll] = s
+        elif roll in db:
+            del db[roll]
+    DIRTY.intersection_update(later)
 
 def save_db(db):
-    with open(FILE_NAME, "wb") as f:
-        pickle.dump(db, f)
+    plan = begin_save(db)
+    write_save(db, plan)
+    end_save(db, plan)
+
+def db_stamp(db=None):
+    # The saved db as the undo file knows it: the data file's and journal's
+    # sizes and mtimes, which every save changes, whoever makes it.
+    h = hashlib.blake2b(digest_size=16)
+    for name in (FILE_NAME, JOURNAL_NAME):
+        try:
+            st = os.stat(name)
+        except OSError:
+            h.update(bytes(16))
+            continue
+        h.update(struct.pack("<qq", st.st_size, st.st_mtime_ns))
+    return h.digest()
+
+def parse_int(s):
+    # rolls and marks are stored as 64-bit integers
+    s = str(s).strip()
+    return int(s) if s.isdecimal() and int(s) < 2 ** 63 else None
 
 def input_int(prompt):
     while True:
-        s = input(prompt).strip()
-        if s.isdigit():
-            return int(s)
+        n = parse_int(input(prompt))
+        if n is not None:
+            return n
         print("Please enter a valid number.")
 
-def snapshot(db):
-    return copy.deepcopy(db)
+def input_marks(prompt):
+    while True:
+        n = input_int(prompt)
+        if n <= MAX_MARKS:
+            return n
+        print(f"Marks go from 0 to {MAX_MARKS}.")
+
+def valid_marks(marks):
+    return type(marks) is int and 0 <= marks <= MAX_MARKS
+
+def check_marks(marks):
+    # the API's guard: the menu and imports only pass marks valid_marks takes
+    if not valid_marks(marks):
+        raise ValueError(f"marks must be a whole number from 0 to {MAX_MARKS}: {marks!r}")
+
+# Undo/redo steps are lists of (key, record) pairs, not copies of the db.
+# apply_change puts a record in place (None = delete) and hands back the one
+# it replaced, so undoing a step is just applying the pairs it returned.
+def apply_change(db, key, record):
+    old = db.get(key)
+    DIRTY.add(key)
+    if old is not None:
+        for index, entry in index_entries(key, old):
+            del index[bisect.bisect_left(index, entry)]
+        if SEARCH_INDEXES["built"]:
+            count_stats(old, -1)
+    if record is None:
+        db.pop(key, None)
+    else:
+        db[key] = record
+        for index, entry in index_entries(key, record):
+            bisect.insort(index, entry)
+        if SEARCH_INDEXES["built"]:
+            count_stats(record, 1)
+    return old
 
-def push_undo(undo_stack, redo_stack, db):
-    undo_stack.append(snapshot(db))
+def apply_changes(db, changes, reindex=True):
+    # Applies (key, record) pairs in order and returns the pairs that undo
+    # them, newest first. Big batches skip per-record index upkeep and
+    # update the indexes once, from the records they replaced;
+    # reindex=False leaves that to the caller.
+    if reindex and len(changes) < BULK_CHANGES:
+        undo = [(key, apply_change(db, key, record)) for key, record in changes]
+    else:
+        undo = []
+        before = {}
+        for key, record in changes:
+            old = db.get(key)
+            undo.append((key, old))
+            before.setdefault(key, old)
+            DIRTY.add(key)
+            if record is None:
+                db.pop(key, None)
+            else:
+                db[key] = record
+        if reindex:
+            rebuild_indexes(db, before)
+    undo.reverse()
+    return undo
+
+def record_change(db, undo_stack, redo_stack, key, record):
+    undo_stack.append([(key, apply_change(db, key, record))])
     redo_stack.clear()
 
+def step_bytes(step):
+    # rough memory an undo step holds: its pairs and the records they keep
+    return sys.getsizeof(step) + sum(
+        72 + (0 if r is None else sys.getsizeof(r) + sys.getsizeof(r["name"])) for _key, r in step)
+
+# In the undo file a step is a pickled list of (roll, (name, marks) or None).
+def encode_step(step):
+    return zlib.compress(pickle.dumps([(key, to_plain(record)) for key, record in step]))
+
+def decode_step(data):
+    return [(key, from_plain(key, value)) for key, value in pickle.loads(zlib.decompress(data))]
+
+class UndoHistory:
+    # A stack of undo (or redo) steps used like the list it replaces:
+    # append, pop, clear, len and stack[-1]. Past `depth` steps, or `budget`
+    # bytes of steps held in memory, the oldest steps are dropped (the
+    # newest one is always kept); None lifts a limit.
+    #
+    # With a path, save() writes the stack there as zlib-compressed steps,
+    # framed like the journal ([size][crc32][data]) after a header that
+    # counts the dropped frames still at the front, and the saved steps
+    # leave memory. Opening reads only the frame headers; a step is read
+    # back when undo reaches it. save() runs right after save_db, and the
+    # header keeps db_stamp() of the db it was saved with. If the db has
+    # been saved since by anything else (the server, another process) the
+    # stamp no longer matches, and the file is ignored: its steps would
+    # undo changes this program never made.
+    HEADER = struct.Struct("<8sQ16s")
+    MAGIC = b"SDBUNDO2"
+
+    def __init__(self, path=None, depth=UNDO_DEPTH, budget=UNDO_BUDGET, stamp=None):
+        self.path, self.depth, self.budget = path, depth, budget
+        self.stamp = stamp  # None: take the file as it is
+        self.frames = []    # (offset, size, crc) of the saved steps, oldest first
+        self.steps = []     # steps since then, newest last
+        self.sizes = []     # step_bytes of each of those
+        self.used = 0
+        self.dropped = 0    # frames at the front of the file no longer in the stack
+        if path and os.path.exists(path):
+            self._scan()
+
+    def _scan(self):
+        # A torn frame at the end (crash during a save) ends the history.
+        with open(self.path, "rb") as f:
+            end = os.fstat(f.fileno()).st_size
+            header = f.read(self.HEADER.size)
+            if len(header) < self.HEADER.size:
+                return
+            magic, dead, stamp = self.HEADER.unpack(header)
+            if magic != self.MAGIC or self.stamp not in (None, stamp):
+                return
+            pos = self.HEADER.size
+            while pos + 8 <= end:
+                f.seek(pos)
+                size, crc = struct.unpack("<II", f.read(8))
+                if pos + 8 + size > end:
+                    break
+                if dead:
+                    dead -= 1
+                    self.dropped += 1
+                else:
+                    self.frames.append((pos + 8, size, crc))
+                pos += 8 + size
+        if self.depth is not None and len(self.frames) > self.depth:
+            self.dropped += len(self.frames) - self.depth
+            del self.frames[:len(self.frames) - self.depth]
+
+    def _read_last(self):
+        # A damaged step, or one from a file another process has saved over
+        # since, reads back as an empty one, and nothing older is kept.
+        offset, size, crc = self.frames.pop()
+        with open(self.path, "rb") as f:
+            header = f.read(self.HEADER.size)
+            f.seek(offset)
+            data = f.read(size)
+        magic, _dead, stamp = self.HEADER.unpack(header.ljust(self.HEADER.size, b"\0"))
+        if zlib.crc32(data) != crc or magic != self.MAGIC or self.stamp not in (None, stamp):
+            self.dropped += len(self.frames)
+            self.frames.clear()
+            return []
+        return decode_step(data)
+
+    def _push(self, step):
+        size = step_bytes(step)
+        self.steps.append(step)
+        self.sizes.append(size)
+        self.used += size
+
+    def __len__(self):
+        return len(self.frames) + len(self.steps)
+
+    def __getitem__(self, i):
+        if i != -1 or not self:
+            raise IndexError("only the newest step can be read")
+        if not self.steps:
+            self._push(self._read_last())
+        return self.steps[-1]
+
+    def append(self, step):
+        self._push(step)
+        while len(self.steps) > 1 and self.budget is not None and self.used > self.budget:
+            # every saved step is older than those in memory, so they go too
+            self.dropped += len(self.frames)
+            self.frames.clear()
+            self.used -= self.sizes.pop(0)
+            del self.steps[0]
+        while self.depth is not None and len(self) > max(self.depth, 1):
+            if self.frames:
+                self.frames.pop(0)
+                self.dropped += 1
+            else:
+                self.used -= self.sizes.pop(0)
+                del self.steps[0]
+
+    def pop(self):
+        if self.steps:
+            self.used -= self.sizes.pop()
+            return self.steps.pop()
+        if self.frames:
+            return self._read_last()
+        raise IndexError("pop from empty history")
+
+    def clear(self):
+        self.dropped += len(self.frames)
+        self.frames.clear()
+        self.steps.clear()
+        self.sizes.clear()
+        self.used = 0
+
+    def save(self, stamp=None):
+        # Cuts the file back to the saved steps still in the stack and adds
+        # the new ones, under stamp (db_stamp() of the db just saved). Once
+        # most of it is dropped frames at the front, the kept ones are first
+        # copied (not decoded) into a new file.
+        if stamp is not None:
+            self.stamp = stamp
+        if not self.path or (not self and not os.path.exists(self.path)):
+            return
+        if not self.frames:
+            self.dropped = 0
+        elif self.dropped > len(self.frames):
+            self._rewrite()
+        end = self.frames[-1][0] + self.frames[-1][1] if self.frames else self.HEADER.size
+        with open(self.path, "r+b" if os.path.exists(self.path) else "wb") as f:
+            f.write(self.HEADER.pack(self.MAGIC, self.dropped, self.stamp or bytes(16)))
+            f.truncate(end)
+            f.seek(end)
+            for step in self.steps:
+                data = encode_step(step)
+                crc = zlib.crc32(data)
+                f.write(struct.pack("<II", len(data), crc) + data)
+                self.frames.append((end + 8, len(data), crc))
+                end += 8 + len(data)
+            f.flush()
+            os.fsync(f.fileno())
+        self.steps.clear()
+        self.sizes.clear()
+        self.used = 0
+
+    def _rewrite(self):
+        frames = []
+        with open(self.path, "rb") as src, open(self.path + ".tmp", "wb") as dst:
+            dst.write(self.HEADER.pack(self.MAGIC, 0, self.stamp or bytes(16)))
+            for offset, size, crc in self.frames:
+                src.seek(offset)
+                dst.write(struct.pack("<II", size, crc) + src.read(size))
+                frames.append((dst.tell() - size, size, crc))
+            dst.flush()
+            os.fsync(dst.fileno())
+        os.replace(self.path + ".tmp", self.path)
+        self.frames = frames
+        self.dropped = 0
+
+# Programmatic API: the menu's operations without prompts or printing, for
+# scripts, batch mode and benchmarks. Rolls are ints; every change is one
+# undo step, exactly as from the menu.
+def get_record(db, roll):
+    return db.get(roll)
+
+def add_record(db, undo_stack, redo_stack, roll, name, marks):
+    # False if the roll is already taken
+    check_marks(marks)
+    if roll in db:
+        return False
+    record_change(db, undo_stack, redo_stack, roll, Student(roll, name, marks))
+    return True
+
+def update_record(db, undo_stack, redo_stack, roll, name=None, marks=None):
+    # None keeps the current value; False if there is no such roll
+    if marks is not None:
+        check_marks(marks)
+    s = db.get(roll)
+    if s is None:
+        return False
+    record_change(db, undo_stack, redo_stack, roll,
+                  Student(roll, s.name if name is None else name, s.marks if marks is None else marks))
+    return True
+
+def delete_record(db, undo_stack, redo_stack, roll):
+    if roll not in db:
+        return False
+    record_change(db, undo_stack, redo_stack, roll, None)
+    return True
+
+def undo_last(db, undo_stack, redo_stack):
+    if not undo_stack:
+        return False
+    redo_stack.append(apply_changes(db, undo_stack.pop()))
+    return True
+
+def redo_last(db, undo_stack, redo_stack):
+    if not redo_stack:
+        return False
+    undo_stack.append(apply_changes(db, redo_stack.pop()))
+    return True
+
+def find_by_name(db, prefix, limit=None):
+    # limit: only the first that many matches are decoded and returned
+    prefix = prefix.strip().casefold()
+    build_search_indexes(db)
+    lo = bisect.bisect_left(NAME_INDEX, (prefix,))
+    hi = bisect.bisect_left(NAME_INDEX, (prefix + "\U0010ffff",))
+    return [db[k] for _name, k in NAME_INDEX[lo:hi][:limit]]
+
+def find_by_marks(db, low, high, limit=None):
+    build_search_indexes(db)
+    lo = bisect.bisect_left(MARKS_INDEX, (low,))
+    hi = bisect.bisect_left(MARKS_INDEX, (high + 1,))
+    return [db[k] for _marks, k in MARKS_INDEX[lo:hi][:limit]]
+
+def find_top(db, n):
+    build_search_indexes(db)
+    top = MARKS_INDEX[-n:] if n else []
+    return [db[k] for _marks, k in reversed(top)]
+
+def class_stats(db):
+    # Count, average, lowest and highest marks and students per grade, from
+    # the upkept totals and MARKS_INDEX rather than a walk over every record.
+    build_search_indexes(db)
+    count = len(MARKS_INDEX)
+    return {"count": count, "average": STATS["total"] / count if count else None,
+            "min": MARKS_INDEX[0][0] if count else None, "max": MARKS_INDEX[-1][0] if count else None,
+            "grades": dict(STATS["grades"])}
+
+def recompute_class_stats(db):
+    # class_stats worked out from scratch over every record, to check it against
+    marks = [s.marks for s in db.values()]
+    grades = dict.fromkeys((grade for grade, _low in GRADES), 0)
+    for m in marks:
+        grades[grade_of(m)] += 1
+    return {"count": len(marks), "average": sum(marks) / len(marks) if marks else None,
+            "min": min(marks, default=None), "max": max(marks, default=None), "grades": grades}
+
 def add_student(db, undo_stack, redo_stack):
-    push_undo(undo_stack, redo_stack, db)
     roll = input_int("Enter roll: ")
-    if roll in db:
+    if get_record(db, roll):
         print("Roll already exists. Use update option.")
         return
     name = input("Enter name: ").strip()
-    marks = input_int("Enter marks (0-100): ")
-    db[roll] = {"roll": roll, "name": name, "marks": marks}
+    marks = input_marks(f"Enter marks (0-{MAX_MARKS}): ")
+    add_record(db, undo_stack, redo_stack, roll, name, marks)
     print("Student added.")
 
 def view_all(db):
@@ -426,69 +1477,281 @@ def view_all(db):
         print("No records found.")
         return
     print("\n--- All Students ---")
-    for roll in sorted(db.keys()):
-        s = db[roll]
-        print(f"Roll: {s['roll']} | Name: {s['name']} | Marks: {s['marks']}")
+    pos = 0
+    while pos < len(ROLL_INDEX):
+        for roll in ROLL_INDEX[pos:pos + PAGE_SIZE]:
+            s = db[roll]
+            print(f"Roll: {s['roll']} | Name: {s['name']} | Marks: {s['marks']}")
+        pos += PAGE_SIZE
+        if pos >= len(ROLL_INDEX):
+            break
+        more = input(f"-- {pos} of {len(ROLL_INDEX)} | Enter = next page, roll = jump, q = stop: ").strip()
+        if more.lower() == "q":
+            break
+        if more.isdigit():
+            pos = bisect.bisect_left(ROLL_INDEX, int(more))
 
 def search_student(db):
     roll = input_int("Enter roll to search: ")
-    s = db.get(roll)
+    s = get_record(db, roll)
     if not s:
         print("Student not found.")
         return
     print(f"Found -> Roll: {s['roll']} | Name: {s['name']} | Marks: {s['marks']}")
 
+def show_students(records):
+    if not records:
+        print("No matching students.")
+        return
+    for s in records:
+        print(f"Roll: {s['roll']} | Name: {s['name']} | Marks: {s['marks']}")
+
+def search_by_name(db):
+    show_students(find_by_name(db, input("Enter name or start of name: ")))
+
+def search_by_marks(db):
+    low = input_int("Lowest marks: ")
+    high = input_int("Highest marks: ")
+    show_students(find_by_marks(db, low, high))
+
+def top_students(db):
+    show_students(find_top(db, input_int("How many top students: ")))
+
+def class_report(db):
+    stats = class_stats(db)
+    if not stats["count"]:
+        print("No records found.")
+        return
+    print("\n--- Class Report ---")
+    print(f"Students: {stats['count']} | Average: {stats['average']:.1f} | "
+          f"Lowest: {stats['min']} | Highest: {stats['max']}")
+    for grade, low in GRADES:
+        n = stats["grades"][grade]
+        label = f"{grade} ({low}+):"
+        print(f"{label:<9}{n:>7} {'#' * round(40 * n / stats['count'])}")
+    print("Top 5:")
+    show_students(find_top(db, 5))
+
 def update_student(db, undo_stack, redo_stack):
     roll = input_int("Enter roll to update: ")
-    if roll not in db:
+    s = get_record(db, roll)
+    if not s:
         print("Student not found.")
         return
-    push_undo(undo_stack, redo_stack, db)
-    s = db[roll]
     print(f"Current -> Name: {s['name']} | Marks: {s['marks']}")
     new_name = input("Enter new name (blank = keep): ").strip()
     new_marks = input("Enter new marks (blank = keep): ").strip()
-    if new_name:
-        s["name"] = new_name
-    if new_marks:
-        if new_marks.isdigit():
-            s["marks"] = int(new_marks)
-        else:
-            print("Invalid marks. Keeping old marks.")
-    db[roll] = s
+    marks = parse_int(new_marks) if new_marks else None
+    if new_marks and not valid_marks(marks):
+        print("Invalid marks. Keeping old marks.")
+        marks = None
+    update_record(db, undo_stack, redo_stack, roll, new_name or None, marks)
     print("Student updated.")
 
 def delete_student(db, undo_stack, redo_stack):
     roll = input_int("Enter roll to delete: ")
-    if roll not in db:
+    if not delete_record(db, undo_stack, redo_stack, roll):
         print("Student not found.")
         return
-    push_undo(undo_stack, redo_stack, db)
-    del db[roll]
     print("Student deleted.")
 
+def read_rows(path):
+    # Streams raw (roll, name, marks) values from a .csv file with a
+    # roll,name,marks header, or from a .ndjson/.jsonl file of objects.
+    with open(path, "r", encoding="utf-8", newline="") as f:
+        if path.lower().endswith(".csv"):
+            rows = csv.reader(f)
+            header = [h.strip().lower() for h in next(rows, [])]
+            if not {"roll", "name", "marks"} <= set(header):
+                raise csv.Error("CSV header must name roll, name and marks columns")
+            pick = operator.itemgetter(header.index("roll"), header.index("name"), header.index("marks"))
+            width = len(header)
+            for row in rows:
+                yield pick(row) if len(row) >= width else (None, None, None)
+            return
+        for line in f:
+            if not line.strip():
+                continue
+            try:
+                row = json.loads(line)
+            except ValueError:
+                row = None
+            if not isinstance(row, dict):
+                row = {}
+            yield row.get("roll"), row.get("name"), row.get("marks")
+
+def valid_changes(rows, counts):
+    # Same rules as the menu for roll and marks; bad rows are counted, not fatal.
+    for roll, name, marks in rows:
+        roll, marks = parse_int(roll), parse_int(marks)
+        if roll is None or not valid_marks(marks) or name is None:
+            counts["skipped"] += 1
+            continue
+        yield roll, Student(roll, str(name).strip(), marks)
+
+def import_students(db, undo_stack, redo_stack):
+    path = input("File to import (.csv or .ndjson): ").strip()
+    if not os.path.isfile(path):
+        print("File not found.")
+        return
+    counts = {"imported": 0, "skipped": 0}
+    changes = valid_changes(read_rows(path), counts)
+    start = time.perf_counter()
+    stale = False  # indexes are updated once at the end after any bulk batch
+    before = {}    # key -> record before the import, for that update
+    try:
+        while True:
+            batch = list(itertools.islice(changes, IMPORT_BATCH))
+            if not batch:
+                break
+            stale = stale or len(batch) >= BULK_CHANGES
+            step = apply_changes(db, batch, reindex=not stale)
+            undo_stack.append(step)
+            if stale and SEARCH_INDEXES["built"]:
+                for key, old in reversed(step):
+                    before.setdefault(key, old)
+            counts["imported"] += len(batch)
+    except (OSError, UnicodeDecodeError, csv.Error) as e:
+        print("Import stopped:", e)
+    finally:
+        if stale:
+            rebuild_indexes(db, before)
+    if counts["imported"]:
+        redo_stack.clear()
+    secs = max(time.perf_counter() - start, 1e-9)
+    print(f"Imported {counts['imported']} students, skipped {counts['skipped']} invalid rows "
+          f"in {secs:.2f}s ({counts['imported'] / secs:,.0f} rows/s).")
+
+def export_students(db):
+    path = input("File to export (.csv or .ndjson): ").strip()
+    start = time.perf_counter()
+    try:
+        with open(path, "w", encoding="utf-8", newline="") as f:
+            if path.lower().endswith(".csv"):
+                w = csv.writer(f)
+                w.writerow(["roll", "name", "marks"])
+                for roll in ROLL_INDEX:
+                    s = db[roll]
+                    w.writerow([s["roll"], s["name"], s["marks"]])
+            else:
+                encode = json.JSONEncoder(ensure_ascii=False, default=dict).encode
+                for roll in ROLL_INDEX:
+                    f.write(encode(db[roll]) + "\n")
+    except OSError as e:
+        print("Export failed:", e)
+        return
+    secs = max(time.perf_counter() - start, 1e-9)
+    print(f"Exported {len(ROLL_INDEX)} students in {secs:.2f}s ({len(ROLL_INDEX) / secs:,.0f} rows/s).")
+
 def do_undo(db, undo_stack, redo_stack):
-    if not undo_stack:
-        print("Nothing to undo.")
-        return db
-    redo_stack.append(snapshot(db))
-    prev = undo_stack.pop()
-    print("Undo done.")
-    return prev
+    print("Undo done." if undo_last(db, undo_stack, redo_stack) else "Nothing to undo.")
 
 def do_redo(db, undo_stack, redo_stack):
-    if not redo_stack:
-        print("Nothing to redo.")
-        return db
-    undo_stack.append(snapshot(db))
-    nxt = redo_stack.pop()
-    print("Redo done.")
-    return nxt
+    print("Redo done." if redo_last(db, undo_stack, redo_stack) else "Nothing to redo.")
+
+# Batch mode (--batch FILE, "-" = stdin) runs one command per line with no
+# prompts and saves once, at the end:
+#   add ROLL MARKS NAME...      update ROLL MARKS|- [NAME...]    delete ROLL
+#   get ROLL    name PREFIX    marks LOW HIGH    top N    undo    redo    save
+# Blank lines and lines starting with "#" are skipped.
+def batch_int(word):
+    n = parse_int(word)
+    if n is None:
+        raise ValueError(f"not a valid number: {word!r}")
+    return n
+
+def run_command(db, undo_stack, redo_stack, words):
+    # Returns the records a query found (None for the other commands) and
+    # raises ValueError for a command that cannot be carried out.
+    cmd, args = words[0].lower(), words[1:]
+    if cmd == "add" and len(args) >= 2:
+        roll, marks = batch_int(args[0]), batch_int(args[1])
+        if not add_record(db, undo_stack, redo_stack, roll, " ".join(args[2:]), marks):
+            raise ValueError(f"roll {roll} already exists")
+    elif cmd == "update" and len(args) >= 2:
+        roll = batch_int(args[0])
+        marks = None if args[1] == "-" else batch_int(args[1])
+        if not update_record(db, undo_stack, redo_stack, roll, " ".join(args[2:]) or None, marks):
+            raise ValueError(f"roll {roll} not found")
+    elif cmd == "delete" and len(args) == 1:
+        roll = batch_int(args[0])
+        if not delete_record(db, undo_stack, redo_stack, roll):
+            raise ValueError(f"roll {roll} not found")
+    elif cmd == "get" and len(args) == 1:
+        s = get_record(db, batch_int(args[0]))
+        return [s] if s else []
+    elif cmd == "name":
+        return find_by_name(db, " ".join(args))
+    elif cmd == "marks" and len(args) == 2:
+        return find_by_marks(db, batch_int(args[0]), batch_int(args[1]))
+    elif cmd == "top" and len(args) == 1:
+        return find_top(db, batch_int(args[0]))
+    elif cmd == "undo" and not args:
+        if not undo_last(db, undo_stack, redo_stack):
+            raise ValueError("nothing to undo")
+    elif cmd == "redo" and not args:
+        if not redo_last(db, undo_stack, redo_stack):
+            raise ValueError("nothing to redo")
+    elif cmd == "save" and not args:
+        save_db(db)
+        undo_stack.save(db_stamp(db))
+    else:
+        raise ValueError("unknown command or wrong arguments: " + " ".join(words))
+    return None
+
+def run_batch(db, undo_stack, redo_stack, lines, quiet=False):
+    # Returns {"ops", "errors"}. Query results are printed as in the menu
+    # unless quiet; failed commands are reported on stderr and skipped.
+    counts = {"ops": 0, "errors": 0}
+    for n, line in enumerate(lines, 1):
+        words = line.split()
+        if not words or words[0].startswith("#"):
+            continue
+        counts["ops"] += 1
+        try:
+            found = run_command(db, undo_stack, redo_stack, words)
+        except ValueError as e:
+            counts["errors"] += 1
+            print(f"line {n}: {e}", file=sys.stderr)
+            continue
+        if found is not None and not quiet:
+            show_students(found)
+    return counts
 
-def main():
+def batch_main(db, path, save=True, quiet=False):
+    try:
+        f = sys.stdin if path == "-" else open(path, "r", encoding="utf-8")
+    except OSError as e:
+        raise SystemExit(f"Cannot read batch file: {e}")
+    undo_stack = UndoHistory(UNDO_NAME if UNDO_FILE else None, stamp=db_stamp(db))
+    start = time.perf_counter()
+    try:
+        counts = run_batch(db, undo_stack, UndoHistory(), f, quiet)
+    finally:
+        if f is not sys.stdin:
+            f.close()
+    secs = max(time.perf_counter() - start, 1e-9)
+    start = time.perf_counter()
+    if save:
+        save_db(db)
+        undo_stack.save(db_stamp(db))
+    print(f"Ran {counts['ops']} commands ({counts['errors']} failed) in {secs:.2f}s "
+          f"({counts['ops'] / secs:,.0f} ops/s); "
+          + (f"saved in {time.perf_counter() - start:.2f}s." if save else "not saved."),
+          file=sys.stderr)
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="StudentDB (Pickle) with undo/redo.")
+    ap.add_argument("--batch", metavar="FILE", help="run commands from FILE ('-' = stdin) instead of the menu")
+    ap.add_argument("--no-save", action="store_true", help="with --batch: discard the changes at the end")
+    ap.add_argument("--quiet", action="store_true", help="with --batch: do not print query results")
+    args = ap.parse_args(argv)
     db = load_db()
-    undo_stack = []
-    redo_stack = []
+    if args.batch:
+        batch_main(db, args.batch, save=not args.no_save, quiet=args.quiet)
+        return
+    undo_stack = UndoHistory(UNDO_NAME if UNDO_FILE else None, stamp=db_stamp(db))
+    redo_stack = UndoHistory()
     print("StudentDB (Pickle) loaded. Records:", len(db))
 
     while True:
@@ -499,13 +1762,19 @@ def main():
 1. Add Student
 2. View All Students
 3. Search Student
-4. Update Student
-5. Delete Student
-6. Undo
-7. Redo
-8. Save
-9. Save & Exit
-10. Exit (No Save)
+4. Search by Name
+5. Search by Marks Range
+6. Top Students by Marks
+7. Class Report
+8. Update Student
+9. Delete Student
+10. Import Students (CSV/NDJSON)
+11. Export Students (CSV/NDJSON)
+12. Undo
+13. Redo
+14. Save
+15. Save & Exit
+16. Exit (No Save)
 """)
         choice = input("Choose option: ").strip()
 
@@ -516,21 +1785,35 @@ def main():
         elif choice == "3":
             search_student(db)
         elif choice == "4":
-            update_student(db, undo_stack, redo_stack)
+            search_by_name(db)
         elif choice == "5":
-            delete_student(db, undo_stack, redo_stack)
+            search_by_marks(db)
         elif choice == "6":
-            db = do_undo(db, undo_stack, redo_stack)
+            top_students(db)
         elif choice == "7":
-            db = do_redo(db, undo_stack, redo_stack)
+            class_report(db)
         elif choice == "8":
+            update_student(db, undo_stack, redo_stack)
+        elif choice == "9":
+            delete_student(db, undo_stack, redo_stack)
+        elif choice == "10":
+            import_students(db, undo_stack, redo_stack)
+        elif choice == "11":
+            export_students(db)
+        elif choice == "12":
+            do_undo(db, undo_stack, redo_stack)
+        elif choice == "13":
+            do_redo(db, undo_stack, redo_stack)
+        elif choice == "14":
             save_db(db)
+            undo_stack.save(db_stamp(db))
             print("Saved.")
-        elif choice == "9":
+        elif choice == "15":
             save_db(db)
+            undo_stack.save(db_stamp(db))
             print("Saved. Bye!")
             break
-        elif choice == "10":
+        elif choice == "16":
             print("Bye! (Not saved)")
             break
         else:
@@ -543,144 +1826,1107 @@ if __name__ == "__main__":
 STUDENTDB_JSON_CODE = r'''# studentdb_json_undo_redo.py
 import json
 import os
-import copy
+import sys
+import mmap
+import csv
+import operator
+import time
+import itertools
+import bisect
+import argparse
+import struct
+import hashlib
+import zlib
+import shutil
+from array import array
+from collections.abc import MutableMapping
 
-FILE_NAME = "studentdb.json"
+FILE_NAME = "studentdb.ndjson"
+LEGACY_NAME = "studentdb.json"    # FILE_NAME before it held one record per line
+JOURNAL_NAME = FILE_NAME + ".journal"
+JOURNAL = True                  # False = rewrite the whole file on every save
+COMPACT_MIN_BYTES = 64 * 1024   # journal size before it may be folded back in
+DIRTY = set()                   # keys changed since the last save
+IMPORT_BATCH = 10000            # imported rows per undo step
+BULK_CHANGES = 1000             # bigger batches rebuild the indexes once
+UNDO_NAME = FILE_NAME + ".undo"
+UNDO_FILE = True                # False = undo history ends with the program
+UNDO_DEPTH = 1000               # undo steps kept; the oldest are dropped first
+UNDO_BUDGET = 64 * 1024 * 1024  # bytes of undo steps held in memory (estimated)
 
-def load_db():
-    if os.path.exists(FILE_NAME):
-        try:
-            with open(FILE_NAME, "r", encoding="utf-8") as f:
-                db = json.load(f)
-            if isinstance(db, dict):
-                cleaned = {}
-                for k, v in db.items():
-                    if isinstance(k, str) and isinstance(v, dict):
-                        cleaned[k] = v
-                return cleaned
-        except Exception:
-            pass
-    return {}
+class Student:
+    # One record in three slots instead of a dict per student: about 140
+    # bytes per record in memory instead of about 325 (names are interned,
+    # so repeated names are stored once). Reads like the old dicts, so
+    # s["name"] and dict(s) still work; records are never changed in place.
+    __slots__ = ("roll", "name", "marks")
 
-def save_db(db):
-    with open(FILE_NAME, "w", encoding="utf-8") as f:
-        json.dump(db, f, indent=2, ensure_ascii=False)
+    def __init__(self, roll, name, marks):
+        self.roll, self.name, self.marks = roll, sys.intern(name), marks
 
-def input_int(prompt):
-    while True:
-        s = input(prompt).strip()
-        if s.isdigit():
-            return int(s)
-        print("Please enter a valid number.")
+    def __getitem__(self, field):
+        if field not in self.__slots__:
+            raise KeyError(field)
+        return getattr(self, field)
 
-def snapshot(db):
-    return copy.deepcopy(db)
+    def keys(self):
+        return self.__slots__
 
-def push_undo(undo_stack, redo_stack, db):
-    undo_stack.append(snapshot(db))
-    redo_stack.clear()
+    def __eq__(self, other):
+        return (isinstance(other, Student) and
+                (self.roll, self.name, self.marks) == (other.roll, other.name, other.marks))
 
-def add_student(db, undo_stack, redo_stack):
-    push_undo(undo_stack, redo_stack, db)
-    roll = input_int("Enter roll: ")
-    key = str(roll)
-    if key in db:
-        print("Roll already exists. Use update option.")
-        return
-    name = input("Enter name: ").strip()
-    marks = input_int("Enter marks (0-100): ")
-    db[key] = {"roll": roll, "name": name, "marks": marks}
-    print("Student added.")
+    def __repr__(self):
+        return f"Student({self.roll!r}, {self.name!r}, {self.marks!r})"
 
-def view_all(db):
-    if not db:
-        print("No records found.")
-        return
-    print("\n--- All Students ---")
-    for key in sorted(db.keys(), key=lambda x: int(x)):
-        s = db[key]
-        print(f"Roll: {s['roll']} | Name: {s['name']} | Marks: {s['marks']}")
+# Sorted indexes kept up to date by apply_change: rolls in order (for paged
+# viewing), (name.casefold(), roll) and (marks, roll) pairs, so ordered
+# listing, name-prefix, marks-range and top-N queries are a bisect instead
+# of a sort or a scan over every record. The name and marks indexes need
+# every record decoded, so they are only built by the first such query.
+# STATS (the marks total and students per grade) is built and kept up to
+# date with them, so class_stats never walks the records either. Rolls
+# break ties as ints, not as the str keys, so equal names or marks list in
+# numeric roll order like the other versions ("9" before "10").
+PAGE_SIZE = 20
+ROLL_INDEX = []
+NAME_INDEX = []
+MARKS_INDEX = []
+SEARCH_INDEXES = {"built": False}
+GRADES = (("A", 90), ("B", 75), ("C", 60), ("D", 40), ("F", 0))  # lowest marks per grade
+MAX_MARKS = 100
+STATS = {"total": 0, "grades": {}}
 
-def search_student(db):
-    roll = input_int("Enter roll to search: ")
-    s = db.get(str(roll))
-    if not s:
-        print("Student not found.")
+def grade_of(marks):
+    # marks below every bound (never valid, but never a crash) count as the lowest grade
+    return next((grade for grade, low in GRADES if marks >= low), GRADES[-1][0])
+
+def count_stats(record, sign):
+    STATS["total"] += sign * record.marks
+    STATS["grades"][grade_of(record.marks)] += sign
+
+def search_entries(key, record):
+    # the record's NAME_INDEX and MARKS_INDEX entries
+    return (record.name.casefold(), int(key)), (record.marks, int(key))
+
+def index_entries(key, record):
+    entries = [(ROLL_INDEX, int(key))]
+    if SEARCH_INDEXES["built"]:
+        name, marks = search_entries(key, record)
+        entries += [(NAME_INDEX, name), (MARKS_INDEX, marks)]
+    return entries
+
+def rebuild_indexes(db, before=None):
+    # ROLL_INDEX is listed again from the db. With `before` (key -> record
+    # before a bulk change) and the search indexes built, only the changed
+    # records' entries and STATS counts are swapped, in one pass over each
+    # index, so class_stats stays O(1) after imports and big undos too.
+    # Otherwise the search indexes and STATS wait for the next query.
+    ROLL_INDEX[:] = db.roll_list()
+    if before is None or not SEARCH_INDEXES["built"]:
+        NAME_INDEX.clear()
+        MARKS_INDEX.clear()
+        SEARCH_INDEXES["built"] = False
         return
-    print(f"Found -> Roll: {s['roll']} | Name: {s['name']} | Marks: {s['marks']}")
+    gone, added = [], []
+    for key, old in before.items():
+        new = db.get(key)
+        for record, sign, entries in ((old, -1, gone), (new, 1, added)):
+            if record is not None:
+                count_stats(record, sign)
+                entries.append(search_entries(key, record))
+    for i, index in enumerate((NAME_INDEX, MARKS_INDEX)):
+        drop = {pair[i] for pair in gone}
+        if drop:
+            index[:] = [entry for entry in index if entry not in drop]
+        index.extend(pair[i] for pair in added)
+        index.sort()  # two sorted runs: a linear merge
 
-def update_student(db, undo_stack, redo_stack):
-    roll = input_int("Enter roll to update: ")
-    key = str(roll)
-    if key not in db:
-        print("Student not found.")
+def build_search_indexes(db):
+    if SEARCH_INDEXES["built"]:
         return
-    push_undo(undo_stack, redo_stack, db)
-    s = db[key]
-    print(f"Current -> Name: {s['name']} | Marks: {s['marks']}")
-    new_name = input("Enter new name (blank = keep): ").strip()
-    new_marks = input("Enter new marks (blank = keep): ").strip()
-    if new_name:
-        s["name"] = new_name
-    if new_marks:
-        if new_marks.isdigit():
-            s["marks"] = int(new_marks)
+    names, marks = [], []
+    STATS["total"] = 0
+    STATS["grades"] = dict.fromkeys((grade for grade, _low in GRADES), 0)
+    for k, s in db.items():
+        name, mark = search_entries(k, s)
+        names.append(name)
+        marks.append(mark)
+        count_stats(s, 1)
+    NAME_INDEX[:] = sorted(names)
+    MARKS_INDEX[:] = sorted(marks)
+    SEARCH_INDEXES["built"] = True
+
+# The snapshot is FILE_NAME, one {"roll", "name", "marks"} JSON line per
+# record in roll order, plus INDEX_NAME: a header (magic, the data file's
+# size and mtime, record count) followed by the sorted rolls and then their
+# byte offsets, as int64 arrays in native byte order. Both files are mmap'd, so opening
+# even a 1M-record db reads no records at all.
+INDEX_NAME = FILE_NAME + ".idx"
+INDEX_MAGIC = b"SDBIDX01"
+INDEX_HEADER = struct.Struct("=8sqqq")
+
+class LazyDB(MutableMapping):
+    # The last snapshot, decoded one record at a time through the mapped
+    # index, plus `changes`: records added or updated (Student) or deleted
+    # (None) since that snapshot was written.
+    def __init__(self):
+        self.data = self.index = None
+        self.rolls = self.offsets = ()
+        self.open_snapshot()
+
+    def open_snapshot(self):
+        # Leaves an empty snapshot (indexed = False) when INDEX_NAME is
+        # missing or does not describe the FILE_NAME on disk.
+        self.close_snapshot()
+        self.changes = {}
+        self.size = 0
+        self.indexed = False
+        try:
+            st = os.stat(FILE_NAME)
+            with open(INDEX_NAME, "rb") as f:
+                index = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except (OSError, ValueError):
+            return
+        if len(index) < INDEX_HEADER.size:
+            index.close()
+            return
+        magic, self.data_end, mtime, count = INDEX_HEADER.unpack_from(index)
+        if ((magic, self.data_end, mtime) != (INDEX_MAGIC, st.st_size, st.st_mtime_ns)
+                or len(index) != INDEX_HEADER.size + 16 * count):
+            index.close()
+            return
+        self.index = index
+        if self.data_end:
+            with open(FILE_NAME, "rb") as f:
+                self.data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        start = INDEX_HEADER.size
+        self.rolls = memoryview(index)[start:start + 8 * count].cast("q")
+        self.offsets = memoryview(index)[start + 8 * count:].cast("q")
+        self.size = count
+        self.indexed = True
+
+    def close_snapshot(self):
+        for view in (self.rolls, self.offsets):
+            if isinstance(view, memoryview):
+                view.release()
+        for mapped in (self.data, self.index):
+            if mapped is not None:
+                mapped.close()
+        self.data = self.index = None
+        self.rolls = self.offsets = ()
+
+    def _find(self, roll):
+        i = bisect.bisect_left(self.rolls, roll)
+        return i if i < len(self.rolls) and self.rolls[i] == roll else None
+
+    def _raw(self, i):
+        end = self.offsets[i + 1] if i + 1 < len(self.offsets) else self.data_end
+        return self.data[self.offsets[i]:end]
+
+    def __getitem__(self, key):
+        if key in self.changes:
+            record = self.changes[key]
         else:
-            print("Invalid marks. Keeping old marks.")
-    db[key] = s
-    print("Student updated.")
+            i = self._find(int(key))
+            record = None if i is None else from_plain(json.loads(self._raw(i)))
+        if record is None:
+            raise KeyError(key)
+        return record
 
-def delete_student(db, undo_stack, redo_stack):
-    roll = input_int("Enter roll to delete: ")
-    key = str(roll)
-    if key not in db:
-        print("Student not found.")
-        return
-    push_undo(undo_stack, redo_stack, db)
-    del db[key]
-    print("Student deleted.")
+    def __contains__(self, key):
+        if key in self.changes:
+            return self.changes[key] is not None
+        return self._find(int(key)) is not None
 
-def do_undo(db, undo_stack, redo_stack):
-    if not undo_stack:
-        print("Nothing to undo.")
-        return db
-    redo_stack.append(snapshot(db))
-    prev = undo_stack.pop()
-    print("Undo done.")
-    return prev
+    def __setitem__(self, key, record):
+        if key not in self:
+            self.size += 1
+        self.changes[key] = record
 
-def do_redo(db, undo_stack, redo_stack):
-    if not redo_stack:
-        print("Nothing to redo.")
-        return db
-    undo_stack.append(snapshot(db))
-    nxt = redo_stack.pop()
-    print("Redo done.")
-    return nxt
+    def __delitem__(self, key):
+        if key not in self:
+            raise KeyError(key)
+        self.changes[key] = None
+        self.size -= 1
 
-def main():
-    db = load_db()
-    undo_stack = []
-    redo_stack = []
-    print("StudentDB (JSON) loaded. Records:", len(db))
+    def __len__(self):
+        return self.size
 
-    while True:
-        print("""
-=========================
- StudentDB (JSON)
-=========================
-1. Add Student
-2. View All Students
-3. Search Student
-4. Update Student
-5. Delete Student
-6. Undo
-7. Redo
-8. Save
-9. Save & Exit
-10. Exit (No Save)
-""")
-        choice = input("Choose option: ").strip()
+    def __iter__(self):
+        for roll in self.rolls:
+            if str(roll) not in self.changes:
+                yield str(roll)
+        for key, record in list(self.changes.items()):
+            if record is not None:
+                yield key
+
+    def roll_list(self):
+        # every roll in order, without decoding any record
+        changed = {int(key) for key in self.changes}
+        live = [roll for roll in self.rolls if roll not in changed]
+        live += [int(key) for key, record in self.changes.items() if record is not None]
+        return sorted(live) if self.changes else live
+
+    def encoded(self, key, changes=None):
+        # the record's line in FILE_NAME; unchanged ones are copied as is.
+        # changes: a frozen copy of self.changes to read changed records from
+        changes = self.changes if changes is None else changes
+        if key not in changes:
+            i = self._find(int(key))
+            if i is not None:
+                return self._raw(i)
+        s = changes.get(key)
+        if s is None:
+            raise KeyError(key)
+        return (json.dumps(dict(s), ensure_ascii=False) + "\n").encode("utf-8")
+
+# On disk records stay {"roll", "name", "marks"} objects.
+def from_plain(value):
+    # Raises KeyError or TypeError for anything but a record with a roll and
+    # marks parse_int would accept and a str name.
+    roll, name, marks = value["roll"], value["name"], value["marks"]
+    if not (plain_int(roll) and plain_int(marks) and isinstance(name, str)):
+        raise TypeError(f"not a student record: {value!r}")
+    return Student(roll, name, marks)
+
+def plain_int(n):
+    return type(n) is int and 0 <= n < 2 ** 63
+
+def load_snapshot():
+    db = LazyDB()
+    if db.indexed or not os.path.exists(FILE_NAME):
+        return db
+    # No usable index: an older single-object file keyed by roll, or record
+    # lines whose index was lost in a crash. Read everything once, skipping
+    # and counting records that cannot be read; the next save writes an
+    # index.
+    with open(FILE_NAME, "rb") as f:
+        data = f.read()
+    try:
+        old = json.loads(data)
+    except ValueError:
+        old = None
+    bad = 0
+    if isinstance(old, dict) and "roll" not in old:
+        for k, v in old.items():
+            try:
+                s = from_plain(v)
+            except (KeyError, TypeError):
+                s = None
+            if s is None or parse_int(k) != s.roll or not valid_marks(s.marks):  # keys are rolls as text
+                bad += 1
+                continue
+            db[str(s.roll)] = s
+    else:
+        for line in data.splitlines():
+            if not line.strip():
+                continue
+            try:
+                s = from_plain(json.loads(line))
+            except (ValueError, KeyError, TypeError):
+                bad += 1
+                continue
+            if not valid_marks(s.marks):
+                bad += 1
+                continue
+            db[str(s.roll)] = s
+    if bad:
+        keep_unreadable(bad)
+    return db
+
+def keep_unreadable(bad):
+    # Part of FILE_NAME could not be read. It is copied aside before a save
+    # can replace it with only the records that loaded; if the copy fails,
+    # the OSError stops the program before anything is saved.
+    backup = f"{FILE_NAME}.{time.strftime('%Y%m%d-%H%M%S')}.bak"
+    shutil.copy2(FILE_NAME, backup)
+    print(f"Warning: skipped {bad} unreadable record(s) in {FILE_NAME}; "
+          f"the file as it was is kept in {backup}.", file=sys.stderr)
+
+def migrate_legacy():
+    # Moves a db saved under LEGACY_NAME, with its index, journal and undo
+    # file, to FILE_NAME. The data file goes last, so a move that was cut
+    # short is finished on the next start.
+    if os.path.exists(FILE_NAME) or not os.path.exists(LEGACY_NAME):
+        return
+    for suffix in (".idx", ".journal", ".undo", ""):
+        if os.path.exists(LEGACY_NAME + suffix):
+            os.replace(LEGACY_NAME + suffix, FILE_NAME + suffix)
+
+def read_journal():
+    # One [key, record] JSON line per entry. A torn or corrupt tail (crash
+    # during a save) is cut off so new entries follow good data.
+    if not os.path.exists(JOURNAL_NAME):
+        return []
+    changes = []
+    good = 0
+    with open(JOURNAL_NAME, "rb") as f:
+        for line in f:
+            if not line.endswith(b"\n"):
+                break
+            try:
+                key, record = json.loads(line)
+            except ValueError:
+                break
+            if not isinstance(key, str) or not (record is None or isinstance(record, dict)):
+                break
+            try:
+                changes.append((key, None if record is None else from_plain(record)))
+            except (KeyError, TypeError):
+                break
+            good += len(line)
+    if good < os.path.getsize(JOURNAL_NAME):
+        with open(JOURNAL_NAME, "r+b") as f:
+            f.truncate(good)
+    return changes
+
+def load_db():
+    migrate_legacy()
+    db = load_snapshot()
+    apply_changes(db, read_journal(), reindex=False)
+    rebuild_indexes(db)
+    DIRTY.clear()
+    return db
+
+def write_snapshot(db, rolls, changes):
+    # Records in roll order, then the index, each to a temp file that
+    # end_save renames into place. The index names the data file's size and
+    # mtime, so after a crash between the two renames it is rejected rather
+    # than trusted.
+    written, offsets = array("q"), array("q")
+    pos = 0
+    with open(FILE_NAME + ".tmp", "wb") as f:
+        for roll in rolls:
+            blob = db.encoded(str(roll), changes)
+            written.append(roll)
+            offsets.append(pos)
+            f.write(blob)
+            pos += len(blob)
+        f.flush()
+        os.fsync(f.fileno())
+    st = os.stat(FILE_NAME + ".tmp")
+    with open(INDEX_NAME + ".tmp", "wb") as f:
+        f.write(INDEX_HEADER.pack(INDEX_MAGIC, st.st_size, st.st_mtime_ns, len(written)))
+        written.tofile(f)
+        offsets.tofile(f)
+        f.flush()
+        os.fsync(f.fileno())
+
+def journal_entry(key, s):
+    return (json.dumps([key, s], ensure_ascii=False, default=dict) + "\n").encode("utf-8")
+
+# A save is three steps, so the server can run the slow middle one (the
+# file writes and fsync) in a worker thread while it keeps answering reads:
+# begin_save freezes what is to be written, write_save writes and fsyncs it
+# from that frozen copy and the snapshot already mapped, and end_save swaps
+# the new files in and marks saved exactly the records that were written.
+# save_db runs the three in a row.
+def begin_save(db):
+    # Journal mode appends only the records changed since the last save.
+    # A full snapshot is written when there is no indexed one yet, and again
+    # (compaction) once the journal would outgrow it, so startup stays cheap.
+    saved = {key: db.get(key) for key in DIRTY}
+    if JOURNAL and db.indexed and len(DIRTY) <= len(db) // 2:
+        entries = [journal_entry(key, s) for key, s in saved.items()]
+        size = os.path.getsize(JOURNAL_NAME) if os.path.exists(JOURNAL_NAME) else 0
+        if size + sum(map(len, entries)) <= max(COMPACT_MIN_BYTES, os.path.getsize(FILE_NAME)):
+            return {"saved": saved, "journal": entries}
+    return {"saved": saved, "rolls": list(ROLL_INDEX), "changes": dict(db.changes)}
+
+def write_save(db, plan):
+    if "journal" in plan:
+        with open(JOURNAL_NAME, "ab") as f:
+            f.write(b"".join(plan["journal"]))
+            f.flush()
+            os.fsync(f.fileno())
+    else:
+        write_snapshot(db, plan["rolls"], plan["changes"])
+
+def end_save(db, plan):
+    if "journal" in plan:
+        for key, s in plan["saved"].items():
+            if db.get(key) is s:  # not changed again since begin_save
+                DIRTY.discard(key)
+        return
+    frozen = plan["changes"]
+    later = {key: s for key, s in db.changes.items() if key not in frozen or frozen[key] is not s}
+    db.close_snapshot()
+    os.replace(FILE_NAME + ".tmp", FILE_NAME)
+    os.replace(INDEX_NAME + ".tmp", INDEX_NAME)
+    if os.path.exists(JOURNAL_NAME):
+        os.remove(JOURNAL_NAME)
+    db.open_snapshot()
+    for key, s in later.items():
+        if s is not None:
+            db[key] = s
+        elif key in db:
+            del db[key]
+    DIRTY.intersection_update(later)
+
+def save_db(db):
+    plan = begin_save(db)
+    write_save(db, plan)
+    end_save(db, plan)
+
+def db_stamp(db=None):
+    # The saved db as the undo file knows it: the data file's and journal's
+    # sizes and mtimes, which every save changes, whoever makes it.
+    h = hashlib.blake2b(digest_size=16)
+    for name in (FILE_NAME, JOURNAL_NAME):
+        try:
+            st = os.stat(name)
+        except OSError:
+            h.update(bytes(16))
+            continue
+        h.update(struct.pack("<qq", st.st_size, st.st_mtime_ns))
+    return h.digest()
+
+def parse_int(s):
+    # rolls and marks are stored as 64-bit integers
+    s = str(s).strip()
+    return int(s) if s.isdecimal() and int(s) < 2 ** 63 else None
+
+def input_int(prompt):
+    while True:
+        n = parse_int(input(prompt))
+        if n is not None:
+            return n
+        print("Please enter a valid number.")
+
+def input_marks(prompt):
+    while True:
+        n = input_int(prompt)
+        if n <= MAX_MARKS:
+            return n
+        print(f"Marks go from 0 to {MAX_MARKS}.")
+
+def valid_marks(marks):
+    return type(marks) is int and 0 <= marks <= MAX_MARKS
+
+def check_marks(marks):
+    # the API's guard: the menu and imports only pass marks valid_marks takes
+    if not valid_marks(marks):
+        raise ValueError(f"marks must be a whole number from 0 to {MAX_MARKS}: {marks!r}")
+
+# Undo/redo steps are lists of (key, record) pairs, not copies of the db.
+# apply_change puts a record in place (None = delete) and hands back the one
+# it replaced, so undoing a step is just applying the pairs it returned.
+def apply_change(db, key, record):
+    old = db.get(key)
+    DIRTY.add(key)
+    if old is not None:
+        for index, entry in index_entries(key, old):
+            del index[bisect.bisect_left(index, entry)]
+        if SEARCH_INDEXES["built"]:
+            count_stats(old, -1)
+    if record is None:
+        db.pop(key, None)
+    else:
+        db[key] = record
+        for index, entry in index_entries(key, record):
+            bisect.insort(index, entry)
+        if SEARCH_INDEXES["built"]:
+            count_stats(record, 1)
+    return old
+
+def apply_changes(db, changes, reindex=True):
+    # Applies (key, record) pairs in order and returns the pairs that undo
+    # them, newest first. Big batches skip per-record index upkeep and
+    # update the indexes once, from the records they replaced;
+    # reindex=False leaves that to the caller.
+    if reindex and len(changes) < BULK_CHANGES:
+        undo = [(key, apply_change(db, key, record)) for key, record in changes]
+    else:
+        undo = []
+        before = {}
+        for key, record in changes:
+            old = db.get(key)
+            undo.append((key, old))
+            before.setdefault(key, old)
+            DIRTY.add(key)
+            if record is None:
+                db.pop(key, None)
+            else:
+                db[key] = record
+        if reindex:
+            rebuild_indexes(db, before)
+    undo.reverse()
+    return undo
+
+def record_change(db, undo_stack, redo_stack, key, record):
+    undo_stack.append([(key, apply_change(db, key, record))])
+    redo_stack.clear()
+
+def step_bytes(step):
+    # rough memory an undo step holds: its pairs and the records they keep
+    return sys.getsizeof(step) + sum(
+        72 + (0 if r is None else sys.getsizeof(r) + sys.getsizeof(r["name"])) for _key, r in step)
+
+# In the undo file a step is a JSON list of [key, record or null] pairs.
+def encode_step(step):
+    return zlib.compress(json.dumps(step, ensure_ascii=False, default=dict).encode("utf-8"))
+
+def decode_step(data):
+    return [(key, None if record is None else from_plain(record))
+            for key, record in json.loads(zlib.decompress(data))]
+
+class UndoHistory:
+    # A stack of undo (or redo) steps used like the list it replaces:
+    # append, pop, clear, len and stack[-1]. Past `depth` steps, or `budget`
+    # bytes of steps held in memory, the oldest steps are dropped (the
+    # newest one is always kept); None lifts a limit.
+    #
+    # With a path, save() writes the stack there as zlib-compressed steps,
+    # framed like the journal ([size][crc32][data]) after a header that
+    # counts the dropped frames still at the front, and the saved steps
+    # leave memory. Opening reads only the frame headers; a step is read
+    # back when undo reaches it. save() runs right after save_db, and the
+    # header keeps db_stamp() of the db it was saved with. If the db has
+    # been saved since by anything else (the server, another process) the
+    # stamp no longer matches, and the file is ignored: its steps would
+    # undo changes this program never made.
+    HEADER = struct.Struct("<8sQ16s")
+    MAGIC = b"SDBUNDO2"
+
+    def __init__(self, path=None, depth=UNDO_DEPTH, budget=UNDO_BUDGET, stamp=None):
+        self.path, self.depth, self.budget = path, depth, budget
+        self.stamp = stamp  # None: take the file as it is
+        self.frames = []    # (offset, size, crc) of the saved steps, oldest first
+        self.steps = []     # steps since then, newest last
+        self.sizes = []     # step_bytes of each of those
+        self.used = 0
+        self.dropped = 0    # frames at the front of the file no longer in the stack
+        if path and os.path.exists(path):
+            self._scan()
+
+    def _scan(self):
+        # A torn frame at the end (crash during a save) ends the history.
+        with open(self.path, "rb") as f:
+            end = os.fstat(f.fileno()).st_size
+            header = f.read(self.HEADER.size)
+            if len(header) < self.HEADER.size:
+                return
+            magic, dead, stamp = self.HEADER.unpack(header)
+            if magic != self.MAGIC or self.stamp not in (None, stamp):
+                return
+            pos = self.HEADER.size
+            while pos + 8 <= end:
+                f.seek(pos)
+                size, crc = struct.unpack("<II", f.read(8))
+                if pos + 8 + size > end:
+                    break
+                if dead:
+                    dead -= 1
+                    self.dropped += 1
+                else:
+                    self.frames.append((pos + 8, size, crc))
+                pos += 8 + size
+        if self.depth is not None and len(self.frames) > self.depth:
+            self.dropped += len(self.frames) - self.depth
+            del self.frames[:len(self.frames) - self.depth]
+
+    def _read_last(self):
+        # A damaged step, or one from a file another process has saved over
+        # since, reads back as an empty one, and nothing older is kept.
+        offset, size, crc = self.frames.pop()
+        with open(self.path, "rb") as f:
+            header = f.read(self.HEADER.size)
+            f.seek(offset)
+            data = f.read(size)
+        magic, _dead, stamp = self.HEADER.unpack(header.ljust(self.HEADER.size, b"\0"))
+        if zlib.crc32(data) != crc or magic != self.MAGIC or self.stamp not in (None, stamp):
+            self.dropped += len(self.frames)
+            self.frames.clear()
+            return []
+        return decode_step(data)
+
+    def _push(self, step):
+        size = step_bytes(step)
+        self.steps.append(step)
+        self.sizes.append(size)
+        self.used += size
+
+    def __len__(self):
+        return len(self.frames) + len(self.steps)
+
+    def __getitem__(self, i):
+        if i != -1 or not self:
+            raise IndexError("only the newest step can be read")
+        if not self.steps:
+            self._push(self._read_last())
+        return self.steps[-1]
+
+    def append(self, step):
+        self._push(step)
+        while len(self.steps) > 1 and self.budget is not None and self.used > self.budget:
+            # every saved step is older than those in memory, so they go too
+            self.dropped += len(self.frames)
+            self.frames.clear()
+            self.used -= self.sizes.pop(0)
+            del self.steps[0]
+        while self.depth is not None and len(self) > max(self.depth, 1):
+            if self.frames:
+                self.frames.pop(0)
+                self.dropped += 1
+            else:
+                self.used -= self.sizes.pop(0)
+                del self.steps[0]
+
+    def pop(self):
+        if self.steps:
+            self.used -= self.sizes.pop()
+            return self.steps.pop()
+        if self.frames:
+            return self._read_last()
+        raise IndexError("pop from empty history")
+
+    def clear(self):
+        self.dropped += len(self.frames)
+        self.frames.clear()
+        self.steps.clear()
+        self.sizes.clear()
+        self.used = 0
+
+    def save(self, stamp=None):
+        # Cuts the file back to the saved steps still in the stack and adds
+        # the new ones, under stamp (db_stamp() of the db just saved). Once
+        # most of it is dropped frames at the front, the kept ones are first
+        # copied (not decoded) into a new file.
+        if stamp is not None:
+            self.stamp = stamp
+        if not self.path or (not self and not os.path.exists(self.path)):
+            return
+        if not self.frames:
+            self.dropped = 0
+        elif self.dropped > len(self.frames):
+            self._rewrite()
+        end = self.frames[-1][0] + self.frames[-1][1] if self.frames else self.HEADER.size
+        with open(self.path, "r+b" if os.path.exists(self.path) else "wb") as f:
+            f.write(self.HEADER.pack(self.MAGIC, self.dropped, self.stamp or bytes(16)))
+            f.truncate(end)
+            f.seek(end)
+            for step in self.steps:
+                data = encode_step(step)
+                crc = zlib.crc32(data)
+                f.write(struct.pack("<II", len(data), crc) + data)
+                self.frames.append((end + 8, len(data), crc))
+                end += 8 + len(data)
+            f.flush()
+            os.fsync(f.fileno())
+        self.steps.clear()
+        self.sizes.clear()
+        self.used = 0
+
+    def _rewrite(self):
+        frames = []
+        with open(self.path, "rb") as src, open(self.path + ".tmp", "wb") as dst:
+            dst.write(self.HEADER.pack(self.MAGIC, 0, self.stamp or bytes(16)))
+            for offset, size, crc in self.frames:
+                src.seek(offset)
+                dst.write(struct.pack("<II", size, crc) + src.read(size))
+                frames.append((dst.tell() - size, size, crc))
+            dst.flush()
+            os.fsync(dst.fileno())
+        os.replace(self.path + ".tmp", self.path)
+        self.frames = frames
+        self.dropped = 0
+
+# Programmatic API: the menu's operations without prompts or printing, for
+# scripts, batch mode and benchmarks. Rolls are ints; every change is one
+# undo step, exactly as from the menu.
+def get_record(db, roll):
+    return db.get(str(roll))
+
+def add_record(db, undo_stack, redo_stack, roll, name, marks):
+    # False if the roll is already taken
+    check_marks(marks)
+    if str(roll) in db:
+        return False
+    record_change(db, undo_stack, redo_stack, str(roll), Student(roll, name, marks))
+    return True
+
+def update_record(db, undo_stack, redo_stack, roll, name=None, marks=None):
+    # None keeps the current value; False if there is no such roll
+    if marks is not None:
+        check_marks(marks)
+    s = db.get(str(roll))
+    if s is None:
+        return False
+    record_change(db, undo_stack, redo_stack, str(roll),
+                  Student(roll, s.name if name is None else name, s.marks if marks is None else marks))
+    return True
+
+def delete_record(db, undo_stack, redo_stack, roll):
+    if str(roll) not in db:
+        return False
+    record_change(db, undo_stack, redo_stack, str(roll), None)
+    return True
+
+def undo_last(db, undo_stack, redo_stack):
+    if not undo_stack:
+        return False
+    redo_stack.append(apply_changes(db, undo_stack.pop()))
+    return True
+
+def redo_last(db, undo_stack, redo_stack):
+    if not redo_stack:
+        return False
+    undo_stack.append(apply_changes(db, redo_stack.pop()))
+    return True
+
+def find_by_name(db, prefix, limit=None):
+    # limit: only the first that many matches are decoded and returned
+    prefix = prefix.strip().casefold()
+    build_search_indexes(db)
+    lo = bisect.bisect_left(NAME_INDEX, (prefix,))
+    hi = bisect.bisect_left(NAME_INDEX, (prefix + "\U0010ffff",))
+    return [db[str(roll)] for _name, roll in NAME_INDEX[lo:hi][:limit]]
+
+def find_by_marks(db, low, high, limit=None):
+    build_search_indexes(db)
+    lo = bisect.bisect_left(MARKS_INDEX, (low,))
+    hi = bisect.bisect_left(MARKS_INDEX, (high + 1,))
+    return [db[str(roll)] for _marks, roll in MARKS_INDEX[lo:hi][:limit]]
+
+def find_top(db, n):
+    build_search_indexes(db)
+    top = MARKS_INDEX[-n:] if n else []
+    return [db[str(roll)] for _marks, roll in reversed(top)]
+
+def class_stats(db):
+    # Count, average, lowest and highest marks and students per grade, from
+    # the upkept totals and MARKS_INDEX rather than a walk over every record.
+    build_search_indexes(db)
+    count = len(MARKS_INDEX)
+    return {"count": count, "average": STATS["total"] / count if count else None,
+            "min": MARKS_INDEX[0][0] if count else None, "max": MARKS_INDEX[-1][0] if count else None,
+            "grades": dict(STATS["grades"])}
+
+def recompute_class_stats(db):
+    # class_stats worked out from scratch over every record, to check it against
+    marks = [s.marks for s in db.values()]
+    grades = dict.fromkeys((grade for grade, _low in GRADES), 0)
+    for m in marks:
+        grades[grade_of(m)] += 1
+    return {"count": len(marks), "average": sum(marks) / len(marks) if marks else None,
+            "min": min(marks, default=None), "max": max(marks, default=None), "grades": grades}
+
+def add_student(db, undo_stack, redo_stack):
+    roll = input_int("Enter roll: ")
+    if get_record(db, roll):
+        print("Roll already exists. Use update option.")
+        return
+    name = input("Enter name: ").strip()
+    marks = input_marks(f"Enter marks (0-{MAX_MARKS}): ")
+    add_record(db, undo_stack, redo_stack, roll, name, marks)
+    print("Student added.")
+
+def view_all(db):
+    if not db:
+        print("No records found.")
+        return
+    print("\n--- All Students ---")
+    pos = 0
+    while pos < len(ROLL_INDEX):
+        for roll in ROLL_INDEX[pos:pos + PAGE_SIZE]:
+            s = db[str(roll)]
+            print(f"Roll: {s['roll']} | Name: {s['name']} | Marks: {s['marks']}")
+        pos += PAGE_SIZE
+        if pos >= len(ROLL_INDEX):
+            break
+        more = input(f"-- {pos} of {len(ROLL_INDEX)} | Enter = next page, roll = jump, q = stop: ").strip()
+        if more.lower() == "q":
+            break
+        if more.isdigit():
+            pos = bisect.bisect_left(ROLL_INDEX, int(more))
+
+def search_student(db):
+    roll = input_int("Enter roll to search: ")
+    s = get_record(db, roll)
+    if not s:
+        print("Student not found.")
+        return
+    print(f"Found -> Roll: {s['roll']} | Name: {s['name']} | Marks: {s['marks']}")
+
+def show_students(records):
+    if not records:
+        print("No matching students.")
+        return
+    for s in records:
+        print(f"Roll: {s['roll']} | Name: {s['name']} | Marks: {s['marks']}")
+
+def search_by_name(db):
+    show_students(find_by_name(db, input("Enter name or start of name: ")))
+
+def search_by_marks(db):
+    low = input_int("Lowest marks: ")
+    high = input_int("Highest marks: ")
+    show_students(find_by_marks(db, low, high))
+
+def top_students(db):
+    show_students(find_top(db, input_int("How many top students: ")))
+
+def class_report(db):
+    stats = class_stats(db)
+    if not stats["count"]:
+        print("No records found.")
+        return
+    print("\n--- Class Report ---")
+    print(f"Students: {stats['count']} | Average: {stats['average']:.1f} | "
+          f"Lowest: {stats['min']} | Highest: {stats['max']}")
+    for grade, low in GRADES:
+        n = stats["grades"][grade]
+        label = f"{grade} ({low}+):"
+        print(f"{label:<9}{n:>7} {'#' * round(40 * n / stats['count'])}")
+    print("Top 5:")
+    show_students(find_top(db, 5))
+
+def update_student(db, undo_stack, redo_stack):
+    roll = input_int("Enter roll to update: ")
+    s = get_record(db, roll)
+    if not s:
+        print("Student not found.")
+        return
+    print(f"Current -> Name: {s['name']} | Marks: {s['marks']}")
+    new_name = input("Enter new name (blank = keep): ").strip()
+    new_marks = input("Enter new marks (blank = keep): ").strip()
+    marks = parse_int(new_marks) if new_marks else None
+    if new_marks and not valid_marks(marks):
+        print("Invalid marks. Keeping old marks.")
+        marks = None
+    update_record(db, undo_stack, redo_stack, roll, new_name or None, marks)
+    print("Student updated.")
+
+def delete_student(db, undo_stack, redo_stack):
+    roll = input_int("Enter roll to delete: ")
+    if not delete_record(db, undo_stack, redo_stack, roll):
+        print("Student not found.")
+        return
+    print("Student deleted.")
+
+def read_rows(path):
+    # Streams raw (roll, name, marks) values from a .csv file with a
+    # roll,name,marks header, or from a .ndjson/.jsonl file of objects.
+    with open(path, "r", encoding="utf-8", newline="") as f:
+        if path.lower().endswith(".csv"):
+            rows = csv.reader(f)
+            header = [h.strip().lower() for h in next(rows, [])]
+            if not {"roll", "name", "marks"} <= set(header):
+                raise csv.Error("CSV header must name roll, name and marks columns")
+            pick = operator.itemgetter(header.index("roll"), header.index("name"), header.index("marks"))
+            width = len(header)
+            for row in rows:
+                yield pick(row) if len(row) >= width else (None, None, None)
+            return
+        for line in f:
+            if not line.strip():
+                continue
+            try:
+                row = json.loads(line)
+            except ValueError:
+                row = None
+            if not isinstance(row, dict):
+                row = {}
+            yield row.get("roll"), row.get("name"), row.get("marks")
+
+def valid_changes(rows, counts):
+    # Same rules as the menu for roll and marks; bad rows are counted, not fatal.
+    for roll, name, marks in rows:
+        roll, marks = parse_int(roll), parse_int(marks)
+        if roll is None or not valid_marks(marks) or name is None:
+            counts["skipped"] += 1
+            continue
+        yield str(roll), Student(roll, str(name).strip(), marks)
+
+def import_students(db, undo_stack, redo_stack):
+    path = input("File to import (.csv or .ndjson): ").strip()
+    if not os.path.isfile(path):
+        print("File not found.")
+        return
+    counts = {"imported": 0, "skipped": 0}
+    changes = valid_changes(read_rows(path), counts)
+    start = time.perf_counter()
+    stale = False  # indexes are updated once at the end after any bulk batch
+    before = {}    # key -> record before the import, for that update
+    try:
+        while True:
+            batch = list(itertools.islice(changes, IMPORT_BATCH))
+            if not batch:
+                break
+            stale = stale or len(batch) >= BULK_CHANGES
+            step = apply_changes(db, batch, reindex=not stale)
+            undo_stack.append(step)
+            if stale and SEARCH_INDEXES["built"]:
+                for key, old in reversed(step):
+                    before.setdefault(key, old)
+            counts["imported"] += len(batch)
+    except (OSError, UnicodeDecodeError, csv.Error) as e:
+        print("Import stopped:", e)
+    finally:
+        if stale:
+            rebuild_indexes(db, before)
+    if counts["imported"]:
+        redo_stack.clear()
+    secs = max(time.perf_counter() - start, 1e-9)
+    print(f"Imported {counts['imported']} students, skipped {counts['skipped']} invalid rows "
+          f"in {secs:.2f}s ({counts['imported'] / secs:,.0f} rows/s).")
+
+def export_students(db):
+    path = input("File to export (.csv or .ndjson): ").strip()
+    start = time.perf_counter()
+    try:
+        with open(path, "w", encoding="utf-8", newline="") as f:
+            if path.lower().endswith(".csv"):
+                w = csv.writer(f)
+                w.writerow(["roll", "name", "marks"])
+                for roll in ROLL_INDEX:
+                    s = db[str(roll)]
+                    w.writerow([s["roll"], s["name"], s["marks"]])
+            else:
+                encode = json.JSONEncoder(ensure_ascii=False, default=dict).encode
+                for roll in ROLL_INDEX:
+                    f.write(encode(db[str(roll)]) + "\n")
+    except OSError as e:
+        print("Export failed:", e)
+        return
+    secs = max(time.perf_counter() - start, 1e-9)
+    print(f"Exported {len(ROLL_INDEX)} students in {secs:.2f}s ({len(ROLL_INDEX) / secs:,.0f} rows/s).")
+
+def do_undo(db, undo_stack, redo_stack):
+    print("Undo done." if undo_last(db, undo_stack, redo_stack) else "Nothing to undo.")
+
+def do_redo(db, undo_stack, redo_stack):
+    print("Redo done." if redo_last(db, undo_stack, redo_stack) else "Nothing to redo.")
+
+# Batch mode (--batch FILE, "-" = stdin) runs one command per line with no
+# prompts and saves once, at the end:
+#   add ROLL MARKS NAME...      update ROLL MARKS|- [NAME...]    delete ROLL
+#   get ROLL    name PREFIX    marks LOW HIGH    top N    undo    redo    save
+# Blank lines and lines starting with "#" are skipped.
+def batch_int(word):
+    n = parse_int(word)
+    if n is None:
+        raise ValueError(f"not a valid number: {word!r}")
+    return n
+
+def run_command(db, undo_stack, redo_stack, words):
+    # Returns the records a query found (None for the other commands) and
+    # raises ValueError for a command that cannot be carried out.
+    cmd, args = words[0].lower(), words[1:]
+    if cmd == "add" and len(args) >= 2:
+        roll, marks = batch_int(args[0]), batch_int(args[1])
+        if not add_record(db, undo_stack, redo_stack, roll, " ".join(args[2:]), marks):
+            raise ValueError(f"roll {roll} already exists")
+    elif cmd == "update" and len(args) >= 2:
+        roll = batch_int(args[0])
+        marks = None if args[1] == "-" else batch_int(args[1])
+        if not update_record(db, undo_stack, redo_stack, roll, " ".join(args[2:]) or None, marks):
+            raise ValueError(f"roll {roll} not found")
+    elif cmd == "delete" and len(args) == 1:
+        roll = batch_int(args[0])
+        if not delete_record(db, undo_stack, redo_stack, roll):
+            raise ValueError(f"roll {roll} not found")
+    elif cmd == "get" and len(args) == 1:
+        s = get_record(db, batch_int(args[0]))
+        return [s] if s else []
+    elif cmd == "name":
+        return find_by_name(db, " ".join(args))
+    elif cmd == "marks" and len(args) == 2:
+        return find_by_marks(db, batch_int(args[0]), batch_int(args[1]))
+    elif cmd == "top" and len(args) == 1:
+        return find_top(db, batch_int(args[0]))
+    elif cmd == "undo" and not args:
+        if not undo_last(db, undo_stack, redo_stack):
+            raise ValueError("nothing to undo")
+    elif cmd == "redo" and not args:
+        if not redo_last(db, undo_stack, redo_stack):
+            raise ValueError("nothing to redo")
+    elif cmd == "save" and not args:
+        save_db(db)
+        undo_stack.save(db_stamp(db))
+    else:
+        raise ValueError("unknown command or wrong arguments: " + " ".join(words))
+    return None
+
+def run_batch(db, undo_stack, redo_stack, lines, quiet=False):
+    # Returns {"ops", "errors"}. Query results are printed as in the menu
+    # unless quiet; failed commands are reported on stderr and skipped.
+    counts = {"ops": 0, "errors": 0}
+    for n, line in enumerate(lines, 1):
+        words = line.split()
+        if not words or words[0].startswith("#"):
+            continue
+        counts["ops"] += 1
+        try:
+            found = run_command(db, undo_stack, redo_stack, words)
+        except ValueError as e:
+            counts["errors"] += 1
+            print(f"line {n}: {e}", file=sys.stderr)
+            continue
+        if found is not None and not quiet:
+            show_students(found)
+    return counts
+
+def batch_main(db, path, save=True, quiet=False):
+    try:
+        f = sys.stdin if path == "-" else open(path, "r", encoding="utf-8")
+    except OSError as e:
+        raise SystemExit(f"Cannot read batch file: {e}")
+    undo_stack = UndoHistory(UNDO_NAME if UNDO_FILE else None, stamp=db_stamp(db))
+    start = time.perf_counter()
+    try:
+        counts = run_batch(db, undo_stack, UndoHistory(), f, quiet)
+    finally:
+        if f is not sys.stdin:
+            f.close()
+    secs = max(time.perf_counter() - start, 1e-9)
+    start = time.perf_counter()
+    if save:
+        save_db(db)
+        undo_stack.save(db_stamp(db))
+    print(f"Ran {counts['ops']} commands ({counts['errors']} failed) in {secs:.2f}s "
+          f"({counts['ops'] / secs:,.0f} ops/s); "
+          + (f"saved in {time.perf_counter() - start:.2f}s." if save else "not saved."),
+          file=sys.stderr)
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="StudentDB (JSON) with undo/redo.")
+    ap.add_argument("--batch", metavar="FILE", help="run commands from FILE ('-' = stdin) instead of the menu")
+    ap.add_argument("--no-save", action="store_true", help="with --batch: discard the changes at the end")
+    ap.add_argument("--quiet", action="store_true", help="with --batch: do not print query results")
+    args = ap.parse_args(argv)
+    db = load_db()
+    if args.batch:
+        batch_main(db, args.batch, save=not args.no_save, quiet=args.quiet)
+        return
+    undo_stack = UndoHistory(UNDO_NAME if UNDO_FILE else None, stamp=db_stamp(db))
+    redo_stack = UndoHistory()
+    print("StudentDB (JSON) loaded. Records:", len(db))
+
+    while True:
+        print("""
+=========================
+ StudentDB (JSON)
+=========================
+1. Add Student
+2. View All Students
+3. Search Student
+4. Search by Name
+5. Search by Marks Range
+6. Top Students by Marks
+7. Class Report
+8. Update Student
+9. Delete Student
+10. Import Students (CSV/NDJSON)
+11. Export Students (CSV/NDJSON)
+12. Undo
+13. Redo
+14. Save
+15. Save & Exit
+16. Exit (No Save)
+""")
+        choice = input("Choose option: ").strip()
 
         if choice == "1":
             add_student(db, undo_stack, redo_stack)
@@ -689,21 +2935,35 @@ def main():
         elif choice == "3":
             search_student(db)
         elif choice == "4":
-            update_student(db, undo_stack, redo_stack)
+            search_by_name(db)
         elif choice == "5":
-            delete_student(db, undo_stack, redo_stack)
+            search_by_marks(db)
         elif choice == "6":
-            db = do_undo(db, undo_stack, redo_stack)
+            top_students(db)
         elif choice == "7":
-            db = do_redo(db, undo_stack, redo_stack)
+            class_report(db)
         elif choice == "8":
+            update_student(db, undo_stack, redo_stack)
+        elif choice == "9":
+            delete_student(db, undo_stack, redo_stack)
+        elif choice == "10":
+            import_students(db, undo_stack, redo_stack)
+        elif choice == "11":
+            export_students(db)
+        elif choice == "12":
+            do_undo(db, undo_stack, redo_stack)
+        elif choice == "13":
+            do_redo(db, undo_stack, redo_stack)
+        elif choice == "14":
             save_db(db)
+            undo_stack.save(db_stamp(db))
             print("Saved.")
-        elif choice == "9":
+        elif choice == "15":
             save_db(db)
+            undo_stack.save(db_stamp(db))
             print("Saved. Bye!")
             break
-        elif choice == "10":
+        elif choice == "16":
             print("Bye! (Not saved)")
             break
         else:
@@ -713,10 +2973,1482 @@ if __name__ == "__main__":
     main()
 '''
 
+STUDENTDB_SQLITE_CODE = r'''# studentdb_sqlite_undo_redo.py
+import sqlite3
+import contextlib
+import csv
+import json
+import os
+import time
+import operator
+import itertools
+import argparse
+import sys
+import struct
+import zlib
+
+FILE_NAME = "studentdb.sqlite3"
+BUSY_TIMEOUT = 5.0              # seconds a write waits for another process's lock
+UNDO_NAME = FILE_NAME + ".undo"
+UNDO_FILE = True                # False = undo history ends with the program
+UNDO_DEPTH = 1000               # undo steps kept; the oldest are dropped first
+UNDO_BUDGET = 64 * 1024 * 1024  # bytes of undo steps held in memory (estimated)
+PAGE_SIZE = 20
+GRADES = (("A", 90), ("B", 75), ("C", 60), ("D", 40), ("F", 0))  # lowest marks per grade
+MAX_MARKS = 100
+IMPORT_BATCH = 10000            # imported rows per undo step
+SQL_VARS = 900                  # rolls per "IN (...)" lookup, under SQLite's limit
+
+# roll is the INTEGER PRIMARY KEY (SQLite's own rowid index). name_key holds
+# name.casefold() so name-prefix search is an index range, like the other
+# versions' NAME_INDEX; (marks, roll) serves marks-range and top-N queries.
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS students (
+    roll     INTEGER PRIMARY KEY,
+    name     TEXT NOT NULL,
+    marks    INTEGER NOT NULL,
+    name_key TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS students_name ON students (name_key, roll);
+CREATE INDEX IF NOT EXISTS students_marks ON students (marks, roll);
+"""
+
+# Students and their marks total per grade, kept up to date by triggers on
+# every write, so they follow undo, redo and rollback like the rows do.
+# INSERT OR REPLACE deletes the row it replaces, which only fires the delete
+# trigger with recursive_triggers on (see load_db).
+def grade_sql(marks):
+    cases = " ".join(f"WHEN {marks} >= {low} THEN '{grade}'" for grade, low in GRADES[:-1])
+    return f"CASE {cases} ELSE '{GRADES[-1][0]}' END"
+
+STATS_SCHEMA = f"""
+CREATE TABLE IF NOT EXISTS class_stats (
+    grade TEXT PRIMARY KEY,
+    n     INTEGER NOT NULL,
+    total INTEGER NOT NULL
+);
+CREATE TRIGGER IF NOT EXISTS students_stats_insert AFTER INSERT ON students BEGIN
+    UPDATE class_stats SET n = n + 1, total = total + NEW.marks WHERE grade = {grade_sql('NEW.marks')};
+END;
+CREATE TRIGGER IF NOT EXISTS students_stats_delete AFTER DELETE ON students BEGIN
+    UPDATE class_stats SET n = n - 1, total = total - OLD.marks WHERE grade = {grade_sql('OLD.marks')};
+END;
+CREATE TRIGGER IF NOT EXISTS students_stats_update AFTER UPDATE OF marks ON students BEGIN
+    UPDATE class_stats SET n = n - 1, total = total - OLD.marks WHERE grade = {grade_sql('OLD.marks')};
+    UPDATE class_stats SET n = n + 1, total = total + NEW.marks WHERE grade = {grade_sql('NEW.marks')};
+END;
+"""
+
+# A random id for this db file and a count that triggers bump on every row
+# written: db_stamp() is the two together, so the undo file can tell
+# whether anything (another menu, a batch run, a script) has written the
+# db since it was saved.
+GENERATION_SCHEMA = """
+CREATE TABLE IF NOT EXISTS generation (
+    slot  INTEGER PRIMARY KEY CHECK (slot = 0),
+    db_id BLOB NOT NULL,
+    n     INTEGER NOT NULL
+);
+INSERT OR IGNORE INTO generation (slot, db_id, n) VALUES (0, randomblob(8), 0);
+CREATE TRIGGER IF NOT EXISTS students_generation_insert AFTER INSERT ON students BEGIN
+    UPDATE generation SET n = n + 1;
+END;
+CREATE TRIGGER IF NOT EXISTS students_generation_delete AFTER DELETE ON students BEGIN
+    UPDATE generation SET n = n + 1;
+END;
+CREATE TRIGGER IF NOT EXISTS students_generation_update AFTER UPDATE ON students BEGIN
+    UPDATE generation SET n = n + 1;
+END;
+"""
+
+# Fixed SQL strings: sqlite3 keeps each one compiled in the connection's
+# statement cache, so they are prepared once and reused.
+SQL_PUT = "INSERT OR REPLACE INTO students (roll, name, marks, name_key) VALUES (?, ?, ?, ?)"
+SQL_DELETE = "DELETE FROM students WHERE roll = ?"
+SQL_GET = "SELECT roll, name, marks FROM students WHERE roll = ?"
+SQL_COUNT = "SELECT COUNT(*) FROM students"
+SQL_BEFORE = "SELECT COUNT(*) FROM students WHERE roll < ?"
+SQL_PAGE = "SELECT roll, name, marks FROM students WHERE roll >= ? ORDER BY roll LIMIT ?"
+SQL_ALL = "SELECT roll, name, marks FROM students ORDER BY roll"
+SQL_NAME = ("SELECT roll, name, marks FROM students WHERE name_key >= ? AND name_key < ? "
+            "ORDER BY name_key, roll")
+SQL_MARKS = "SELECT roll, name, marks FROM students WHERE marks BETWEEN ? AND ? ORDER BY marks, roll"
+SQL_TOP = "SELECT roll, name, marks FROM students ORDER BY marks DESC, roll DESC LIMIT ?"
+SQL_STATS = "SELECT grade, n, total FROM class_stats"
+SQL_MIN_MAX = "SELECT (SELECT MIN(marks) FROM students), (SELECT MAX(marks) FROM students)"
+
+def load_db():
+    # One connection for the whole run, in WAL mode, so readers never wait
+    # for a writer. Every write is its own short transaction (see
+    # write_transaction), so several menus, batches or scripts can share the
+    # file: a write that finds it locked waits up to BUSY_TIMEOUT seconds.
+    conn = sqlite3.connect(FILE_NAME, timeout=BUSY_TIMEOUT, isolation_level=None)  # BEGIN/COMMIT are ours
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute("PRAGMA recursive_triggers=ON")
+    conn.executescript(SCHEMA + STATS_SCHEMA + GENERATION_SCHEMA)
+    if not conn.execute(SQL_STATS).fetchone():
+        # a new db, or one from before class_stats: count what is there once
+        conn.execute("BEGIN IMMEDIATE")
+        found = {grade: (n, total) for grade, n, total in conn.execute(
+            f"SELECT {grade_sql('marks')}, COUNT(*), SUM(marks) FROM students GROUP BY 1")}
+        conn.executemany("INSERT INTO class_stats (grade, n, total) VALUES (?, ?, ?)",
+                         [(grade, *found.get(grade, (0, 0))) for grade, _low in GRADES])
+        conn.execute("COMMIT")
+    return conn
+
+def save_db(conn):
+    # Writes are committed as they are made; in batch mode, where the whole
+    # batch is one transaction, this commits the batch so far. Then the WAL
+    # is folded back into the db file, as far as open readers allow.
+    batch = conn.in_transaction
+    if batch:
+        conn.execute("COMMIT")
+    conn.execute("PRAGMA wal_checkpoint(PASSIVE)")
+    if batch:
+        conn.execute("BEGIN IMMEDIATE")
+
+def db_stamp(conn):
+    db_id, n = conn.execute("SELECT db_id, n FROM generation").fetchone()
+    return db_id + struct.pack("<q", n)
+
+class WriteFailed(ValueError):
+    # A write that did not happen, e.g. because another process kept the db
+    # locked for BUSY_TIMEOUT seconds. Nothing was changed.
+    pass
+
+@contextlib.contextmanager
+def write_transaction(conn):
+    # One write in its own BEGIN IMMEDIATE ... COMMIT, so the write lock is
+    # held only while it runs, or in a savepoint when a transaction is
+    # already open (batch mode, or a write made of smaller ones). Either way
+    # it lands completely or not at all.
+    outer = not conn.in_transaction
+    try:
+        conn.execute("BEGIN IMMEDIATE" if outer else "SAVEPOINT step")
+    except sqlite3.OperationalError as e:
+        raise WriteFailed(f"database not changed: {e}") from e
+    try:
+        yield
+        conn.execute("COMMIT" if outer else "RELEASE step")
+    except BaseException as e:
+        if outer:
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+        else:
+            conn.execute("ROLLBACK TO step")
+            conn.execute("RELEASE step")
+        if isinstance(e, sqlite3.OperationalError):
+            raise WriteFailed(f"database not changed: {e}") from e
+        raise
+
+def parse_int(s):
+    # rolls and marks are stored as 64-bit integers
+    s = str(s).strip()
+    return int(s) if s.isdecimal() and int(s) < 2 ** 63 else None
+
+def input_int(prompt):
+    while True:
+        n = parse_int(input(prompt))
+        if n is not None:
+            return n
+        print("Please enter a valid number.")
+
+def input_marks(prompt):
+    while True:
+        n = input_int(prompt)
+        if n <= MAX_MARKS:
+            return n
+        print(f"Marks go from 0 to {MAX_MARKS}.")
+
+def valid_marks(marks):
+    return type(marks) is int and 0 <= marks <= MAX_MARKS
+
+def check_marks(marks):
+    # the API's guard: the menu and imports only pass marks valid_marks takes
+    if not valid_marks(marks):
+        raise ValueError(f"marks must be a whole number from 0 to {MAX_MARKS}: {marks!r}")
+
+def as_record(row):
+    return None if row is None else {"roll": row[0], "name": row[1], "marks": row[2]}
+
+def get_record(conn, roll):
+    return as_record(conn.execute(SQL_GET, (roll,)).fetchone())
+
+def get_records(conn, rolls):
+    # {roll: record} for those rolls that exist, SQL_VARS rolls per query.
+    rolls = list(dict.fromkeys(rolls))
+    found = {}
+    for i in range(0, len(rolls), SQL_VARS):
+        chunk = rolls[i:i + SQL_VARS]
+        sql = f"SELECT roll, name, marks FROM students WHERE roll IN ({','.join('?' * len(chunk))})"
+        for row in conn.execute(sql, chunk):
+            found[row[0]] = as_record(row)
+    return found
+
+# Undo/redo steps are lists of (roll, record) pairs, as in the other
+# versions. A step is one write transaction, so it lands completely or not
+# at all, and only the rows it names are read or written.
+def apply_changes(conn, changes):
+    # Applies (roll, record) pairs (None = delete) in order and returns the
+    # pairs that undo them, newest first. The rows are read inside the same
+    # transaction, so another process cannot change them in between.
+    with write_transaction(conn):
+        current = get_records(conn, [roll for roll, _record in changes])
+        undo = []
+        for roll, record in changes:
+            undo.append((roll, current.get(roll)))
+            current[roll] = record
+        final = {roll: current[roll] for roll, _record in changes}
+        conn.executemany(SQL_DELETE, [(roll,) for roll, s in final.items() if s is None])
+        conn.executemany(SQL_PUT, [(roll, s["name"], s["marks"], s["name"].casefold())
+                                   for roll, s in final.items() if s is not None])
+    undo.reverse()
+    return undo
+
+def record_change(conn, undo_stack, redo_stack, roll, record):
+    undo_stack.append(apply_changes(conn, [(roll, record)]))
+    redo_stack.clear()
+
+def step_bytes(step):
+    # rough memory an undo step holds: its pairs and the records they keep
+    return sys.getsizeof(step) + sum(
+        72 + (0 if r is None else sys.getsizeof(r) + sys.getsizeof(r["name"])) for _key, r in step)
+
+# In the undo file a step is a JSON list of [roll, record or null] pairs.
+def encode_step(step):
+    return zlib.compress(json.dumps(step, ensure_ascii=False).encode("utf-8"))
+
+def decode_step(data):
+    return [(roll, record) for roll, record in json.loads(zlib.decompress(data))]
+
+class UndoHistory:
+    # A stack of undo (or redo) steps used like the list it replaces:
+    # append, pop, clear, len and stack[-1]. Past `depth` steps, or `budget`
+    # bytes of steps held in memory, the oldest steps are dropped (the
+    # newest one is always kept); None lifts a limit.
+    #
+    # With a path, save() writes the stack there as zlib-compressed steps,
+    # framed like the journal ([size][crc32][data]) after a header that
+    # counts the dropped frames still at the front, and the saved steps
+    # leave memory. Opening reads only the frame headers; a step is read
+    # back when undo reaches it. save() runs right after save_db, and the
+    # header keeps db_stamp() of the db it was saved with. If the db has
+    # been saved since by anything else (the server, another process) the
+    # stamp no longer matches, and the file is ignored: its steps would
+    # undo changes this program never made.
+    HEADER = struct.Struct("<8sQ16s")
+    MAGIC = b"SDBUNDO2"
+
+    def __init__(self, path=None, depth=UNDO_DEPTH, budget=UNDO_BUDGET, stamp=None):
+        self.path, self.depth, self.budget = path, depth, budget
+        self.stamp = stamp  # None: take the file as it is
+        self.frames = []    # (offset, size, crc) of the saved steps, oldest first
+        self.steps = []     # steps since then, newest last
+        self.sizes = []     # step_bytes of each of those
+        self.used = 0
+        self.dropped = 0    # frames at the front of the file no longer in the stack
+        if path and os.path.exists(path):
+            self._scan()
+
+    def _scan(self):
+        # A torn frame at the end (crash during a save) ends the history.
+        with open(self.path, "rb") as f:
+            end = os.fstat(f.fileno()).st_size
+            header = f.read(self.HEADER.size)
+            if len(header) < self.HEADER.size:
+                return
+            magic, dead, stamp = self.HEADER.unpack(header)
+            if magic != self.MAGIC or self.stamp not in (None, stamp):
+                return
+            pos = self.HEADER.size
+            while pos + 8 <= end:
+                f.seek(pos)
+                size, crc = struct.unpack("<II", f.read(8))
+                if pos + 8 + size > end:
+                    break
+                if dead:
+                    dead -= 1
+                    self.dropped += 1
+                else:
+                    self.frames.append((pos + 8, size, crc))
+                pos += 8 + size
+        if self.depth is not None and len(self.frames) > self.depth:
+            self.dropped += len(self.frames) - self.depth
+            del self.frames[:len(self.frames) - self.depth]
+
+    def _read_last(self):
+        # A damaged step, or one from a file another process has saved over
+        # since, reads back as an empty one, and nothing older is kept.
+        offset, size, crc = self.frames.pop()
+        with open(self.path, "rb") as f:
+            header = f.read(self.HEADER.size)
+            f.seek(offset)
+            data = f.read(size)
+        magic, _dead, stamp = self.HEADER.unpack(header.ljust(self.HEADER.size, b"\0"))
+        if zlib.crc32(data) != crc or magic != self.MAGIC or self.stamp not in (None, stamp):
+            self.dropped += len(self.frames)
+            self.frames.clear()
+            return []
+        return decode_step(data)
+
+    def _push(self, step):
+        size = step_bytes(step)
+        self.steps.append(step)
+        self.sizes.append(size)
+        self.used += size
+
+    def __len__(self):
+        return len(self.frames) + len(self.steps)
+
+    def __getitem__(self, i):
+        if i != -1 or not self:
+            raise IndexError("only the newest step can be read")
+        if not self.steps:
+            self._push(self._read_last())
+        return self.steps[-1]
+
+    def append(self, step):
+        self._push(step)
+        while len(self.steps) > 1 and self.budget is not None and self.used > self.budget:
+            # every saved step is older than those in memory, so they go too
+            self.dropped += len(self.frames)
+            self.frames.clear()
+            self.used -= self.sizes.pop(0)
+            del self.steps[0]
+        while self.depth is not None and len(self) > max(self.depth, 1):
+            if self.frames:
+                self.frames.pop(0)
+                self.dropped += 1
+            else:
+                self.used -= self.sizes.pop(0)
+                del self.steps[0]
+
+    def pop(self):
+        if self.steps:
+            self.used -= self.sizes.pop()
+            return self.steps.pop()
+        if self.frames:
+            return self._read_last()
+        raise IndexError("pop from empty history")
+
+    def clear(self):
+        self.dropped += len(self.frames)
+        self.frames.clear()
+        self.steps.clear()
+        self.sizes.clear()
+        self.used = 0
+
+    def save(self, stamp=None):
+        # Cuts the file back to the saved steps still in the stack and adds
+        # the new ones, under stamp (db_stamp() of the db just saved). Once
+        # most of it is dropped frames at the front, the kept ones are first
+        # copied (not decoded) into a new file.
+        if stamp is not None:
+            self.stamp = stamp
+        if not self.path or (not self and not os.path.exists(self.path)):
+            return
+        if not self.frames:
+            self.dropped = 0
+        elif self.dropped > len(self.frames):
+            self._rewrite()
+        end = self.frames[-1][0] + self.frames[-1][1] if self.frames else self.HEADER.size
+        with open(self.path, "r+b" if os.path.exists(self.path) else "wb") as f:
+            f.write(self.HEADER.pack(self.MAGIC, self.dropped, self.stamp or bytes(16)))
+            f.truncate(end)
+            f.seek(end)
+            for step in self.steps:
+                data = encode_step(step)
+                crc = zlib.crc32(data)
+                f.write(struct.pack("<II", len(data), crc) + data)
+                self.frames.append((end + 8, len(data), crc))
+                end += 8 + len(data)
+            f.flush()
+            os.fsync(f.fileno())
+        self.steps.clear()
+        self.sizes.clear()
+        self.used = 0
+
+    def _rewrite(self):
+        frames = []
+        with open(self.path, "rb") as src, open(self.path + ".tmp", "wb") as dst:
+            dst.write(self.HEADER.pack(self.MAGIC, 0, self.stamp or bytes(16)))
+            for offset, size, crc in self.frames:
+                src.seek(offset)
+                dst.write(struct.pack("<II", size, crc) + src.read(size))
+                frames.append((dst.tell() - size, size, crc))
+            dst.flush()
+            os.fsync(dst.fileno())
+        os.replace(self.path + ".tmp", self.path)
+        self.frames = frames
+        self.dropped = 0
+
+# Programmatic API: the menu's operations without prompts or printing, for
+# scripts, batch mode and benchmarks. Every change is one undo step, exactly
+# as from the menu, checked and made in one write transaction; a change that
+# cannot be written raises WriteFailed and leaves the undo stacks as they were.
+def add_record(conn, undo_stack, redo_stack, roll, name, marks):
+    # False if the roll is already taken
+    check_marks(marks)
+    with write_transaction(conn):
+        if get_record(conn, roll):
+            return False
+        record_change(conn, undo_stack, redo_stack, roll, {"roll": roll, "name": name, "marks": marks})
+    return True
+
+def update_record(conn, undo_stack, redo_stack, roll, name=None, marks=None):
+    # None keeps the current value; False if there is no such roll
+    if marks is not None:
+        check_marks(marks)
+    with write_transaction(conn):
+        s = get_record(conn, roll)
+        if not s:
+            return False
+        if name is not None:
+            s["name"] = name
+        if marks is not None:
+            s["marks"] = marks
+        record_change(conn, undo_stack, redo_stack, roll, s)
+    return True
+
+def delete_record(conn, undo_stack, redo_stack, roll):
+    with write_transaction(conn):
+        if not get_record(conn, roll):
+            return False
+        record_change(conn, undo_stack, redo_stack, roll, None)
+    return True
+
+def undo_last(conn, undo_stack, redo_stack):
+    # the step leaves its stack only once it has been applied
+    if not undo_stack:
+        return False
+    redo_stack.append(apply_changes(conn, undo_stack[-1]))
+    undo_stack.pop()
+    return True
+
+def redo_last(conn, undo_stack, redo_stack):
+    if not redo_stack:
+        return False
+    undo_stack.append(apply_changes(conn, redo_stack[-1]))
+    redo_stack.pop()
+    return True
+
+def find_by_name(conn, prefix, limit=None):
+    # limit: only the first that many matches are fetched and returned
+    prefix = prefix.strip().casefold()
+    rows = conn.execute(SQL_NAME, (prefix, prefix + "\U0010ffff"))
+    return [as_record(row) for row in itertools.islice(rows, limit)]
+
+def find_by_marks(conn, low, high, limit=None):
+    rows = conn.execute(SQL_MARKS, (low, high))
+    return [as_record(row) for row in itertools.islice(rows, limit)]
+
+def find_top(conn, n):
+    return [as_record(row) for row in conn.execute(SQL_TOP, (n,))]
+
+def class_stats(conn):
+    # Count, average and students per grade from the few class_stats rows
+    # the triggers keep up to date; lowest and highest marks are one lookup
+    # each in the marks index.
+    grades = {grade: (n, total) for grade, n, total in conn.execute(SQL_STATS)}
+    count = sum(n for n, _total in grades.values())
+    low, high = conn.execute(SQL_MIN_MAX).fetchone()
+    return {"count": count, "average": sum(t for _n, t in grades.values()) / count if count else None,
+            "min": low, "max": high, "grades": {grade: grades.get(grade, (0, 0))[0] for grade, _low in GRADES}}
+
+def recompute_class_stats(conn):
+    # class_stats worked out from scratch over every row, to check it against
+    grades = dict.fromkeys((grade for grade, _low in GRADES), 0)
+    for grade, n in conn.execute(f"SELECT {grade_sql('marks')}, COUNT(*) FROM students GROUP BY 1"):
+        grades[grade] = n
+    count, total, low, high = conn.execute(
+        "SELECT COUNT(*), SUM(marks), MIN(marks), MAX(marks) FROM students").fetchone()
+    return {"count": count, "average": total / count if count else None,
+            "min": low, "max": high, "grades": grades}
+
+def add_student(conn, undo_stack, redo_stack):
+    roll = input_int("Enter roll: ")
+    if get_record(conn, roll):
+        print("Roll already exists. Use update option.")
+        return
+    name = input("Enter name: ").strip()
+    marks = input_marks(f"Enter marks (0-{MAX_MARKS}): ")
+    # another process may have taken the roll while we were asking
+    if not add_record(conn, undo_stack, redo_stack, roll, name, marks):
+        print("Roll already exists. Use update option.")
+        return
+    print("Student added.")
+
+def view_all(conn):
+    total = conn.execute(SQL_COUNT).fetchone()[0]
+    if not total:
+        print("No records found.")
+        return
+    print("\n--- All Students ---")
+    pos = cursor = 0
+    while pos < total:
+        rows = conn.execute(SQL_PAGE, (cursor, PAGE_SIZE)).fetchall()
+        for roll, name, marks in rows:
+            print(f"Roll: {roll} | Name: {name} | Marks: {marks}")
+        pos += PAGE_SIZE
+        if pos >= total or not rows:
+            break
+        more = input(f"-- {pos} of {total} | Enter = next page, roll = jump, q = stop: ").strip()
+        if more.lower() == "q":
+            break
+        if more.isdigit():
+            cursor = int(more)
+            pos = conn.execute(SQL_BEFORE, (cursor,)).fetchone()[0]
+        else:
+            cursor = rows[-1][0] + 1
+
+def search_student(conn):
+    roll = input_int("Enter roll to search: ")
+    s = get_record(conn, roll)
+    if not s:
+        print("Student not found.")
+        return
+    print(f"Found -> Roll: {s['roll']} | Name: {s['name']} | Marks: {s['marks']}")
+
+def show_students(records):
+    if not records:
+        print("No matching students.")
+        return
+    for s in records:
+        print(f"Roll: {s['roll']} | Name: {s['name']} | Marks: {s['marks']}")
+
+def search_by_name(conn):
+    show_students(find_by_name(conn, input("Enter name or start of name: ")))
+
+def search_by_marks(conn):
+    low = input_int("Lowest marks: ")
+    high = input_int("Highest marks: ")
+    show_students(find_by_marks(conn, low, high))
+
+def top_students(conn):
+    show_students(find_top(conn, input_int("How many top students: ")))
+
+def class_report(conn):
+    stats = class_stats(conn)
+    if not stats["count"]:
+        print("No records found.")
+        return
+    print("\n--- Class Report ---")
+    print(f"Students: {stats['count']} | Average: {stats['average']:.1f} | "
+          f"Lowest: {stats['min']} | Highest: {stats['max']}")
+    for grade, low in GRADES:
+        n = stats["grades"][grade]
+        label = f"{grade} ({low}+):"
+        print(f"{label:<9}{n:>7} {'#' * round(40 * n / stats['count'])}")
+    print("Top 5:")
+    show_students(find_top(conn, 5))
+
+def update_student(conn, undo_stack, redo_stack):
+    roll = input_int("Enter roll to update: ")
+    s = get_record(conn, roll)
+    if not s:
+        print("Student not found.")
+        return
+    print(f"Current -> Name: {s['name']} | Marks: {s['marks']}")
+    new_name = input("Enter new name (blank = keep): ").strip()
+    new_marks = input("Enter new marks (blank = keep): ").strip()
+    marks = parse_int(new_marks) if new_marks else None
+    if new_marks and not valid_marks(marks):
+        print("Invalid marks. Keeping old marks.")
+        marks = None
+    if not update_record(conn, undo_stack, redo_stack, roll, new_name or None, marks):
+        print("Student not found.")
+        return
+    print("Student updated.")
+
+def delete_student(conn, undo_stack, redo_stack):
+    roll = input_int("Enter roll to delete: ")
+    if not delete_record(conn, undo_stack, redo_stack, roll):
+        print("Student not found.")
+        return
+    print("Student deleted.")
+
+def read_rows(path):
+    # Streams raw (roll, name, marks) values from a .csv file with a
+    # roll,name,marks header, or from a .ndjson/.jsonl file of objects.
+    with open(path, "r", encoding="utf-8", newline="") as f:
+        if path.lower().endswith(".csv"):
+            rows = csv.reader(f)
+            header = [h.strip().lower() for h in next(rows, [])]
+            if not {"roll", "name", "marks"} <= set(header):
+                raise csv.Error("CSV header must name roll, name and marks columns")
+            pick = operator.itemgetter(header.index("roll"), header.index("name"), header.index("marks"))
+            width = len(header)
+            for row in rows:
+                yield pick(row) if len(row) >= width else (None, None, None)
+            return
+        for line in f:
+            if not line.strip():
+                continue
+            try:
+                row = json.loads(line)
+            except ValueError:
+                row = None
+            if not isinstance(row, dict):
+                row = {}
+            yield row.get("roll"), row.get("name"), row.get("marks")
+
+def valid_changes(rows, counts):
+    # Same rules as the menu for roll and marks; bad rows are counted, not fatal.
+    for roll, name, marks in rows:
+        roll, marks = parse_int(roll), parse_int(marks)
+        if roll is None or not valid_marks(marks) or name is None:
+            counts["skipped"] += 1
+            continue
+        yield roll, {"roll": roll, "name": str(name).strip(), "marks": marks}
+
+def import_students(conn, undo_stack, redo_stack):
+    path = input("File to import (.csv or .ndjson): ").strip()
+    if not os.path.isfile(path):
+        print("File not found.")
+        return
+    counts = {"imported": 0, "skipped": 0}
+    changes = valid_changes(read_rows(path), counts)
+    start = time.perf_counter()
+    try:
+        while True:
+            batch = list(itertools.islice(changes, IMPORT_BATCH))
+            if not batch:
+                break
+            undo_stack.append(apply_changes(conn, batch))
+            counts["imported"] += len(batch)
+    except (OSError, UnicodeDecodeError, csv.Error, WriteFailed) as e:
+        print("Import stopped:", e)
+    if counts["imported"]:
+        redo_stack.clear()
+    secs = max(time.perf_counter() - start, 1e-9)
+    print(f"Imported {counts['imported']} students, skipped {counts['skipped']} invalid rows "
+          f"in {secs:.2f}s ({counts['imported'] / secs:,.0f} rows/s).")
+
+def export_students(conn):
+    path = input("File to export (.csv or .ndjson): ").strip()
+    start = time.perf_counter()
+    count = 0
+    try:
+        with open(path, "w", encoding="utf-8", newline="") as f:
+            if path.lower().endswith(".csv"):
+                w = csv.writer(f)
+                w.writerow(["roll", "name", "marks"])
+                for row in conn.execute(SQL_ALL):
+                    w.writerow(row)
+                    count += 1
+            else:
+                encode = json.JSONEncoder(ensure_ascii=False).encode
+                for row in conn.execute(SQL_ALL):
+                    f.write(encode(as_record(row)) + "\n")
+                    count += 1
+    except OSError as e:
+        print("Export failed:", e)
+        return
+    secs = max(time.perf_counter() - start, 1e-9)
+    print(f"Exported {count} students in {secs:.2f}s ({count / secs:,.0f} rows/s).")
+
+def do_undo(conn, undo_stack, redo_stack):
+    print("Undo done." if undo_last(conn, undo_stack, redo_stack) else "Nothing to undo.")
+
+def do_redo(conn, undo_stack, redo_stack):
+    print("Redo done." if redo_last(conn, undo_stack, redo_stack) else "Nothing to redo.")
+
+# Batch mode (--batch FILE, "-" = stdin) runs one command per line with no
+# prompts, all in one transaction that is committed at the end (rolled back
+# with --no-save); other processes' writes wait for it:
+#   add ROLL MARKS NAME...      update ROLL MARKS|- [NAME...]    delete ROLL
+#   get ROLL    name PREFIX    marks LOW HIGH    top N    undo    redo    save
+# Blank lines and lines starting with "#" are skipped.
+def batch_int(word):
+    n = parse_int(word)
+    if n is None:
+        raise ValueError(f"not a valid number: {word!r}")
+    return n
+
+def run_command(conn, undo_stack, redo_stack, words):
+    # Returns the records a query found (None for the other commands) and
+    # raises ValueError for a command that cannot be carried out.
+    cmd, args = words[0].lower(), words[1:]
+    if cmd == "add" and len(args) >= 2:
+        roll, marks = batch_int(args[0]), batch_int(args[1])
+        if not add_record(conn, undo_stack, redo_stack, roll, " ".join(args[2:]), marks):
+            raise ValueError(f"roll {roll} already exists")
+    elif cmd == "update" and len(args) >= 2:
+        roll = batch_int(args[0])
+        marks = None if args[1] == "-" else batch_int(args[1])
+        if not update_record(conn, undo_stack, redo_stack, roll, " ".join(args[2:]) or None, marks):
+            raise ValueError(f"roll {roll} not found")
+    elif cmd == "delete" and len(args) == 1:
+        roll = batch_int(args[0])
+        if not delete_record(conn, undo_stack, redo_stack, roll):
+            raise ValueError(f"roll {roll} not found")
+    elif cmd == "get" and len(args) == 1:
+        s = get_record(conn, batch_int(args[0]))
+        return [s] if s else []
+    elif cmd == "name":
+        return find_by_name(conn, " ".join(args))
+    elif cmd == "marks" and len(args) == 2:
+        return find_by_marks(conn, batch_int(args[0]), batch_int(args[1]))
+    elif cmd == "top" and len(args) == 1:
+        return find_top(conn, batch_int(args[0]))
+    elif cmd == "undo" and not args:
+        if not undo_last(conn, undo_stack, redo_stack):
+            raise ValueError("nothing to undo")
+    elif cmd == "redo" and not args:
+        if not redo_last(conn, undo_stack, redo_stack):
+            raise ValueError("nothing to redo")
+    elif cmd == "save" and not args:
+        save_db(conn)
+        undo_stack.save(db_stamp(conn))
+    else:
+        raise ValueError("unknown command or wrong arguments: " + " ".join(words))
+    return None
+
+def run_batch(conn, undo_stack, redo_stack, lines, quiet=False):
+    # Returns {"ops", "errors"}. Query results are printed as in the menu
+    # unless quiet; failed commands are reported on stderr and skipped.
+    counts = {"ops": 0, "errors": 0}
+    for n, line in enumerate(lines, 1):
+        words = line.split()
+        if not words or words[0].startswith("#"):
+            continue
+        counts["ops"] += 1
+        try:
+            found = run_command(conn, undo_stack, redo_stack, words)
+        except (ValueError, sqlite3.OperationalError) as e:
+            counts["errors"] += 1
+            print(f"line {n}: {e}", file=sys.stderr)
+            continue
+        if found is not None and not quiet:
+            show_students(found)
+    return counts
+
+def batch_main(conn, path, save=True, quiet=False):
+    try:
+        f = sys.stdin if path == "-" else open(path, "r", encoding="utf-8")
+    except OSError as e:
+        raise SystemExit(f"Cannot read batch file: {e}")
+    undo_stack = UndoHistory(UNDO_NAME if UNDO_FILE else None, stamp=db_stamp(conn))
+    try:
+        conn.execute("BEGIN IMMEDIATE")
+    except sqlite3.OperationalError as e:
+        raise SystemExit(f"Cannot lock {FILE_NAME}: {e}")
+    start = time.perf_counter()
+    try:
+        counts = run_batch(conn, undo_stack, UndoHistory(), f, quiet)
+    finally:
+        if f is not sys.stdin:
+            f.close()
+    secs = max(time.perf_counter() - start, 1e-9)
+    start = time.perf_counter()
+    conn.execute("COMMIT" if save else "ROLLBACK")
+    if save:
+        undo_stack.save(db_stamp(conn))
+    conn.close()
+    print(f"Ran {counts['ops']} commands ({counts['errors']} failed) in {secs:.2f}s "
+          f"({counts['ops'] / secs:,.0f} ops/s); "
+          + (f"saved in {time.perf_counter() - start:.2f}s." if save else "not saved."),
+          file=sys.stderr)
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="StudentDB (SQLite) with undo/redo.")
+    ap.add_argument("--batch", metavar="FILE", help="run commands from FILE ('-' = stdin) instead of the menu")
+    ap.add_argument("--no-save", action="store_true", help="with --batch: discard the changes at the end")
+    ap.add_argument("--quiet", action="store_true", help="with --batch: do not print query results")
+    args = ap.parse_args(argv)
+    try:
+        conn = load_db()
+    except sqlite3.OperationalError as e:
+        raise SystemExit(f"Cannot open {FILE_NAME}: {e}")
+    if args.batch:
+        batch_main(conn, args.batch, save=not args.no_save, quiet=args.quiet)
+        return
+    undo_stack = UndoHistory(UNDO_NAME if UNDO_FILE else None, stamp=db_stamp(conn))
+    redo_stack = UndoHistory()
+    print("StudentDB (SQLite) loaded. Records:", conn.execute(SQL_COUNT).fetchone()[0])
+
+    while True:
+        print("""
+=========================
+ StudentDB (SQLite)
+=========================
+1. Add Student
+2. View All Students
+3. Search Student
+4. Search by Name
+5. Search by Marks Range
+6. Top Students by Marks
+7. Class Report
+8. Update Student
+9. Delete Student
+10. Import Students (CSV/NDJSON)
+11. Export Students (CSV/NDJSON)
+12. Undo
+13. Redo
+14. Save
+15. Save & Exit
+16. Exit
+""")
+        choice = input("Choose option: ").strip()
+
+        # Every change is committed as it is made; one that cannot be
+        # written (e.g. another process holds the db locked) is reported.
+        try:
+            if choice == "1":
+                add_student(conn, undo_stack, redo_stack)
+            elif choice == "2":
+                view_all(conn)
+            elif choice == "3":
+                search_student(conn)
+            elif choice == "4":
+                search_by_name(conn)
+            elif choice == "5":
+                search_by_marks(conn)
+            elif choice == "6":
+                top_students(conn)
+            elif choice == "7":
+                class_report(conn)
+            elif choice == "8":
+                update_student(conn, undo_stack, redo_stack)
+            elif choice == "9":
+                delete_student(conn, undo_stack, redo_stack)
+            elif choice == "10":
+                import_students(conn, undo_stack, redo_stack)
+            elif choice == "11":
+                export_students(conn)
+            elif choice == "12":
+                do_undo(conn, undo_stack, redo_stack)
+            elif choice == "13":
+                do_redo(conn, undo_stack, redo_stack)
+            elif choice == "14":
+                save_db(conn)
+                undo_stack.save(db_stamp(conn))
+                print("Saved.")
+            elif choice == "15":
+                save_db(conn)
+                undo_stack.save(db_stamp(conn))
+                conn.close()
+                print("Saved. Bye!")
+                break
+            elif choice == "16":
+                conn.close()
+                print("Bye! (Changes are saved as they are made.)")
+                break
+            else:
+                print("Invalid choice.")
+        except (WriteFailed, sqlite3.OperationalError) as e:
+            print("Error:", e)
+
+if __name__ == "__main__":
+    main()
+'''
+
+# -------------------------
+# STUDENTDB SERVICE (many clients, one db; written out with the projects)
+# -------------------------
+STUDENTDB_SERVER_CODE = r'''# studentdb_server.py
+# One StudentDB shared by many clients over a local socket. The server owns
+# the in-memory db of the JSON (default) or pickle version, imported from
+# the file next to this one, and speaks one JSON object per line each way.
+# (The SQLite version needs no server: several processes can share its file.)
+#
+#   python studentdb_server.py                          # 127.0.0.1:8765
+#   python studentdb_server.py --backend pickle --unix /tmp/studentdb.sock
+#
+# Requests look like {"op": "add", "roll": 7, "name": "Asha", "marks": 91};
+# replies are {"ok": true, ...} or {"ok": false, "error": "..."}.
+#   reads:  get roll | name prefix | marks low high | top n | page start limit | count
+#   writes: add roll name marks | update roll [name] [marks] | delete roll | undo | redo
+import argparse
+import asyncio
+import bisect
+import functools
+import importlib
+import json
+import signal
+
+BACKENDS = {"json": "studentdb_json_undo_redo", "pickle": "studentdb_pickle_undo_redo"}
+HOST = "127.0.0.1"
+PORT = 8765
+MAX_RESULTS = 1000              # records per reply; longer results are cut
+MAX_BATCH = 500                 # writes applied (and saved) together
+READ_OPS = {"get", "name", "marks", "top", "page", "count"}
+WRITE_OPS = {"add", "update", "delete", "undo", "redo"}
+
+encode = json.JSONEncoder(ensure_ascii=False, default=dict).encode
+
+class Session:
+    # One client's own undo/redo history, using the backend's steps, capped
+    # like the menu's (it ends with the connection). `mine` is the record
+    # this client last left under each key: an undo or redo is only applied
+    # while those are still what the db holds, so it never overwrites a
+    # newer change made by someone else.
+    def __init__(self, sdb):
+        self.undo_stack = sdb.UndoHistory()
+        self.redo_stack = sdb.UndoHistory()
+        self.mine = {}
+
+class Request(ValueError):
+    # a request that cannot be carried out; the message goes back to the client
+    pass
+
+def number(sdb, req, field):
+    n = sdb.parse_int(req.get(field))
+    if n is None:
+        raise Request(f"{field} must be a whole number")
+    return n
+
+def found(records):
+    # queries are asked for one record more than MAX_RESULTS to spot a cut
+    return {"ok": True, "records": records[:MAX_RESULTS], "truncated": len(records) > MAX_RESULTS}
+
+# Reads run straight away in the connection's own task. Everything runs on
+# one event loop thread, so a read sees the db between two write batches,
+# never halfway through one.
+def handle_read(sdb, db, req):
+    op = req["op"]
+    if op == "get":
+        s = sdb.get_record(db, number(sdb, req, "roll"))
+        return found([s] if s else [])
+    if op == "name":
+        if not isinstance(req.get("prefix", ""), str):
+            raise Request("prefix must be text")
+        return found(sdb.find_by_name(db, req.get("prefix", ""), MAX_RESULTS + 1))
+    if op == "marks":
+        low, high = number(sdb, req, "low"), number(sdb, req, "high")
+        return found(sdb.find_by_marks(db, low, high, MAX_RESULTS + 1))
+    if op == "top":
+        return found(sdb.find_top(db, min(number(sdb, req, "n"), MAX_RESULTS)))
+    if op == "page":
+        # rolls from `start` on, with how many come before for "x of y"
+        rolls = sdb.ROLL_INDEX
+        start = bisect.bisect_left(rolls, number(sdb, req, "start"))
+        limit = min(number(sdb, req, "limit"), MAX_RESULTS)
+        return {"ok": True, "records": [sdb.get_record(db, r) for r in rolls[start:start + limit]],
+                "before": start, "total": len(rolls)}
+    return {"ok": True, "count": len(db)}
+
+def take_back(sdb, db, session, stack, apply, empty):
+    if not stack:
+        raise Request(empty)
+    step = stack[-1]
+    if any(db.get(key) != session.mine[key] for key, _record in step):
+        stack.pop()
+        raise Request("a record in that step was changed by another client since; step dropped")
+    apply(db, session.undo_stack, session.redo_stack)
+    session.mine.update(step)
+
+def handle_write(sdb, db, session, req):
+    op = req["op"]
+    if op in ("undo", "redo"):
+        if op == "undo":
+            take_back(sdb, db, session, session.undo_stack, sdb.undo_last, "nothing to undo")
+        else:
+            take_back(sdb, db, session, session.redo_stack, sdb.redo_last, "nothing to redo")
+        return {"ok": True}
+    roll = number(sdb, req, "roll")
+    name = req.get("name")
+    if name is not None and not isinstance(name, str):
+        raise Request("name must be text")
+    marks = number(sdb, req, "marks") if req.get("marks") is not None else None
+    if op == "add":
+        if name is None or marks is None:
+            raise Request("add needs roll, name and marks")
+        done = sdb.add_record(db, session.undo_stack, session.redo_stack, roll, name.strip(), marks)
+        if not done:
+            raise Request(f"roll {roll} already exists")
+    elif op == "update":
+        done = sdb.update_record(db, session.undo_stack, session.redo_stack, roll,
+                                 name.strip() if name else None, marks)
+    else:
+        done = sdb.delete_record(db, session.undo_stack, session.redo_stack, roll)
+    if not done:
+        raise Request(f"roll {roll} not found")
+    key = session.undo_stack[-1][0][0]
+    session.mine[key] = db.get(key)
+    return {"ok": True}
+
+# Writes from every client go through one queue to this task, so they are
+# applied one at a time in arrival order. Each batch is saved (a journal
+# append and one fsync, or now and then a new snapshot) before any of its
+# clients is answered, so a client that got "ok" knows its change is on
+# disk. The file writes run in a worker thread from a frozen copy of the
+# batch, so reads are answered while they happen.
+async def run_writer(sdb, db, queue):
+    loop = asyncio.get_running_loop()
+    while True:
+        batch = [await queue.get()]
+        while len(batch) < MAX_BATCH and not queue.empty():
+            batch.append(queue.get_nowait())
+        replies = []
+        for session, req, _reply in batch:
+            try:
+                replies.append(handle_write(sdb, db, session, req))
+            except Exception as e:  # one bad request must not stop the writer
+                replies.append({"ok": False, "error": str(e) if isinstance(e, ValueError) else repr(e)})
+        if sdb.DIRTY:
+            try:
+                plan = sdb.begin_save(db)
+                await loop.run_in_executor(None, sdb.write_save, db, plan)
+                sdb.end_save(db, plan)
+            except OSError as e:
+                replies = [{"ok": False, "error": f"changed but not saved: {e}"} if r["ok"] else r
+                           for r in replies]
+        for (_session, _req, reply), result in zip(batch, replies):
+            if not reply.done():
+                reply.set_result(result)
+            queue.task_done()
+        await asyncio.sleep(0)  # let waiting reads in before the next batch
+
+async def serve_client(sdb, db, queue, reader, writer):
+    session = Session(sdb)
+    loop = asyncio.get_running_loop()
+    try:
+        while line := await reader.readline():
+            try:
+                req = json.loads(line)
+                if not isinstance(req, dict) or req.get("op") not in READ_OPS | WRITE_OPS:
+                    raise Request("unknown request")
+                if req["op"] in READ_OPS:
+                    result = handle_read(sdb, db, req)
+                else:
+                    reply = loop.create_future()
+                    await queue.put((session, req, reply))
+                    result = await reply
+            except (json.JSONDecodeError, UnicodeDecodeError):
+                result = {"ok": False, "error": "bad JSON"}
+            except ValueError as e:  # a Request, or a value the backend refused
+                result = {"ok": False, "error": str(e)}
+            writer.write((encode(result) + "\n").encode("utf-8"))
+            await writer.drain()
+    except (ConnectionError, ValueError):
+        pass  # client went away, or sent a line over the stream limit
+    finally:
+        writer.close()
+
+async def serve(args):
+    sdb = importlib.import_module(BACKENDS[args.backend])
+    db = sdb.load_db()
+    sdb.build_search_indexes(db)  # once here rather than in the first search request
+    queue = asyncio.Queue()
+    writer_task = asyncio.create_task(run_writer(sdb, db, queue))
+    handler = functools.partial(serve_client, sdb, db, queue)
+    if args.unix:
+        server = await asyncio.start_unix_server(handler, args.unix)
+        where = args.unix
+    else:
+        server = await asyncio.start_server(handler, args.host, args.port)
+        where = f"{args.host}:{args.port}"
+    stop = asyncio.Event()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        try:
+            asyncio.get_running_loop().add_signal_handler(sig, stop.set)
+        except (NotImplementedError, RuntimeError):
+            pass  # Windows: Ctrl+C still stops it, and every answered write is saved
+    print(f"StudentDB ({args.backend}) serving {len(db)} records on {where}", flush=True)
+    await stop.wait()
+    server.close()
+    await queue.join()  # writes already queued are applied and saved
+    writer_task.cancel()
+    if sdb.DIRTY:
+        sdb.save_db(db)
+    print("Saved. Bye!")
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Serve one StudentDB to many clients.")
+    ap.add_argument("--backend", choices=BACKENDS, default="json")
+    ap.add_argument("--host", default=HOST)
+    ap.add_argument("--port", type=int, default=PORT)
+    ap.add_argument("--unix", metavar="PATH", help="listen on a Unix socket instead of TCP")
+    asyncio.run(serve(ap.parse_args(argv)))
+
+if __name__ == "__main__":
+    main()
+'''
+
+STUDENTDB_CLIENT_CODE = r'''# studentdb_client.py
+# The StudentDB menu, talking to studentdb_server.py instead of a local
+# file, so several people can work on one db at once. Every change is saved
+# by the server as soon as it is made; undo and redo take back your own
+# changes only.
+#
+#   python studentdb_client.py                     # server on 127.0.0.1:8765
+#   python studentdb_client.py --unix /tmp/studentdb.sock
+import argparse
+import json
+import socket
+
+HOST = "127.0.0.1"
+PORT = 8765
+PAGE_SIZE = 20
+
+class Connection:
+    # one request line out, one reply line back
+    def __init__(self, host=HOST, port=PORT, unix=None):
+        if unix:
+            self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            self.sock.connect(unix)
+        else:
+            self.sock = socket.create_connection((host, port))
+        self.file = self.sock.makefile("rwb")
+
+    def call(self, op, **fields):
+        self.file.write(json.dumps(dict(fields, op=op), ensure_ascii=False).encode("utf-8") + b"\n")
+        self.file.flush()
+        line = self.file.readline()
+        if not line:
+            raise ConnectionError("server closed the connection")
+        return json.loads(line)
+
+    def close(self):
+        self.file.close()
+        self.sock.close()
+
+def parse_int(s):
+    s = str(s).strip()
+    return int(s) if s.isdecimal() and int(s) < 2 ** 63 else None
+
+def input_int(prompt):
+    while True:
+        n = parse_int(input(prompt))
+        if n is not None:
+            return n
+        print("Please enter a valid number.")
+
+def show_students(reply):
+    if not reply["ok"]:
+        print("Error:", reply["error"])
+    elif not reply["records"]:
+        print("No matching students.")
+    else:
+        for s in reply["records"]:
+            print(f"Roll: {s['roll']} | Name: {s['name']} | Marks: {s['marks']}")
+        if reply.get("truncated"):
+            print(f"(first {len(reply['records'])} shown)")
+
+def report(reply, done):
+    print(done if reply["ok"] else "Error: " + reply["error"])
+
+def add_student(conn):
+    roll = input_int("Enter roll: ")
+    if conn.call("get", roll=roll)["records"]:
+        print("Roll already exists. Use update option.")
+        return
+    name = input("Enter name: ").strip()
+    marks = input_int("Enter marks (0-100): ")
+    report(conn.call("add", roll=roll, name=name, marks=marks), "Student added.")
+
+def view_all(conn):
+    reply = conn.call("page", start=0, limit=PAGE_SIZE)
+    if not reply["total"]:
+        print("No records found.")
+        return
+    print("\n--- All Students ---")
+    while True:
+        show_students(reply)
+        pos = reply["before"] + len(reply["records"])
+        if pos >= reply["total"]:
+            return
+        more = input(f"-- {pos} of {reply['total']} | Enter = next page, roll = jump, q = stop: ").strip()
+        if more.lower() == "q":
+            return
+        start = int(more) if more.isdigit() else reply["records"][-1]["roll"] + 1
+        reply = conn.call("page", start=start, limit=PAGE_SIZE)
+
+def search_student(conn):
+    records = conn.call("get", roll=input_int("Enter roll to search: "))["records"]
+    if not records:
+        print("Student not found.")
+        return
+    s = records[0]
+    print(f"Found -> Roll: {s['roll']} | Name: {s['name']} | Marks: {s['marks']}")
+
+def update_student(conn):
+    roll = input_int("Enter roll to update: ")
+    records = conn.call("get", roll=roll)["records"]
+    if not records:
+        print("Student not found.")
+        return
+    s = records[0]
+    print(f"Current -> Name: {s['name']} | Marks: {s['marks']}")
+    new_name = input("Enter new name (blank = keep): ").strip()
+    new_marks = input("Enter new marks (blank = keep): ").strip()
+    marks = parse_int(new_marks) if new_marks else None
+    if new_marks and marks is None:
+        print("Invalid marks. Keeping old marks.")
+    report(conn.call("update", roll=roll, name=new_name or None, marks=marks), "Student updated.")
+
+def delete_student(conn):
+    report(conn.call("delete", roll=input_int("Enter roll to delete: ")), "Student deleted.")
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="StudentDB menu for a studentdb_server.py server.")
+    ap.add_argument("--host", default=HOST)
+    ap.add_argument("--port", type=int, default=PORT)
+    ap.add_argument("--unix", metavar="PATH", help="connect to a Unix socket instead of TCP")
+    args = ap.parse_args(argv)
+    try:
+        conn = Connection(args.host, args.port, args.unix)
+    except OSError as e:
+        raise SystemExit(f"Cannot reach the StudentDB server: {e}")
+    print("Connected to StudentDB. Records:", conn.call("count")["count"])
+
+    while True:
+        print("""
+=========================
+ StudentDB (Client)
+=========================
+1. Add Student
+2. View All Students
+3. Search Student
+4. Search by Name
+5. Search by Marks Range
+6. Top Students by Marks
+7. Update Student
+8. Delete Student
+9. Undo (my last change)
+10. Redo
+11. Exit
+""")
+        choice = input("Choose option: ").strip()
+
+        try:
+            if choice == "1":
+                add_student(conn)
+            elif choice == "2":
+                view_all(conn)
+            elif choice == "3":
+                search_student(conn)
+            elif choice == "4":
+                show_students(conn.call("name", prefix=input("Enter name or start of name: ")))
+            elif choice == "5":
+                low = input_int("Lowest marks: ")
+                high = input_int("Highest marks: ")
+                show_students(conn.call("marks", low=low, high=high))
+            elif choice == "6":
+                show_students(conn.call("top", n=input_int("How many top students: ")))
+            elif choice == "7":
+                update_student(conn)
+            elif choice == "8":
+                delete_student(conn)
+            elif choice == "9":
+                report(conn.call("undo"), "Undo done.")
+            elif choice == "10":
+                report(conn.call("redo"), "Redo done.")
+            elif choice == "11":
+                conn.close()
+                print("Bye! (changes are already saved)")
+                break
+            else:
+                print("Invalid choice.")
+        except (OSError, ValueError) as e:
+            raise SystemExit(f"Lost the StudentDB server: {e}")
+
+if __name__ == "__main__":
+    main()
+'''
+
+STUDENTDB_LOADGEN_CODE = r'''# studentdb_loadgen.py
+# Load generator for studentdb_server.py: many concurrent clients sending a
+# mix of reads and writes, with latency percentiles per request type and a
+# consistency check at the end. Each client only writes its own block of
+# rolls and keeps a model of what they should hold (its undos included),
+# so any lost, reordered or misapplied write shows up as a mismatch.
+#
+#   python studentdb_loadgen.py --spawn                 # throwaway server in a temp dir
+#   python studentdb_loadgen.py --clients 50 --requests 2000 --writes 0.3
+#   python studentdb_loadgen.py --unix /tmp/studentdb.sock
+import argparse
+import asyncio
+import json
+import os
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+HOST = "127.0.0.1"
+PORT = 8765
+NAMES = ("Asha", "Ben", "Chen", "Divya", "Emil", "Farah", "Gita", "Hugo", "Ines", "Jon")
+
+async def connect(args):
+    if args.unix:
+        return await asyncio.open_unix_connection(args.unix)
+    return await asyncio.open_connection(args.host, args.port)
+
+async def call(reader, writer, req):
+    writer.write((json.dumps(req) + "\n").encode("utf-8"))
+    await writer.drain()
+    line = await reader.readline()
+    if not line:
+        raise ConnectionError("server closed the connection")
+    return json.loads(line)
+
+async def run_client(cid, args, latencies):
+    # Returns the number of rolls whose final record differs from the model.
+    rng = random.Random(args.seed * 100003 + cid)
+    rolls = range(cid * args.rolls, (cid + 1) * args.rolls)
+    model, history = {}, []  # roll -> (name, marks); (roll, previous) per undoable write
+    reader, writer = await connect(args)
+    try:
+        for _ in range(args.requests):
+            roll = rng.choice(rolls)
+            if rng.random() < args.writes:
+                kind = rng.choice(("add", "add", "update", "delete", "undo"))
+                if kind == "add":
+                    req = {"op": "add", "roll": roll, "name": rng.choice(NAMES), "marks": rng.randrange(101)}
+                elif kind == "update":
+                    req = {"op": "update", "roll": roll, "marks": rng.randrange(101)}
+                else:
+                    req = {"op": kind, "roll": roll} if kind == "delete" else {"op": "undo"}
+            else:
+                kind = rng.choice(("get", "get", "get", "name", "marks", "top"))
+                req = {"get": {"op": "get", "roll": roll},
+                       "name": {"op": "name", "prefix": rng.choice(NAMES)[:2]},
+                       "marks": {"op": "marks", "low": 90, "high": 100},
+                       "top": {"op": "top", "n": 10}}[kind]
+            start = time.perf_counter()
+            reply = await call(reader, writer, req)
+            latencies.setdefault(kind, []).append(time.perf_counter() - start)
+            if not reply["ok"] or kind in ("get", "name", "marks", "top"):
+                continue
+            if kind == "undo":
+                undone, previous = history.pop()
+                model[undone] = previous
+                continue
+            history.append((roll, model.get(roll)))
+            if kind == "add":
+                model[roll] = (req["name"], req["marks"])
+            elif kind == "update":
+                model[roll] = (model[roll][0], req["marks"])
+            else:
+                model[roll] = None
+        mismatches = 0
+        for roll in rolls:
+            records = (await call(reader, writer, {"op": "get", "roll": roll}))["records"]
+            got = (records[0]["name"], records[0]["marks"]) if records else None
+            mismatches += got != model.get(roll)
+        return mismatches
+    finally:
+        writer.close()
+
+def percentile(sorted_secs, p):
+    return sorted_secs[min(len(sorted_secs) - 1, int(p / 100 * len(sorted_secs)))] * 1000
+
+async def run(args):
+    latencies = {}
+    start = time.perf_counter()
+    mismatches = await asyncio.gather(*(run_client(c, args, latencies) for c in range(args.clients)))
+    secs = time.perf_counter() - start
+    total = sum(len(v) for v in latencies.values())
+    print(f"{'request':<8} {'count':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'max ms':>8}")
+    for kind, secs_list in sorted(latencies.items()):
+        secs_list.sort()
+        print(f"{kind:<8} {len(secs_list):>8} " + " ".join(
+            f"{percentile(secs_list, p):>8.2f}" for p in (50, 95, 99, 100)))
+    print(f"{args.clients} clients, {total} requests in {secs:.2f}s ({total / secs:,.0f} req/s)")
+    print("consistency:", "ok" if not any(mismatches) else f"{sum(mismatches)} roll(s) differ from the model")
+    return not any(mismatches)
+
+def spawn_server(args):
+    # A server in a temp dir, so the run never touches a real db.
+    workdir = tempfile.mkdtemp(prefix="studentdb_load_")
+    here = os.path.dirname(os.path.abspath(__file__))
+    cmd = [sys.executable, os.path.join(here, "studentdb_server.py"), "--backend", args.backend]
+    cmd += ["--unix", args.unix] if args.unix else ["--host", args.host, "--port", str(args.port)]
+    proc = subprocess.Popen(cmd, cwd=workdir, stdout=subprocess.PIPE, text=True)
+    print(proc.stdout.readline().rstrip())  # "serving ..." once it listens
+    return proc, workdir
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Load-test a StudentDB server.")
+    ap.add_argument("--host", default=HOST)
+    ap.add_argument("--port", type=int, default=PORT)
+    ap.add_argument("--unix", metavar="PATH", help="use a Unix socket instead of TCP")
+    ap.add_argument("--clients", type=int, default=20, help="concurrent connections")
+    ap.add_argument("--requests", type=int, default=500, help="requests per client")
+    ap.add_argument("--writes", type=float, default=0.2, help="fraction of requests that write")
+    ap.add_argument("--rolls", type=int, default=50, help="rolls owned by each client")
+    ap.add_argument("--seed", type=int, default=0)
+    ap.add_argument("--spawn", action="store_true", help="start a server in a temp dir for the run")
+    ap.add_argument("--backend", choices=("json", "pickle"), default="json", help="with --spawn")
+    args = ap.parse_args(argv)
+    proc = workdir = None
+    if args.spawn:
+        proc, workdir = spawn_server(args)
+    try:
+        ok = asyncio.run(run(args))
+    except OSError as e:
+        raise SystemExit(f"Cannot reach the StudentDB server: {e}")
+    finally:
+        if proc:
+            proc.terminate()
+            proc.wait()
+            shutil.rmtree(workdir, ignore_errors=True)
+    sys.exit(0 if ok else 1)
+
+if __name__ == "__main__":
+    main()
+'''
+
+# -------------------------
+# COURSE MODEL
+# TOPICS/CHAPTERS/MCQS compiled once into immutable tuples with everything
+# the exporters need precomputed (wrapped code, exercises, diagram ids,
+# answer keys). All three builders read this instead of the raw data.
+# -------------------------
+Topic = namedtuple("Topic", "tid title intro expl imp samples code exercises answers diagram_id")
+Chapter = namedtuple("Chapter", "title topic_ids topics mcqs answer_key")
+Appendix = namedtuple("Appendix", "label title filename summary code")
+Course = namedtuple("Course", "chapters appendices")
+
+def wrap_code(txt):
+    wrap=[]
+    for line in txt.splitlines():
+        wrap += textwrap.wrap(line, 95) if len(line) > 95 else [line]
+    return "\n".join(wrap)
+
+def compile_course(topics=None, chapters=None, mcqs=None, diagram_ids=None):
+    topics = TOPICS if topics is None else topics
+    chapters = CHAPTERS if chapters is None else chapters
+    mcqs = MCQS if mcqs is None else mcqs
+    canon = canonical_diagram_ids(DIAGRAM_TOPIC_IDS if diagram_ids is None else diagram_ids)
+
+    compiled = {}
+    for tid, title, intro, expl, imp, samples in topics:
+        ex, ans = exercises_for(title)
+        compiled[tid] = Topic(
+            tid, title, intro, expl, imp, tuple(samples),
+            tuple(wrap_code(s) for s in samples), tuple(ex), tuple(ans),
+            canon.get(tid))
+
+    out = []
+    for ch, ids in chapters:
+        qs = tuple((q, tuple(opts), key) for q, opts, key in mcqs[ch])
+        answer_key = ", ".join(f"Q{i}-{key}" for i, (_q, _o, key) in enumerate(qs, 1))
+        out.append(Chapter(ch, tuple(ids), tuple(compiled[t] for t in ids), qs, answer_key))
+
+    appendices = (
+        Appendix("A", "StudentDB Pickle Project", "studentdb_pickle_undo_redo.py",
+                 "Pickle + Undo/Redo", wrap_code(STUDENTDB_PICKLE_CODE)),
+        Appendix("B", "StudentDB JSON Project", "studentdb_json_undo_redo.py",
+                 "JSON + Undo/Redo", wrap_code(STUDENTDB_JSON_CODE)),
+        Appendix("C", "StudentDB SQLite Project", "studentdb_sqlite_undo_redo.py",
+                 "SQLite + Undo/Redo", wrap_code(STUDENTDB_SQLITE_CODE)),
+    )
+    return Course(tuple(out), appendices)
+
+
 # -------------------------
 # BUILDERS
 # -------------------------
-def pdf_footer(c: canvas.Canvas, doc):
+def pdf_footer(c, doc):
+    from reportlab.lib.pagesizes import A4
+    from reportlab.lib.units import cm
+    from reportlab.lib import colors
     c.saveState()
     c.setFont("Helvetica", 9)
     c.setFillColor(colors.grey)
@@ -724,13 +4456,13 @@ def pdf_footer(c: canvas.Canvas, doc):
     c.drawRightString(A4[0]-1.5*cm, 1.1*cm, f"Page {c.getPageNumber()}")
     c.restoreState()
 
-def code_block(styles, txt):
-    wrap=[]
-    for line in txt.splitlines():
-        wrap += textwrap.wrap(line, 95) if len(line) > 95 else [line]
-    return Preformatted("\n".join(wrap), styles["Code"])
+def code_block(styles, wrapped):
+    from reportlab.platypus import Preformatted
+    return Preformatted(wrapped, styles["CodeBlock"])
 
-def build_pdf(diag_paths):
+def pdf_styles():
+    from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
+    from reportlab.lib import colors
     styles = getSampleStyleSheet()
     styles.add(ParagraphStyle(name="T", parent=styles["Title"], fontSize=26, leading=30))
     styles.add(ParagraphStyle(name="ST", parent=styles["Heading2"], fontSize=14, leading=18,
@@ -739,94 +4471,181 @@ def build_pdf(diag_paths):
                               textColor=colors.HexColor("#d97706")))
     styles.add(ParagraphStyle(name="H2", parent=styles["Heading2"], fontSize=14, leading=18))
     styles.add(ParagraphStyle(name="B", parent=styles["BodyText"], fontSize=10.5, leading=14))
-    styles.add(ParagraphStyle(name="Code", parent=styles["BodyText"], fontName="Courier",
+    # the sample sheet already has a "Code" style, so ours needs its own name
+    styles.add(ParagraphStyle(name="CodeBlock", parent=styles["BodyText"], fontName="Courier",
                               fontSize=8.4, leading=10))
+    return styles
+
+def pdf_story(styles, diag_paths, course, backend="png"):
+    # Yields the flowables in page order; build_pdf() either collects them
+    # into a list or streams them into the layout engine.
+    from reportlab.platypus import Paragraph, Spacer, PageBreak, Image, Table, TableStyle, Flowable
+    from reportlab.graphics import renderPDF
+    from reportlab.lib.units import cm
+    from reportlab.lib import colors
+
+    class PhaseMark(Flowable):
+        # zero-size; starts a profiling phase when layout reaches it. Only
+        # emitted while profiling, since it adds a no-op to the page stream.
+        def __init__(self, name):
+            super().__init__()
+            self.name = name
+        def wrap(self, aw, ah):
+            return 0, 0
+        def draw(self):
+            switch_phase(self.name)
 
-    story=[]
-    story.append(Paragraph("Python Starter Course", styles["T"]))
-    story.append(Paragraph(BRAND_LINE_1, styles["ST"]))
-    story.append(Paragraph(BRAND_LINE_2, styles["ST"]))
-    story.append(Spacer(1,8))
-    story.append(Paragraph(f"<b>Prepared by:</b> {AUTHOR} &nbsp;&nbsp;|&nbsp;&nbsp; <b>Date:</b> {DATE_STR}", styles["B"]))
-    story.append(Spacer(1,10))
-    story.append(Paragraph(
+    class FlowDiagram(Flowable):
+        # Vector diagram stored as a PDF form XObject named after its spec:
+        # the first use defines it, repeats only reference it.
+        def __init__(self, spec, width, height):
+            super().__init__()
+            self.spec, self.width, self.height = spec, width, height
+            self.form = "diag_" + spec_digest(spec)[:16]
+        def wrap(self, aw, ah):
+            return self.width, self.height
+        def draw(self):
+            canv = self.canv
+            if not canv.hasForm(self.form):
+                canv.beginForm(self.form, 0, 0, self.width, self.height)
+                renderPDF.draw(flow_diagram_drawing(self.spec, self.width, self.height), canv, 0, 0)
+                canv.endForm()
+            canv.doForm(self.form)
+
+    marks = PROFILE["enabled"]
+
+    yield Paragraph("Python Starter Course", styles["T"])
+    yield Paragraph(BRAND_LINE_1, styles["ST"])
+    yield Paragraph(BRAND_LINE_2, styles["ST"])
+    yield Spacer(1,8)
+    yield Paragraph(f"<b>Prepared by:</b> {AUTHOR} &nbsp;&nbsp;|&nbsp;&nbsp; <b>Date:</b> {DATE_STR}", styles["B"])
+    yield Spacer(1,10)
+    yield Paragraph(
         "This edition includes: flow diagrams (Loops 6–10, Data Structures 11–15, StudentDB 18–19), "
         "practice exercises with answers after every topic, and MCQs at the end of each chapter.",
         styles["B"]
-    ))
-    story.append(PageBreak())
+    )
+    yield PageBreak()
 
     # Contents table
-    story.append(Paragraph("Contents", styles["H1"]))
-    toc=[["Chapter","Topics"]]+[[ch, ", ".join(str(i) for i in ids)] for ch,ids in CHAPTERS]
+    yield Paragraph("Contents", styles["H1"])
+    toc=[["Chapter","Topics"]]+[[ch.title, ", ".join(str(i) for i in ch.topic_ids)] for ch in course.chapters]
     tbl=Table(toc, colWidths=[6*cm, 10.5*cm])
     tbl.setStyle(TableStyle([
         ("GRID",(0,0),(-1,-1),0.5,colors.grey),
         ("BACKGROUND",(0,0),(-1,0),colors.lightgrey),
         ("FONTNAME",(0,0),(-1,0),"Helvetica-Bold")
     ]))
-    story.append(tbl)
-    story.append(PageBreak())
-
-    topic_map = {t[0]:t for t in TOPICS}
-
-    for ch, ids in CHAPTERS:
-        story.append(Paragraph(ch, styles["H1"]))
-        story.append(Paragraph(f"Topics: {', '.join(str(i) for i in ids)}", styles["B"]))
-        story.append(Spacer(1,6))
-
-        for tid in ids:
-            _, title, intro, expl, imp, samples = topic_map[tid]
-            story.append(Paragraph(f"{tid}. {title}", styles["H2"]))
-            story.append(Paragraph(f"<b>Introduction:</b> {intro}", styles["B"]))
-            story.append(Paragraph(f"<b>Explanation:</b> {expl}", styles["B"]))
-            story.append(Paragraph(f"<b>Importance:</b> {imp}", styles["B"]))
-            story.append(Spacer(1,6))
-
-            if tid in DIAGRAM_TOPIC_IDS:
-                story.append(Paragraph("<b>Flow Diagram</b>", styles["B"]))
-                img_id = 18 if tid==19 else tid
-                story.append(Image(diag_paths[img_id], width=17.0*cm, height=5.2*cm))
-                story.append(Spacer(1,6))
-
-            story.append(Paragraph("<b>Code Samples (3)</b>", styles["B"]))
-            for i, s in enumerate(samples, 1):
-                story.append(Paragraph(f"Sample {i}", styles["B"]))
-                story.append(code_block(styles, s))
-                story.append(Spacer(1,4))
-
-            ex, ans = exercises_for(title)
-            story.append(Paragraph("<b>Practice Exercises</b>", styles["B"]))
-            for line in ex:
-                story.append(Paragraph("• " + line, styles["B"]))
-            story.append(Spacer(1,4))
-            story.append(Paragraph("<b>Answers</b>", styles["B"]))
-            for line in ans:
-                story.append(Paragraph("• " + line, styles["B"]))
-            story.append(Spacer(1,10))
+    yield tbl
+    yield PageBreak()
+
+    for n, ch in enumerate(course.chapters, 1):
+        yield Paragraph(ch.title, styles["H1"])
+        if marks:
+            yield PhaseMark(f"chapter {n}")
+        yield Paragraph(f"Topics: {', '.join(str(i) for i in ch.topic_ids)}", styles["B"])
+        yield Spacer(1,6)
+
+        for t in ch.topics:
+            yield Paragraph(f"{t.tid}. {t.title}", styles["H2"])
+            yield Paragraph(f"<b>Introduction:</b> {t.intro}", styles["B"])
+            yield Paragraph(f"<b>Explanation:</b> {t.expl}", styles["B"])
+            yield Paragraph(f"<b>Importance:</b> {t.imp}", styles["B"])
+            yield Spacer(1,6)
+
+            if t.diagram_id is not None:
+                yield Paragraph("<b>Flow Diagram</b>", styles["B"])
+                if backend == "vector":
+                    yield FlowDiagram(diagram_spec(t.diagram_id), 17.0*cm, 5.2*cm)
+                else:
+                    yield Image(diag_paths[t.diagram_id], width=17.0*cm, height=5.2*cm)
+                yield Spacer(1,6)
+
+            yield Paragraph(f"<b>Code Samples ({len(t.code)})</b>", styles["B"])
+            for i, s in enumerate(t.code, 1):
+                yield Paragraph(f"Sample {i}", styles["B"])
+                yield code_block(styles, s)
+                yield Spacer(1,4)
+
+            yield Paragraph("<b>Practice Exercises</b>", styles["B"])
+            for line in t.exercises:
+                yield Paragraph("• " + line, styles["B"])
+            yield Spacer(1,4)
+            yield Paragraph("<b>Answers</b>", styles["B"])
+            for line in t.answers:
+                yield Paragraph("• " + line, styles["B"])
+            yield Spacer(1,10)
 
         # MCQs
-        story.append(Paragraph("MCQs (End of Chapter)", styles["H2"]))
-        for i,(q,opts,key) in enumerate(MCQS[ch],1):
-            story.append(Paragraph(f"<b>Q{i}.</b> {q}", styles["B"]))
+        yield Paragraph("MCQs (End of Chapter)", styles["H2"])
+        for i,(q,opts,key) in enumerate(ch.mcqs,1):
+            yield Paragraph(f"<b>Q{i}.</b> {q}", styles["B"])
             for o in opts:
-                story.append(Paragraph("&nbsp;&nbsp;" + o, styles["B"]))
-        story.append(Spacer(1,6))
-        story.append(Paragraph("<b>Answer Key:</b> " + ", ".join([f"Q{i+1}-{MCQS[ch][i][2]}" for i in range(len(MCQS[ch]))]), styles["B"]))
-        story.append(PageBreak())
+                yield Paragraph("&nbsp;&nbsp;" + o, styles["B"])
+        yield Spacer(1,6)
+        yield Paragraph("<b>Answer Key:</b> " + ch.answer_key, styles["B"])
+        yield PageBreak()
 
     # Appendices: full projects
-    story.append(Paragraph("Appendix A — StudentDB Pickle Project (Full Code)", styles["H1"]))
-    story.append(code_block(styles, STUDENTDB_PICKLE_CODE))
-    story.append(PageBreak())
-    story.append(Paragraph("Appendix B — StudentDB JSON Project (Full Code)", styles["H1"]))
-    story.append(code_block(styles, STUDENTDB_JSON_CODE))
+    for i, a in enumerate(course.appendices):
+        if i:
+            yield PageBreak()
+        yield Paragraph(f"Appendix {a.label} — {a.title} (Full Code)", styles["H1"])
+        if marks:
+            yield PhaseMark(f"appendix {a.label}")
+        yield code_block(styles, a.code)
+
+def streaming_doc_template(filename, flowables, **kw):
+    from reportlab.platypus import SimpleDocTemplate
+
+    class StreamingDocTemplate(SimpleDocTemplate):
+        # filterFlowables() runs before every flowable is laid out; topping
+        # the list up there keeps only PDF_STREAM_WINDOW flowables alive at a
+        # time instead of the whole course. Pages, footer and layout are unchanged.
+        def __init__(self, filename, flowables, **kw):
+            super().__init__(filename, **kw)
+            self._pending = iter(flowables)
+            self._story = None
+
+        def build(self, flowables, **kw):
+            self._story = flowables
+            super().build(flowables, **kw)
 
-    doc = SimpleDocTemplate(PDF_PATH, pagesize=A4, leftMargin=1.6*cm, rightMargin=1.6*cm,
-                            topMargin=1.6*cm, bottomMargin=1.6*cm)
-    doc.build(story, onFirstPage=pdf_footer, onLaterPages=pdf_footer)
+        def filterFlowables(self, flowables):
+            # also called for page-start bookkeeping lists; only feed the story
+            while flowables is self._story and len(flowables) < PDF_STREAM_WINDOW:
+                f = next(self._pending, None)
+                if f is None:
+                    break
+                flowables.append(f)
 
-def build_docx(diag_paths):
+    return StreamingDocTemplate(filename, flowables, **kw)
+
+def build_pdf(diag_paths, course=None, backend=None, streaming=PDF_STREAMING):
+    from reportlab.platypus import SimpleDocTemplate
+    from reportlab.lib.pagesizes import A4
+    from reportlab.lib.units import cm
+    course = course or compile_course()
+    styles = pdf_styles()
+    story = pdf_story(styles, diag_paths, course, backend or DIAGRAM_BACKEND)
+    page = dict(pagesize=A4, leftMargin=1.6*cm, rightMargin=1.6*cm,
+                topMargin=1.6*cm, bottomMargin=1.6*cm)
+    if streaming:
+        doc = streaming_doc_template(PDF_PATH, story, **page)
+        story = [next(story)]  # build() stops on an empty list
+    else:
+        doc = SimpleDocTemplate(PDF_PATH, **page)
+        with phase("story"):
+            story = list(story)
+    with phase("layout"):
+        doc.build(story, onFirstPage=pdf_footer, onLaterPages=pdf_footer)
+
+def build_docx(diag_paths, course=None, backend=None):
+    # backend is accepted for a uniform exporter signature; python-docx has
+    # no vector drawing support, so the DOCX always embeds the PNG
+    from docx import Document
+    from docx.shared import Inches
+    course = course or compile_course()
     d = Document()
     d.add_heading("Python Starter Course", level=0)
     d.add_paragraph(BRAND_LINE_1)
@@ -834,50 +4653,51 @@ def build_docx(diag_paths):
     d.add_paragraph(f"Prepared by {AUTHOR} | {DATE_STR}")
     d.add_page_break()
 
-    topic_map = {t[0]:t for t in TOPICS}
-
-    for ch, ids in CHAPTERS:
-        d.add_heading(ch, level=1)
-        d.add_paragraph("Topics: " + ", ".join(str(i) for i in ids))
-
-        for tid in ids:
-            _, title, intro, expl, imp, samples = topic_map[tid]
-            d.add_heading(f"{tid}. {title}", level=2)
-            d.add_paragraph("Introduction: " + intro)
-            d.add_paragraph("Explanation: " + expl)
-            d.add_paragraph("Importance: " + imp)
-
-            if tid in DIAGRAM_TOPIC_IDS:
-                img_id = 18 if tid==19 else tid
-                d.add_paragraph("Flow Diagram:")
-                d.add_picture(diag_paths[img_id], width=Inches(6.5))
-
-            d.add_paragraph("Code Samples:")
-            for s in samples:
-                d.add_paragraph(s)
-
-            ex, ans = exercises_for(title)
-            d.add_paragraph("Practice Exercises:")
-            for line in ex:
-                d.add_paragraph(line)
-            d.add_paragraph("Answers:")
-            for line in ans:
-                d.add_paragraph(line)
-
-        d.add_heading("MCQs (End of Chapter)", level=2)
-        for i,(q,opts,key) in enumerate(MCQS[ch],1):
-            d.add_paragraph(f"Q{i}. {q}")
-            for o in opts:
-                d.add_paragraph("   " + o)
-        d.add_paragraph("Answer Key: " + ", ".join([f"Q{i+1}-{MCQS[ch][i][2]}" for i in range(len(MCQS[ch]))]))
-        d.add_page_break()
+    for n, ch in enumerate(course.chapters, 1):
+        with phase(f"chapter {n}"):
+            d.add_heading(ch.title, level=1)
+            d.add_paragraph("Topics: " + ", ".join(str(i) for i in ch.topic_ids))
+
+            for t in ch.topics:
+                d.add_heading(f"{t.tid}. {t.title}", level=2)
+                d.add_paragraph("Introduction: " + t.intro)
+                d.add_paragraph("Explanation: " + t.expl)
+                d.add_paragraph("Importance: " + t.imp)
+
+                if t.diagram_id is not None:
+                    d.add_paragraph("Flow Diagram:")
+                    d.add_picture(diag_paths[t.diagram_id], width=Inches(6.5))
+
+                d.add_paragraph("Code Samples:")
+                for s in t.samples:
+                    d.add_paragraph(s)
+
+                d.add_paragraph("Practice Exercises:")
+                for line in t.exercises:
+                    d.add_paragraph(line)
+                d.add_paragraph("Answers:")
+                for line in t.answers:
+                    d.add_paragraph(line)
+
+            d.add_heading("MCQs (End of Chapter)", level=2)
+            for i,(q,opts,key) in enumerate(ch.mcqs,1):
+                d.add_paragraph(f"Q{i}. {q}")
+                for o in opts:
+                    d.add_paragraph("   " + o)
+            d.add_paragraph("Answer Key: " + ch.answer_key)
+            d.add_page_break()
 
     d.add_heading("Appendix — Full Projects", level=1)
-    d.add_paragraph("Appendix A: studentdb_pickle_undo_redo.py (full code included in PDF).")
-    d.add_paragraph("Appendix B: studentdb_json_undo_redo.py (full code included in PDF).")
-    d.save(DOCX_PATH)
+    for a in course.appendices:
+        d.add_paragraph(f"Appendix {a.label}: {a.filename} (full code included in PDF).")
+    with phase("save"):
+        d.save(DOCX_PATH)
 
-def build_ppt(diag_paths):
+def build_ppt(diag_paths, course=None, backend=None):
+    from pptx import Presentation
+    from pptx.util import Inches as PInches
+    course = course or compile_course()
+    backend = backend or DIAGRAM_BACKEND
     prs = Presentation()
 
     # Title slide
@@ -886,69 +4706,305 @@ def build_ppt(diag_paths):
     s0.placeholders[1].text = f"{BRAND_LINE_1}\n{BRAND_LINE_2}\n{AUTHOR}\n{DATE_STR}"
 
     # Chapter slides
-    for ch, ids in CHAPTERS:
-        overview = prs.slides.add_slide(prs.slide_layouts[1])
-        overview.shapes.title.text = ch
-        tf = overview.placeholders[1].text_frame
-        tf.clear()
-        tf.text = "Topics: " + ", ".join(str(i) for i in ids)
-
-        for tid in ids:
-            slide = prs.slides.add_slide(prs.slide_layouts[5])  # Title Only
-            slide.shapes.title.text = f"{tid}. {TOPICS[tid-1][1]}"
-
-            if tid in DIAGRAM_TOPIC_IDS:
-                img_id = 18 if tid==19 else tid
-                slide.shapes.add_picture(diag_paths[img_id], PInches(0.8), PInches(1.6), width=PInches(8.3))
-            else:
-                box = slide.shapes.add_textbox(PInches(0.8), PInches(1.6), PInches(8.3), PInches(3.2))
-                box.text_frame.text = "See PDF/DOCX for full content + exercises."
-
-        # MCQs slide
-        mc = prs.slides.add_slide(prs.slide_layouts[1])
-        mc.shapes.title.text = f"{ch} — MCQs"
-        tfm = mc.placeholders[1].text_frame
-        tfm.clear()
-        tfm.text = "MCQs (Answer key included):"
-        for i,(q,_opts,key) in enumerate(MCQS[ch],1):
-            p = tfm.add_paragraph()
-            p.text = f"Q{i}. {q} (Ans: {key})"
-            p.level = 1
+    for n, ch in enumerate(course.chapters, 1):
+        with phase(f"chapter {n}"):
+            overview = prs.slides.add_slide(prs.slide_layouts[1])
+            overview.shapes.title.text = ch.title
+            tf = overview.placeholders[1].text_frame
+            tf.clear()
+            tf.text = "Topics: " + ", ".join(str(i) for i in ch.topic_ids)
+
+            for t in ch.topics:
+                slide = prs.slides.add_slide(prs.slide_layouts[5])  # Title Only
+                slide.shapes.title.text = f"{t.tid}. {t.title}"
+
+                if t.diagram_id is not None and backend == "vector":
+                    add_flow_diagram_shapes(slide, diagram_spec(t.diagram_id), PInches(0.8), PInches(1.6), PInches(8.3))
+                elif t.diagram_id is not None:
+                    slide.shapes.add_picture(diag_paths[t.diagram_id], PInches(0.8), PInches(1.6), width=PInches(8.3))
+                else:
+                    box = slide.shapes.add_textbox(PInches(0.8), PInches(1.6), PInches(8.3), PInches(3.2))
+                    box.text_frame.text = "See PDF/DOCX for full content + exercises."
+
+            # MCQs slide
+            mc = prs.slides.add_slide(prs.slide_layouts[1])
+            mc.shapes.title.text = f"{ch.title} — MCQs"
+            tfm = mc.placeholders[1].text_frame
+            tfm.clear()
+            tfm.text = "MCQs (Answer key included):"
+            for i,(q,_opts,key) in enumerate(ch.mcqs,1):
+                p = tfm.add_paragraph()
+                p.text = f"Q{i}. {q} (Ans: {key})"
+                p.level = 1
 
     end = prs.slides.add_slide(prs.slide_layouts[1])
     end.shapes.title.text = "StudentDB Projects"
     tf = end.placeholders[1].text_frame
     tf.clear()
     tf.text = "Included in PDF Appendices:"
-    p=tf.add_paragraph(); p.text="• studentdb_pickle_undo_redo.py (Pickle + Undo/Redo)"; p.level=1
-    p=tf.add_paragraph(); p.text="• studentdb_json_undo_redo.py (JSON + Undo/Redo)"; p.level=1
+    for a in course.appendices:
+        p=tf.add_paragraph(); p.text=f"• {a.filename} ({a.summary})"; p.level=1
+
+    with phase("save"):
+        prs.save(PPTX_PATH)
+
+EXPORTERS = {"pdf": build_pdf, "docx": build_docx, "pptx": build_ppt}
+EXPORT_PATHS = {"pdf": PDF_PATH, "docx": DOCX_PATH, "pptx": PPTX_PATH}
+
+def _run_exporter(fmt, diag_paths, course, backend, worker_opts=None, stream_pdf=PDF_STREAMING):
+    # Never raises, so a failing format is reported instead of propagated.
+    # In a worker process the phase records are returned to the parent.
+    if worker_opts is not None:
+        _reset_profiling_in_worker(worker_opts)
+    extra = (stream_pdf,) if fmt == "pdf" else ()
+    t0 = time.perf_counter()
+    try:
+        with phase(fmt):
+            EXPORTERS[fmt](diag_paths, course, backend, *extra)
+        err = None
+    except Exception:
+        err = traceback.format_exc()
+    return err, time.perf_counter() - t0, list(BUILD_PHASES) if worker_opts is not None else []
+
+def build_exports(diag_paths, course, formats=tuple(EXPORTERS), parallel=EXPORT_PARALLEL,
+                  backend=DIAGRAM_BACKEND, stream_pdf=PDF_STREAMING):
+    # Returns {fmt: (traceback or None, seconds)}. In parallel mode each
+    # format gets its own single-worker pool, so even a hard crash of one
+    # process (BrokenProcessPool) only fails that format.
+    if not parallel or len(formats) < 2:
+        return {fmt: _run_exporter(fmt, diag_paths, course, backend, None, stream_pdf)[:2]
+                for fmt in formats}
+    pools = {fmt: ProcessPoolExecutor(max_workers=1) for fmt in formats}
+    opts = dict(PROFILE)
+    try:
+        futures = {fmt: pools[fmt].submit(_run_exporter, fmt, diag_paths, course, backend, opts, stream_pdf)
+                   for fmt in formats}
+        results = {}
+        for fmt, fut in futures.items():
+            try:
+                err, secs, records = fut.result()
+                merge_worker_phases(records)
+                results[fmt] = (err, secs)
+            except Exception as e:
+                results[fmt] = (f"{type(e).__name__}: {e}", None)
+        return results
+    finally:
+        for pool in pools.values():
+            pool.shutdown()
+
+# -------------------------
+# BUILD MANIFEST (incremental builds)
+# Each output is keyed by a hash of the input sections it reads plus the
+# source of the code that builds it; unchanged keys are skipped next run.
+# -------------------------
+MANIFEST_PATH = os.path.join(OUT_DIR, ".build_manifest.json")
+CODE_FILES = {
+    "pickle_code": ("studentdb_pickle_undo_redo.py", "STUDENTDB_PICKLE_CODE"),
+    "json_code": ("studentdb_json_undo_redo.py", "STUDENTDB_JSON_CODE"),
+    "sqlite_code": ("studentdb_sqlite_undo_redo.py", "STUDENTDB_SQLITE_CODE"),
+    "server_code": ("studentdb_server.py", "STUDENTDB_SERVER_CODE"),
+    "client_code": ("studentdb_client.py", "STUDENTDB_CLIENT_CODE"),
+    "loadgen_code": ("studentdb_loadgen.py", "STUDENTDB_LOADGEN_CODE"),
+}
+OUTPUT_INPUTS = {
+    "pdf": ("branding", "topics", "chapters", "mcqs", "diagrams", "pickle_code", "json_code",
+            "sqlite_code"),
+    "docx": ("branding", "topics", "chapters", "mcqs", "diagrams"),
+    "pptx": ("branding", "topics", "chapters", "mcqs", "diagrams"),
+    "pickle_code": ("pickle_code",),
+    "json_code": ("json_code",),
+    "sqlite_code": ("sqlite_code",),
+    "server_code": ("server_code",),
+    "client_code": ("client_code",),
+    "loadgen_code": ("loadgen_code",),
+}
+OUTPUT_CODE = {
+    "pdf": (build_pdf, pdf_footer, code_block, pdf_styles, pdf_story, streaming_doc_template,
+            flow_diagram_drawing, spec_digest, canonical_diagram_ids, compile_course,
+            wrap_code, exercises_for),
+    "docx": (build_docx, canonical_diagram_ids, compile_course, wrap_code, exercises_for),
+    "pptx": (build_ppt, add_flow_diagram_shapes, canonical_diagram_ids, compile_course,
+             wrap_code, exercises_for),
+    "pickle_code": (),
+    "json_code": (),
+    "sqlite_code": (),
+    "server_code": (),
+    "client_code": (),
+    "loadgen_code": (),
+}
+OUTPUT_LIBS = {"pdf": ("reportlab",), "docx": ("python-docx",), "pptx": ("python-pptx",)}
+
+def _digest(obj):
+    blob = json.dumps(obj, ensure_ascii=False, sort_keys=True)
+    return hashlib.sha256(blob.encode("utf-8")).hexdigest()
+
+def _file_digest(path):
+    if not os.path.exists(path):
+        return None
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+def _lib_version(name):
+    try:
+        return importlib.metadata.version(name)
+    except importlib.metadata.PackageNotFoundError:
+        return "unknown"
+
+def input_digests(diag_paths):
+    return {
+        "branding": _digest([BRAND_LINE_1, BRAND_LINE_2, AUTHOR, DATE_STR]),
+        "topics": _digest(TOPICS),
+        "chapters": _digest(CHAPTERS),
+        "mcqs": _digest(MCQS),
+        "diagrams": _digest({str(t): _file_digest(p) for t, p in sorted(diag_paths.items())}),
+        "diagram_specs": _digest([[t, diagram_spec(t)] for t in DIAGRAM_TOPIC_IDS]),
+        "pickle_code": _digest(STUDENTDB_PICKLE_CODE),
+        "json_code": _digest(STUDENTDB_JSON_CODE),
+        "sqlite_code": _digest(STUDENTDB_SQLITE_CODE),
+        "server_code": _digest(STUDENTDB_SERVER_CODE),
+        "client_code": _digest(STUDENTDB_CLIENT_CODE),
+        "loadgen_code": _digest(STUDENTDB_LOADGEN_CODE),
+    }
+
+def output_path(name):
+    if name in CODE_FILES:
+        return os.path.join(OUT_DIR, CODE_FILES[name][0])
+    return EXPORT_PATHS[name]
+
+def output_key(name, inputs, backend=DIAGRAM_BACKEND):
+    names = OUTPUT_INPUTS[name]
+    if backend == "vector" and name in VECTOR_FORMATS:
+        # drawn from the specs, so PNG bytes don't matter (and may not exist)
+        names = tuple("diagram_specs" if k == "diagrams" else k for k in names)
+    return _digest({
+        "inputs": {k: inputs[k] for k in names},
+        "backend": backend if "diagrams" in OUTPUT_INPUTS[name] else None,
+        "code": [inspect.getsource(fn) for fn in OUTPUT_CODE[name]],
+        "libs": {lib: _lib_version(lib) for lib in OUTPUT_LIBS.get(name, ())},
+    })
 
-    prs.save(PPTX_PATH)
+def load_manifest():
+    try:
+        with open(MANIFEST_PATH, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
 
-def main():
-    # generate diagram images
+def save_manifest(manifest):
+    tmp = MANIFEST_PATH + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    os.replace(tmp, MANIFEST_PATH)
+
+def is_up_to_date(name, key, manifest):
+    # the output must also still be the file we wrote (not deleted or edited)
+    entry = manifest.get(name)
+    return bool(entry) and entry["key"] == key and entry["output"] == _file_digest(output_path(name))
+
+def record_output(name, key, manifest):
+    manifest[name] = {"key": key, "output": _file_digest(output_path(name))}
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(
+        description="Build the Python Starter Course package. "
+                    "With no output flags, everything is built.")
+    ap.add_argument("--pdf", action="store_true", help="build the PDF")
+    ap.add_argument("--docx", action="store_true", help="build the DOCX")
+    ap.add_argument("--pptx", action="store_true", help="build the PPTX")
+    ap.add_argument("--diagrams", action="store_true", help="render the flow diagram PNGs")
+    ap.add_argument("--code", action="store_true", help="write the studentdb_*.py project files")
+    ap.add_argument("--force", action="store_true",
+                    help="rebuild every selected output, ignoring the build manifest")
+    ap.add_argument("--diagram-backend", choices=("png", "vector"), default=DIAGRAM_BACKEND,
+                    help="how the PDF and PPTX draw flow diagrams (DOCX always uses PNG)")
+    ap.add_argument("--diagram-workers", type=int, default=DIAGRAM_WORKERS, metavar="N",
+                    help="processes rendering diagrams: 1 = serial, 0 = one per CPU")
+    ap.add_argument("--parallel-exports", action=argparse.BooleanOptionalAction, default=EXPORT_PARALLEL,
+                    help="build the PDF, DOCX and PPTX at the same time, one process each")
+    ap.add_argument("--stream-pdf", action=argparse.BooleanOptionalAction, default=PDF_STREAMING,
+                    help="feed the PDF layout engine lazily (flat memory for huge courses)")
+    ap.add_argument("--profile", metavar="REPORT.json",
+                    help="write per-phase wall/CPU/memory timings as JSON")
+    ap.add_argument("--trace-memory", action="store_true",
+                    help="measure Python peak memory per phase with tracemalloc (slower)")
+    ap.add_argument("--cprofile", metavar="DIR",
+                    help="dump cProfile stats for each top-level phase into DIR")
+    args = ap.parse_args(argv)
+    configure_profiling(bool(args.profile), args.trace_memory, args.cprofile)
+
+    formats = [fmt for fmt in EXPORTERS if getattr(args, fmt)]
+    build_all = not (formats or args.diagrams or args.code)
+    if build_all:
+        formats = list(EXPORTERS)
+    outputs = formats + (list(CODE_FILES) if build_all or args.code else [])
+    startup_ms = (time.perf_counter() - _T_START) * 1000
+
+    # generate diagram images (in vector mode only the DOCX still needs them)
+    backend = args.diagram_backend
+    needs_png = [f for f in formats if backend == "png" or f not in VECTOR_FORMATS]
     diag_paths = {}
-    for tid in DIAGRAM_TOPIC_IDS:
-        diag_paths[tid] = diagram_for_topic(tid)
+    if needs_png or args.diagrams:
+        with phase("diagrams"):
+            diag_paths = render_diagrams(DIAGRAM_TOPIC_IDS, args.diagram_workers)
+            evict_diagram_cache()
+
+    with phase("manifest"):
+        manifest = load_manifest()
+        inputs = input_digests(diag_paths)
+        keys = {name: output_key(name, inputs, backend) for name in outputs}
+        skipped = [] if args.force else [n for n in outputs if is_up_to_date(n, keys[n], manifest)]
 
     # build exports
-    build_pdf(diag_paths)
-    build_docx(diag_paths)
-    build_ppt(diag_paths)
+    t0 = time.perf_counter()
+    with phase("compile"):
+        course = compile_course()
+    results = build_exports(diag_paths, course, [f for f in formats if f not in skipped],
+                            parallel=args.parallel_exports, backend=backend, stream_pdf=args.stream_pdf)
+    export_secs = time.perf_counter() - t0
+    for fmt, (err, _) in results.items():
+        if not err:
+            record_output(fmt, keys[fmt], manifest)
 
     # write project .py files too
-    with open(os.path.join(OUT_DIR, "studentdb_pickle_undo_redo.py"), "w", encoding="utf-8") as f:
-        f.write(STUDENTDB_PICKLE_CODE)
-    with open(os.path.join(OUT_DIR, "studentdb_json_undo_redo.py"), "w", encoding="utf-8") as f:
-        f.write(STUDENTDB_JSON_CODE)
+    with phase("code"):
+        for name, (fname, var) in CODE_FILES.items():
+            if name in outputs and name not in skipped:
+                with open(output_path(name), "w", encoding="utf-8") as f:
+                    f.write(globals()[var])
+                record_output(name, keys[name], manifest)
+    save_manifest(manifest)
 
-    print("DONE ✅")
+    failed = [fmt for fmt, (err, _) in results.items() if err]
+    print("DONE ✅" if not failed else "DONE with errors ❌")
     print("Created:")
-    print(" -", PDF_PATH)
-    print(" -", DOCX_PATH)
-    print(" -", PPTX_PATH)
-    print(" - studentdb_pickle_undo_redo.py")
-    print(" - studentdb_json_undo_redo.py")
+    for fmt, (err, secs) in results.items():
+        took = f"{secs:.2f}s" if secs is not None else "crashed"
+        if err:
+            print(f" ! {fmt.upper()} FAILED ({took})")
+            print(textwrap.indent(err.rstrip(), "     "))
+        else:
+            print(" -", EXPORT_PATHS[fmt], f"({took})")
+    for name, (fname, _) in CODE_FILES.items():
+        if name in outputs and name not in skipped:
+            print(" -", fname)
+    if skipped:
+        print("Up to date (skipped):", ", ".join(skipped))
+    print(f"Startup: {startup_ms:.0f} ms (module load + CLI, before any builder runs)")
+    if formats:
+        print(f"Exports: {export_secs:.2f}s ({'parallel' if args.parallel_exports else 'serial'})")
+    if diag_paths:
+        print("Diagram cache: {hits} hit(s), {misses} miss(es), {evicted} evicted".format(**DIAGRAM_CACHE_STATS))
+    if args.profile:
+        write_profile_report(args.profile, argv=sys.argv[1:] if argv is None else list(argv),
+                             startup_ms=round(startup_ms, 3), outputs=outputs, skipped=skipped,
+                             diagram_cache=DIAGRAM_CACHE_STATS,
+                             failed=failed, parallel=args.parallel_exports, diagram_backend=backend)
+        print("Profile report:", args.profile)
+    if failed:
+        raise SystemExit(1)
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,412 @@
+# test_studentdb.py
+# Behaviour the three StudentDB programs (the *_CODE strings in scratch.py)
+# must share: CRUD through the programmatic API, undo/redo, saving and
+# starting again. Every test runs against each backend in BACKENDS, in its
+# own temp dir; a "restart" loads the program again as a fresh module, so
+# no module-level state survives it.
+#
+#   python -m pytest -q test_studentdb.py
+
+import os, sys, json, pickle, random, importlib.util, itertools
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import scratch
+from bench_studentdb import BACKENDS
+
+_loads = itertools.count()
+
+
+class Program:
+    # One backend's program file and the sessions opened on it.
+    def __init__(self, name, path):
+        self.name, self.path = name, path
+
+    def start(self, **settings):
+        # a fresh copy of the program, as a new process would get, with its
+        # db loaded; settings override module constants before the load
+        spec = importlib.util.spec_from_file_location(f"studentdb_{self.name}_{next(_loads)}", self.path)
+        sdb = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(sdb)
+        for key, value in settings.items():
+            setattr(sdb, key, value)
+        return Session(sdb)
+
+
+class Session:
+    def __init__(self, sdb):
+        self.sdb = sdb
+        self.db = sdb.load_db()
+        self.undo = sdb.UndoHistory(sdb.UNDO_NAME, stamp=sdb.db_stamp(self.db))
+        self.redo = sdb.UndoHistory()
+
+    def get(self, roll):
+        # (name, marks), or None if there is no such roll
+        s = self.sdb.get_record(self.db, roll)
+        return None if s is None else (s["name"], s["marks"])
+
+    def add(self, roll, name, marks):
+        return self.sdb.add_record(self.db, self.undo, self.redo, roll, name, marks)
+
+    def update(self, roll, name=None, marks=None):
+        return self.sdb.update_record(self.db, self.undo, self.redo, roll, name, marks)
+
+    def delete(self, roll):
+        return self.sdb.delete_record(self.db, self.undo, self.redo, roll)
+
+    def undo_last(self):
+        return self.sdb.undo_last(self.db, self.undo, self.redo)
+
+    def redo_last(self):
+        return self.sdb.redo_last(self.db, self.undo, self.redo)
+
+    def save(self):
+        self.sdb.save_db(self.db)
+        self.undo.save(self.sdb.db_stamp(self.db))
+
+    def close(self):
+        if hasattr(self.db, "close"):  # the SQLite connection
+            self.db.close()
+
+
+@pytest.fixture(params=list(BACKENDS))
+def program(request, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    path = tmp_path / f"studentdb_{request.param}.py"
+    path.write_text(getattr(scratch, BACKENDS[request.param]), encoding="utf-8")
+    return Program(request.param, str(path))
+
+
+def test_crud(program):
+    s = program.start()
+    assert s.add(1, "Asha", 70)
+    assert not s.add(1, "Ben", 50)
+    assert s.get(1) == ("Asha", 70)
+    assert s.update(1, marks=80)
+    assert s.get(1) == ("Asha", 80)
+    assert s.update(1, name="Asha K")
+    assert s.get(1) == ("Asha K", 80)
+    assert not s.update(2, marks=10)
+    assert s.delete(1)
+    assert s.get(1) is None
+    assert not s.delete(1)
+    s.close()
+
+
+def test_undo_redo(program):
+    s = program.start()
+    s.add(1, "Asha", 70)
+    s.update(1, marks=80)
+    s.delete(1)
+    assert s.undo_last() and s.get(1) == ("Asha", 80)
+    assert s.undo_last() and s.get(1) == ("Asha", 70)
+    assert s.undo_last() and s.get(1) is None
+    assert not s.undo_last()
+    assert s.redo_last() and s.get(1) == ("Asha", 70)
+    assert s.redo_last() and s.get(1) == ("Asha", 80)
+    s.add(2, "Ben", 50)  # a new change clears redo
+    assert not s.redo_last()
+    assert s.get(1) == ("Asha", 80) and s.get(2) == ("Ben", 50)
+    s.close()
+
+
+def test_save_and_restart(program):
+    s = program.start()
+    for roll in range(1, 21):
+        s.add(roll, f"Student {roll}", roll * 5)
+    s.update(3, marks=99)
+    s.delete(4)
+    s.save()
+    s.close()
+
+    s = program.start()
+    assert s.get(3) == ("Student 3", 99)
+    assert s.get(4) is None
+    assert s.get(20) == ("Student 20", 100)
+    # the undo history was saved with the db
+    assert s.undo_last() and s.get(4) == ("Student 4", 20)
+    assert s.undo_last() and s.get(3) == ("Student 3", 15)
+    s.save()
+    s.close()
+
+    s = program.start()
+    assert s.get(3) == ("Student 3", 15) and s.get(4) == ("Student 4", 20)
+    s.close()
+
+
+def test_undo_file_dropped_after_another_save(program):
+    s = program.start()
+    s.add(1, "Asha", 70)
+    s.add(2, "Ben", 50)
+    s.save()
+    s.close()
+
+    other = program.start()  # e.g. the server, which keeps no undo file
+    other.sdb.update_record(other.db, [], [], 2, marks=55)
+    other.sdb.save_db(other.db)
+    other.close()
+
+    s = program.start()
+    assert not s.undo_last()  # undoing "add 2" would delete Ben's new marks
+    assert s.get(1) == ("Asha", 70) and s.get(2) == ("Ben", 55)
+    s.close()
+
+
+def test_marks_outside_0_to_100_are_refused(program, capsys):
+    s = program.start()
+    s.add(1, "Asha", 70)
+    for bad in (-5, 101, "80", 2.5):
+        with pytest.raises(ValueError, match="marks"):
+            s.add(2, "Ben", bad)
+        with pytest.raises(ValueError, match="marks"):
+            s.update(1, marks=bad)
+    assert s.get(1) == ("Asha", 70) and s.get(2) is None
+    assert len(s.undo) == 1
+    counts = s.sdb.run_batch(s.db, s.undo, s.redo, ["add 2 150 Ben", "update 1 101"])
+    assert counts == {"ops": 2, "errors": 2}
+    assert "from 0 to 100" in capsys.readouterr().err
+    counts = {"skipped": 0}
+    imported = list(s.sdb.valid_changes([(3, "Chen", "-1"), (4, "Divya", "101"), (5, "Emil", "100")], counts))
+    assert len(imported) == 1 and counts["skipped"] == 2
+    assert s.sdb.class_stats(s.db) == s.sdb.recompute_class_stats(s.db)
+    if hasattr(s.sdb, "grade_of"):  # SQLite grades with CASE ... ELSE
+        assert s.sdb.grade_of(-1) == "F"
+    s.close()
+
+
+def test_ties_list_in_numeric_roll_order(program):
+    # the same answers, in the same order, from every backend
+    s = program.start()
+    for roll in (10, 9, 100, 2, 21):
+        s.add(roll, "Same Name", 80)
+    s.add(1, "Other", 60)
+    rolls = lambda records: [r["roll"] for r in records]
+    assert rolls(s.sdb.find_by_name(s.db, "same")) == [2, 9, 10, 21, 100]
+    assert rolls(s.sdb.find_by_marks(s.db, 70, 90)) == [2, 9, 10, 21, 100]
+    assert rolls(s.sdb.find_by_marks(s.db, 0, 100, limit=3)) == [1, 2, 9]
+    assert rolls(s.sdb.find_top(s.db, 3)) == [100, 21, 10]
+    s.update(9, marks=60)  # kept in order as records change, too
+    assert rolls(s.sdb.find_by_marks(s.db, 0, 100)) == [1, 9, 2, 10, 21, 100]
+    s.close()
+
+
+def test_batch_reports_failed_commands(program, capsys):
+    s = program.start()
+    counts = s.sdb.run_batch(s.db, s.undo, s.redo, ["add 1 70 Asha", "add 1 50 Ben", "delete 9",
+                                                    "update 1 75", "# note", "undo", "redo", "frobnicate"])
+    assert counts == {"ops": 7, "errors": 3}
+    assert s.get(1) == ("Asha", 75)
+    assert "line 2:" in capsys.readouterr().err
+    s.close()
+
+
+# SQLite only: several processes share the db file
+
+
+@pytest.fixture
+def sqlite_program(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    path = tmp_path / "studentdb_sqlite.py"
+    path.write_text(scratch.STUDENTDB_SQLITE_CODE, encoding="utf-8")
+    return Program("sqlite", str(path))
+
+
+def test_sqlite_sessions_write_in_turn(sqlite_program):
+    a, b = sqlite_program.start(), sqlite_program.start()
+    assert a.add(1, "Asha", 70)
+    assert b.add(2, "Ben", 50)  # the first write of a second session
+    assert not b.add(1, "Chen", 40)
+    assert a.update(2, marks=55) and b.get(2) == ("Ben", 55)
+    assert b.undo_last() and a.get(2) is None and a.get(1) == ("Asha", 70)  # b's add undone
+    a.close(), b.close()
+
+    c = sqlite_program.start()
+    assert c.get(1) == ("Asha", 70) and c.get(2) is None
+    c.close()
+
+
+def test_sqlite_locked_write_changes_nothing(sqlite_program):
+    a = sqlite_program.start()
+    b = sqlite_program.start(BUSY_TIMEOUT=0.05)
+    a.add(1, "Asha", 70)
+    b.add(2, "Ben", 50)
+    a.db.execute("BEGIN IMMEDIATE")  # a holds the write lock, as a batch run does
+    with pytest.raises(b.sdb.WriteFailed, match="locked"):
+        b.update(2, marks=60)
+    with pytest.raises(b.sdb.WriteFailed):
+        b.undo_last()
+    assert len(b.undo) == 1 and not b.redo  # the failed steps were not lost
+    a.db.execute("COMMIT")
+    assert b.undo_last() and b.get(2) is None
+    assert b.redo_last() and b.get(2) == ("Ben", 50)
+    a.close(), b.close()
+
+
+@pytest.mark.parametrize("journal", [True, False])
+def test_changes_made_during_a_save_stay_unsaved(program, journal):
+    # the server writes a save's files in a thread while it keeps going
+    s = program.start(JOURNAL=journal)
+    if not hasattr(s.sdb, "begin_save"):
+        pytest.skip("writes are committed as they are made")
+    for roll in range(1, 11):
+        s.add(roll, f"Student {roll}", 50)
+    s.save()
+    s.update(1, marks=61)
+    s.delete(3)
+    plan = s.sdb.begin_save(s.db)
+    s.update(1, marks=71)
+    s.update(2, marks=72)
+    s.add(11, "Student 11", 73)
+    s.sdb.write_save(s.db, plan)
+    s.sdb.end_save(s.db, plan)
+    assert [s.get(roll) for roll in (1, 2, 3, 11)] == [
+        ("Student 1", 71), ("Student 2", 72), None, ("Student 11", 73)]
+    assert len(s.sdb.DIRTY) == 3
+
+    again = program.start(JOURNAL=journal)  # what the frozen save wrote
+    assert [again.get(roll) for roll in (1, 2, 3, 11)] == [("Student 1", 61), ("Student 2", 50), None, None]
+    s.save()
+    again = program.start(JOURNAL=journal)
+    assert [again.get(roll) for roll in (1, 2, 3, 11)] == [
+        ("Student 1", 71), ("Student 2", 72), None, ("Student 11", 73)]
+
+
+GOOD = {1: ("Asha", 70), 3: ("Chen", 90)}
+
+
+def pickled(bad):
+    return b"".join(pickle.dumps(r) for r in [(1, *GOOD[1]), bad, (3, *GOOD[3])])
+
+
+def ndjson(bad):
+    return b"\n".join([json.dumps({"roll": 1, "name": "Asha", "marks": 70}).encode(), bad,
+                       json.dumps({"roll": 3, "name": "Chen", "marks": 90}).encode(), b""])
+
+
+def keyed_json(key, bad):
+    # the JSON version's old single-object format, keyed by roll
+    return json.dumps({"1": {"roll": 1, "name": "Asha", "marks": 70}, key: bad,
+                       "3": {"roll": 3, "name": "Chen", "marks": 90}}).encode()
+
+
+# db files without an index, holding records 1 and 3 and one bad record
+BAD_SNAPSHOTS = {
+    "pickle": [pickled((2,)), pickled((2, "Ben", "80")), pickled((2, 42, 80)), pickled((-2, "Ben", 80)),
+               pickled({"roll": 2}), pickled((2, "Ben", 101)), pickled((2, "Ben", -5))],
+    "json": [ndjson(b'{"roll": 2, "na'), ndjson(b'{"roll": 2, "name": "Ben", "marks": "80"}'),
+             ndjson(b'{"roll": 2, "name": 42, "marks": 80}'), ndjson(b'{"roll": "2", "name": "Ben", "marks": 80}'),
+             ndjson(b'[2, "Ben", 80]'), ndjson(b'\xff{"roll": 2}'),
+             keyed_json("abc", {"roll": 2, "name": "Ben", "marks": 80}),
+             keyed_json("7", {"roll": 2, "name": "Ben", "marks": 80}),
+             keyed_json("2", {"roll": 2, "name": "Ben", "marks": None}),
+             ndjson(b'{"roll": 2, "name": "Ben", "marks": -5}'), ndjson(b'{"roll": 2, "name": "Ben", "marks": 101}'),
+             keyed_json("2", {"roll": 2, "name": "Ben", "marks": 101})],
+}
+
+
+def test_unreadable_records_are_skipped_and_the_file_kept(program, tmp_path, monkeypatch, capsys):
+    if program.name not in BAD_SNAPSHOTS:
+        pytest.skip("no snapshot file of its own")
+    for i, data in enumerate(BAD_SNAPSHOTS[program.name]):
+        case = tmp_path / str(i)
+        case.mkdir()
+        monkeypatch.chdir(case)
+        s = program.start()
+        with open(s.sdb.FILE_NAME, "wb") as f:  # no index: read record by record
+            f.write(data)
+
+        s = program.start()
+        assert [s.get(roll) for roll in (1, 2, 3)] == [GOOD[1], None, GOOD[3]], data
+        assert "skipped 1 unreadable" in capsys.readouterr().err, data
+        assert s.sdb.class_stats(s.db)["count"] == 2
+        backups = [name for name in os.listdir(".") if name.endswith(".bak")]
+        assert len(backups) == 1
+        with open(backups[0], "rb") as f:
+            assert f.read() == data
+        s.save()
+
+        s = program.start()
+        assert [s.get(roll) for roll in (1, 2, 3)] == [GOOD[1], None, GOOD[3]]
+        assert capsys.readouterr().err == ""
+
+
+def test_json_db_moves_to_its_new_name(program):
+    if program.name != "json":
+        pytest.skip("only the JSON version was renamed")
+    with open("studentdb.json", "w", encoding="utf-8") as f:  # the old format, too
+        f.write('{"1": {"roll": 1, "name": "Asha", "marks": 70}}')
+    s = program.start()
+    assert s.sdb.FILE_NAME == "studentdb.ndjson"
+    assert s.get(1) == ("Asha", 70)
+    assert not os.path.exists("studentdb.json")
+    s.save()
+    assert program.start().get(1) == ("Asha", 70)
+
+
+def test_class_stats_follow_every_change(program):
+    # random edits, undos, redos, imports big enough for a bulk step, and
+    # saves with a restart; the upkept stats must match a full recount
+    # after every one of them
+    rng = random.Random(24)
+    s = program.start()
+    for step in range(300):
+        roll = rng.randrange(1, 200)
+        op = rng.choice(["add", "add", "update", "delete", "undo", "redo", "import", "restart"])
+        if op == "add":
+            s.add(roll, f"Student {roll}", rng.randrange(101))
+        elif op == "update":
+            s.update(roll, marks=rng.randrange(101))
+        elif op == "delete":
+            s.delete(roll)
+        elif op == "undo":
+            s.undo_last()
+        elif op == "redo":
+            s.redo_last()
+        elif op == "import" and rng.random() < 0.1:
+            rows = [(r, f"Imported {r}", rng.randrange(101)) for r in rng.sample(range(1, 1500), 1100)]
+            s.undo.append(s.sdb.apply_changes(s.db, list(s.sdb.valid_changes(rows, {"skipped": 0}))))
+            s.redo.clear()
+        elif op == "restart" and rng.random() < 0.2:
+            s.save()
+            s.close()
+            s = program.start()
+        assert s.sdb.class_stats(s.db) == s.sdb.recompute_class_stats(s.db), (step, op)
+    s.close()
+
+
+def test_bulk_steps_keep_the_search_indexes_and_stats(program, monkeypatch, capsys):
+    s = program.start()
+    if not hasattr(s.sdb, "SEARCH_INDEXES"):
+        pytest.skip("triggers keep the SQLite stats")
+    sdb = s.sdb
+    rolls = lambda records: [r["roll"] for r in records]
+    for roll in range(1, 21):
+        s.add(roll, f"Student {roll}", roll)
+    sdb.class_stats(s.db)  # the first query builds the indexes and stats
+
+    rows = [(roll, f"Imported {roll}", roll % 101) for roll in range(10, 1510)]  # 10-20 replaced
+    s.undo.append(sdb.apply_changes(s.db, list(sdb.valid_changes(rows, {"skipped": 0}))))
+    assert len(rows) >= sdb.BULK_CHANGES and sdb.SEARCH_INDEXES["built"]
+    assert sdb.class_stats(s.db) == sdb.recompute_class_stats(s.db)
+    assert rolls(sdb.find_by_name(s.db, "student")) == list(range(1, 10))
+    assert rolls(sdb.find_by_name(s.db, "imported 150")) == [150, 1500, 1501, 1502, 1503, 1504, 1505,
+                                                           1506, 1507, 1508, 1509]
+    assert rolls(sdb.find_top(s.db, 2)) == [1413, 1312]
+
+    assert s.undo_last() and sdb.SEARCH_INDEXES["built"]  # undoing it is a bulk step too
+    assert sdb.class_stats(s.db) == sdb.recompute_class_stats(s.db)
+    assert rolls(sdb.find_by_name(s.db, "student")) == sorted(range(1, 21), key=str)
+    assert sdb.find_by_name(s.db, "imported") == []
+
+    with open("import.csv", "w", encoding="utf-8") as f:  # the menu's import, in IMPORT_BATCH steps
+        f.write("roll,name,marks\n" + "".join(f"{roll},Imported {roll},{roll % 101}\n" for roll, *_ in rows))
+    monkeypatch.setattr(sdb, "IMPORT_BATCH", 1200)
+    monkeypatch.setattr(sdb, "input", lambda prompt="": "import.csv", raising=False)
+    sdb.import_students(s.db, s.undo, s.redo)
+    assert "Imported 1500 students" in capsys.readouterr().out
+    assert sdb.SEARCH_INDEXES["built"]
+    assert sdb.class_stats(s.db) == sdb.recompute_class_stats(s.db)
+    assert rolls(sdb.find_by_marks(s.db, 100, 100)) == [100, 201, 302, 403, 504, 605, 706, 807, 908, 1009,
+                                                        1110, 1211, 1312, 1413]
+    s.close()